@@ -98,25 +98,19 @@ def issue_certificate(request):
                 status='ISSUED'
             )
 
-            # Get all certificates for this issuer
-            certificates = Certificate.objects.filter(
-                university=request.user
-            ).order_by('-issue_date')
-
             messages.success(request, 'Certificate issued successfully!')
+            # Only the new certificate; the dashboard pages through the rest
             return JsonResponse({
                 'status': 'success',
                 'id': certificate.id,
                 'redirect_url': reverse('certificates:dashboard'),
-                'certificates': [
-                    {
-                        'student_name': cert.student.username,
-                        'course_name': cert.course_name,
-                        'issue_date': cert.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
-                        'status': cert.get_status_display(),
-                        'certificate_hash': cert.certificate_hash
-                    } for cert in certificates
-                ]
+                'certificate': {
+                    'student_name': student.username,
+                    'course_name': certificate.course_name,
+                    'issue_date': certificate.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
+                    'status': certificate.get_status_display(),
+                    'certificate_hash': certificate.certificate_hash
+                }
             })
 
         except Exception as e:
@@ -0,0 +1,104 @@
+"""
+Compare serving verifications one at a time with the async verification view under one event loop.
+
+Run from the project directory against the in-process fake chain:
+
+    python -m benchmarks.bench_async_verify --count 500 --latency 0.02 --concurrency 50 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from web3 import Web3  # noqa: E402
+
+from benchmarks.database import benchmark_database  # noqa: E402
+from benchmarks.fake_chain import FakeChain  # noqa: E402
+from certificates import blockchain, verification_cache  # noqa: E402
+from certificates.models import Certificate, User  # noqa: E402
+from certificates.views import verification_response  # noqa: E402
+
+ISSUER = '0x' + '11' * 20
+STUDENT = '0x' + '22' * 20
+CONTRACT_ADDRESS = '0x' + '33' * 20
+
+
+def clear_verification_cache():
+    verification_cache.local_cache.clear()
+    caches[settings.VERIFICATION_CACHE_ALIAS].clear()
+
+
+def create_certificates(chain, count):
+    student = User.objects.create(username='student', role=User.STUDENT)
+    university = User.objects.create(username='university', role=User.UNIVERSITY)
+    certificates = []
+    for i in range(count):
+        certificate_hash = Web3.keccak(text=f'certificate-{i}')
+        tx_hash = chain.issue(certificate_hash, ISSUER, STUDENT)
+        certificates.append(Certificate(
+            student=student, university=university, course_name='Benchmarking', completion_date='2025-01-01',
+            certificate_hash=Web3.to_hex(certificate_hash), blockchain_tx=tx_hash, status='ISSUED'
+        ))
+    Certificate.objects.bulk_create(certificates)
+    return list(Certificate.objects.select_related('student', 'university').order_by('id'))
+
+
+def verify_one_by_one(certificates):
+    """What the synchronous view did per request: chain check, then the transaction lookups in turn"""
+    for certificate in certificates:
+        certificate.verify_on_blockchain()
+        certificate.get_transaction_details()
+
+
+def verify_concurrently(certificates, concurrency):
+    async def verify_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def verify(certificate):
+            async with semaphore:
+                return await verification_response(certificate)
+
+        await asyncio.gather(*(verify(certificate) for certificate in certificates))
+
+    asyncio.run(verify_all())
+
+
+def timed(label, count, chain, fn, *args):
+    clear_verification_cache()
+    chain.http_requests = 0
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<30} {elapsed:8.3f}s {count / elapsed:10.1f} verifications/s {chain.http_requests:6d} HTTP requests')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added per HTTP round trip')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 500])
+    args = parser.parse_args()
+
+    settings.WEB3_POOL_SIZE = max(args.concurrency)
+    with benchmark_database(), FakeChain(latency=args.latency) as chain:
+        settings.WEB3_PROVIDER = chain.url
+        settings.CONTRACT_ADDRESS = CONTRACT_ADDRESS
+        blockchain.reset_client()
+        certificates = create_certificates(chain, args.count)
+        print(f'{args.count} verifications, fake chain with {args.latency * 1000:.1f} ms latency')
+
+        timed('one at a time', args.count, chain, verify_one_by_one, certificates)
+        for concurrency in args.concurrency:
+            timed(f'async, {concurrency} in flight', args.count, chain, verify_concurrently, certificates, concurrency)
+    blockchain.reset_client()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare per-certificate issuance with Merkle-batched issuance.
+
+Run from the project directory against the in-process fake chain:
+
+    python -m benchmarks.bench_batch_issuance --count 1000 --latency 0.005 --block-time 0.05
+
+or against a local dev chain (Ganache/anvil) with the recompiled contract deployed
+and an unlocked sender account:
+
+    python -m benchmarks.bench_batch_issuance --provider http://127.0.0.1:8545 \\
+        --contract 0x... --sender 0x...
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from benchmarks.fake_chain import FakeChain  # noqa: E402
+from certificates import blockchain  # noqa: E402
+from certificates.blockchain import get_contract, get_web3  # noqa: E402
+from certificates.merkle import MerkleTree, verify_proof  # noqa: E402
+
+SENDER = '0x' + '11' * 20
+STUDENT = '0x' + '22' * 20
+CONTRACT_ADDRESS = '0x' + '33' * 20
+POLL_LATENCY = 0.01
+
+
+def issue_one_by_one(certificate_hashes, sender):
+    contract = get_contract()
+    w3 = get_web3()
+    gas = 0
+    for certificate_hash in certificate_hashes:
+        tx_hash = contract.functions.issueCertificate(certificate_hash, STUDENT).transact({'from': sender})
+        gas += w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=POLL_LATENCY)['gasUsed']
+    return len(certificate_hashes), gas
+
+
+def issue_batched(certificate_hashes, sender, batch_size):
+    contract = get_contract()
+    w3 = get_web3()
+    gas = transactions = 0
+    for start in range(0, len(certificate_hashes), batch_size):
+        batch = certificate_hashes[start:start + batch_size]
+        tree = MerkleTree(batch)
+        tx_hash = contract.functions.issueCertificateBatch(tree.root, len(batch)).transact({'from': sender})
+        gas += w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=POLL_LATENCY)['gasUsed']
+        transactions += 1
+        [tree.proof(index) for index in range(len(batch))]
+    return transactions, gas
+
+
+def timed(label, count, chain, fn, *args):
+    if chain:
+        chain.http_requests = 0
+    start = time.perf_counter()
+    transactions, gas = fn(*args)
+    elapsed = time.perf_counter() - start
+    requests = f'{chain.http_requests:6d} HTTP requests' if chain else ''
+    print(
+        f'{label:<30} {elapsed:8.3f}s {count / elapsed:10.1f} certs/s {transactions:6d} txs '
+        f'{gas:12d} gas {gas / count:10.1f} gas/cert {requests}'
+    )
+
+
+def time_local_verification(certificate_hashes, batch_size):
+    tree = MerkleTree(certificate_hashes[:batch_size])
+    proofs = [tree.proof(index) for index in range(len(tree.levels[0]))]
+    start = time.perf_counter()
+    assert all(
+        verify_proof(certificate_hash, proof, tree.root)
+        for certificate_hash, proof in zip(certificate_hashes, proofs)
+    )
+    elapsed = time.perf_counter() - start
+    print(f'{"local proof verification":<30} {elapsed:8.3f}s {len(proofs) / elapsed:10.1f} certs/s')
+
+
+def run(args, chain=None):
+    sender = args.sender or SENDER
+    # Distinct hashes per run, so reruns against a persistent dev chain don't collide
+    seed = time.time_ns()
+    per_cert_hashes = [(seed + i).to_bytes(32, 'big') for i in range(args.count)]
+    print(f'{args.count} certificates')
+    timed('one transaction per cert', args.count, chain, issue_one_by_one, per_cert_hashes, sender)
+    for batch_size in args.batch_sizes:
+        hashes = [(seed + (batch_size + 1) * 2 ** 64 + i).to_bytes(32, 'big') for i in range(args.count)]
+        timed(f'merkle batches of {batch_size}', args.count, chain, issue_batched, hashes, sender, batch_size)
+    time_local_verification(per_cert_hashes, max(args.batch_sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added per HTTP round trip')
+    parser.add_argument('--block-time', type=float, default=0.0, help='seconds before a sent transaction is mined')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--provider', help='JSON-RPC URL of a dev chain; defaults to the in-process fake chain')
+    parser.add_argument('--contract', help='CertificateContract address on --provider')
+    parser.add_argument('--sender', help='unlocked account on --provider')
+    args = parser.parse_args()
+
+    settings.WEB3_POOL_SIZE = 1
+    if args.provider:
+        settings.WEB3_PROVIDER = args.provider
+        settings.CONTRACT_ADDRESS = args.contract
+        blockchain.reset_client()
+        run(args)
+    else:
+        with FakeChain(latency=args.latency, block_time=args.block_time) as chain:
+            settings.WEB3_PROVIDER = chain.url
+            settings.CONTRACT_ADDRESS = CONTRACT_ADDRESS
+            blockchain.reset_client()
+            print(f'fake chain, {args.latency * 1000:.1f} ms latency, {args.block_time * 1000:.1f} ms block time')
+            run(args, chain)
+    blockchain.reset_client()
+
+
+if __name__ == '__main__':
+    main()
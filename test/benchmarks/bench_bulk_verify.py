@@ -0,0 +1,83 @@
+"""
+Compare per-certificate verification with batched JSON-RPC verification.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_bulk_verify --count 500 --latency 0.005
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+
+from benchmarks.database import benchmark_database  # noqa: E402
+from benchmarks.fake_chain import FakeChain  # noqa: E402
+from certificates import blockchain, verification_cache  # noqa: E402
+from certificates.blockchain import get_contract, to_bytes32  # noqa: E402
+from certificates.services.verification_service import verify_certificates  # noqa: E402
+
+ISSUER = '0x' + '11' * 20
+STUDENT = '0x' + '22' * 20
+CONTRACT_ADDRESS = '0x' + '33' * 20
+
+
+def verify_one_by_one(certificate_hashes):
+    contract = get_contract()
+    return {
+        certificate_hash: contract.functions.verifyCertificate(to_bytes32(certificate_hash)).call()
+        for certificate_hash in certificate_hashes
+    }
+
+
+def clear_verification_cache():
+    verification_cache.local_cache.clear()
+    caches[settings.VERIFICATION_CACHE_ALIAS].clear()
+
+
+def timed(label, chain, fn, *args):
+    chain.http_requests = 0
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    count = len(args[0])
+    print(f'{label:<28} {elapsed:8.3f}s {count / elapsed:10.1f} certs/s {chain.http_requests:6d} HTTP requests')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added per HTTP round trip')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 50, 100, 250])
+    args = parser.parse_args()
+
+    with benchmark_database(), FakeChain(latency=args.latency) as chain:
+        certificate_hashes = []
+        for i in range(args.count):
+            certificate_hash = i.to_bytes(32, 'big')
+            chain.issue(certificate_hash, ISSUER, STUDENT)
+            certificate_hashes.append('0x' + certificate_hash.hex())
+
+        settings.WEB3_PROVIDER = chain.url
+        settings.CONTRACT_ADDRESS = CONTRACT_ADDRESS
+        settings.WEB3_POOL_SIZE = 1
+        blockchain.reset_client()
+
+        print(f'{args.count} certificates, {args.latency * 1000:.1f} ms injected latency per round trip')
+        timed('sequential eth_call', chain, verify_one_by_one, certificate_hashes)
+        for batch_size in args.batch_sizes:
+            clear_verification_cache()
+            timed(f'batched (batch_size={batch_size})', chain, verify_certificates, certificate_hashes, batch_size)
+        timed('batched, warm cache', chain, verify_certificates, certificate_hashes)
+
+        blockchain.reset_client()
+
+
+if __name__ == '__main__':
+    main()
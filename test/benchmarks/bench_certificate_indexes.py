@@ -0,0 +1,118 @@
+"""
+Show query plans and latency of the hot Certificate filters without and with the composite indexes.
+
+Seeds a throwaway database, drops the indexes declared in Certificate.Meta,
+measures, recreates them and measures again. Run from the project directory:
+
+    python -m benchmarks.bench_certificate_indexes --rows 1000000
+
+Point DATABASES at PostgreSQL to see its plans; the default SQLite database works too.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from benchmarks.database import benchmark_database  # noqa: E402
+from certificates.models import Certificate, User  # noqa: E402
+
+STATUSES = ['ISSUED'] * 14 + ['APPROVED'] * 3 + ['PENDING', 'REJECTED']
+COURSES = [f'Course {i}' for i in range(50)]
+
+
+def seed(rows, universities, students, batch_size=10000):
+    User.objects.bulk_create([
+        User(username=f'university-{i}', role=User.UNIVERSITY) for i in range(universities)
+    ] + [
+        User(username=f'student-{i}', role=User.STUDENT) for i in range(students)
+    ], batch_size=batch_size)
+    university_ids = list(User.objects.filter(role=User.UNIVERSITY).values_list('id', flat=True))
+    student_ids = list(User.objects.filter(role=User.STUDENT).values_list('id', flat=True))
+
+    rng = random.Random(0)
+    for start in range(0, rows, batch_size):
+        Certificate.objects.bulk_create([
+            Certificate(
+                student_id=rng.choice(student_ids),
+                university_id=rng.choice(university_ids),
+                student_identifier=f'S{i}',
+                course_name=rng.choice(COURSES),
+                completion_date='2025-01-01',
+                certificate_hash=f'0x{i:064x}',
+                status=rng.choice(STATUSES),
+            ) for i in range(start, min(start + batch_size, rows))
+        ])
+        print(f'\rseeded {min(start + batch_size, rows)}/{rows}', end='', flush=True)
+    print()
+
+
+def hot_queries(page_size):
+    """The querysets the dashboard, certificate list and request_certificate run"""
+    sample = Certificate.objects.order_by('id')[Certificate.objects.count() // 2]
+    university, student = sample.university_id, sample.student_id
+    # First keyset page, as certificates.pagination.paginate fetches it
+    page = lambda queryset: queryset.order_by('-issue_date', '-id')[:page_size + 1]  # noqa: E731
+    return [
+        ('pending requests', page(Certificate.objects.filter(university_id=university, status='PENDING'))),
+        ('issued by university', page(Certificate.objects.filter(university_id=university).exclude(status='PENDING'))),
+        ('certificate list', page(Certificate.objects.filter(university_id=university))),
+        ('student certificates', page(Certificate.objects.filter(student_id=student))),
+        # What .exists() sends
+        ('duplicate request check', Certificate.objects.filter(
+            student_id=student, university_id=university, course_name=sample.course_name,
+            status__in=['PENDING', 'APPROVED', 'ISSUED']
+        ).values('id')[:1]),
+    ]
+
+
+def measure(label, connection, repeat):
+    print(f'\n== {label} ==')
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    for name, queryset in hot_queries(settings.CERTIFICATES_PAGE_SIZE):
+        list(queryset.all())  # warm the page cache; .all() so the result cache is not reused
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        print(f'{name:<24} median {statistics.median(timings) * 1000:9.3f} ms   max {max(timings) * 1000:9.3f} ms')
+        for line in queryset.explain().splitlines():
+            print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--universities', type=int, default=200)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    indexes = Certificate._meta.indexes
+    with benchmark_database() as connection:
+        seed(args.rows, args.universities, args.students)
+
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Certificate, index)
+        measure('without composite indexes', connection, args.repeat)
+
+        start = time.perf_counter()
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Certificate, index)
+        print(f'\nbuilt {len(indexes)} indexes in {time.perf_counter() - start:.1f}s')
+        measure('with composite indexes', connection, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
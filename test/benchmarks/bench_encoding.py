@@ -0,0 +1,86 @@
+"""
+Microbenchmarks for certificate content hashing.
+
+Compares the old JSON hash, hashing records one at a time with the canonical
+encoding, and hash_many in-process and across the process pool. Run from the
+project directory:
+
+    python -m benchmarks.bench_encoding --count 10000 1000000 --processes 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from certificates import encoding  # noqa: E402
+
+
+def records(count):
+    return [{
+        'university': f'university-{i % 200}',
+        'student': f'student-{i}',
+        'student_identifier': f'S{i:08d}',
+        'course_name': f'Course {i % 50}',
+        'completion_date': '2025-06-01',
+    } for i in range(count)]
+
+
+def json_one_by_one(batch):
+    # The hash certificates used before the canonical encoding
+    return [hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest() for fields in batch]
+
+
+def canonical_one_by_one(batch):
+    return [encoding.hash_certificate(fields) for fields in batch]
+
+
+def hash_many_in_process(batch):
+    return encoding.hash_many(batch, parallel=False)
+
+
+def hash_many_pool(batch):
+    return encoding.hash_many(batch, parallel=True)
+
+
+def measure(label, fn, batch, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f'{label:<28} median {statistics.median(timings) * 1000:10.1f} ms {len(batch) / best:12.0f} hashes/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--processes', type=int, help='pool size; one per CPU by default')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    settings.ENCODING_PROCESSES = args.processes
+    encoding.hash_many(records(1), parallel=True)  # start the pool outside the timings
+    try:
+        for count in args.count:
+            batch = records(count)
+            print(f'\n== {count} records, {encoding.pool_size()} pool processes ==')
+            measure('json.dumps + sha256', json_one_by_one, batch, args.repeat)
+            measure('canonical, one at a time', canonical_one_by_one, batch, args.repeat)
+            measure('hash_many, in-process', hash_many_in_process, batch, args.repeat)
+            measure('hash_many, process pool', hash_many_pool, batch, args.repeat)
+    finally:
+        encoding.shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
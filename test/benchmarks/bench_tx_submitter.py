@@ -0,0 +1,131 @@
+"""
+Compare sending issuance transactions one at a time with the pipelined TransactionSubmitter.
+
+Run from the project directory against the in-process fake chain:
+
+    python -m benchmarks.bench_tx_submitter --count 500 --latency 0.005 --block-time 0.05 --drop-rate 0.02
+
+or against a local dev chain (Ganache/anvil) with the contract deployed and a funded key:
+
+    python -m benchmarks.bench_tx_submitter --provider http://127.0.0.1:8545 \\
+        --contract 0x... --private-key 0x...
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from eth_account import Account  # noqa: E402
+
+from benchmarks.database import benchmark_database  # noqa: E402
+from benchmarks.fake_chain import FakeChain  # noqa: E402
+from certificates import blockchain  # noqa: E402
+from certificates.blockchain import get_contract, get_web3  # noqa: E402
+from certificates.models import Certificate, User  # noqa: E402
+from certificates.tx_submitter import TransactionSubmitter  # noqa: E402
+
+STUDENT = '0x' + '22' * 20
+CONTRACT_ADDRESS = '0x' + '33' * 20
+POLL_LATENCY = 0.01
+
+
+def send_one_by_one(certificate_hashes, account):
+    """What a single-threaded signer does: fetch the nonce, sign, send and wait for each certificate"""
+    contract = get_contract()
+    w3 = get_web3()
+    for certificate_hash in certificate_hashes:
+        transaction = contract.functions.issueCertificate(certificate_hash, STUDENT).build_transaction({
+            'from': account.address,
+            'nonce': w3.eth.get_transaction_count(account.address, 'pending'),
+            'gas': settings.TX_GAS_LIMIT,
+        })
+        tx_hash = w3.eth.send_raw_transaction(account.sign_transaction(transaction).raw_transaction)
+        w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=POLL_LATENCY)
+
+
+def create_certificates(count, seed):
+    student = User.objects.create(username=f'student-{seed}', role=User.STUDENT, email='student@example.com')
+    university = User.objects.create(username=f'university-{seed}', role=User.UNIVERSITY, wallet_address=f'0x{seed:040x}'[:42])
+    Certificate.objects.bulk_create([
+        Certificate(
+            student=student, university=university, course_name='Benchmarking', completion_date='2025-01-01',
+            certificate_hash=f'0x{seed + i:064x}', status='APPROVED', wallet_address=STUDENT
+        ) for i in range(count)
+    ])
+    return list(Certificate.objects.filter(university=university).select_related('student', 'university'))
+
+
+def send_pipelined(certificates, private_key):
+    submitter = TransactionSubmitter(private_key=private_key).start()
+    submitter.submit(certificates)
+    submitter.drain()
+    submitter.stop()
+    assert submitter.issued == len(certificates), f'{len(submitter.failed)} failed'
+
+
+def timed(label, count, chain, fn, *args):
+    if chain:
+        chain.http_requests = 0
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    requests = f'{chain.http_requests:6d} HTTP requests' if chain else ''
+    print(f'{label:<30} {elapsed:8.3f}s {count / elapsed:10.1f} certs/s {requests}')
+
+
+def run(args, private_key, chain=None):
+    account = Account.from_key(private_key)
+    seed = time.time_ns()
+    print(f'{args.count} certificates')
+    if args.drop_rate:
+        # A dropped transaction would leave the naive sender waiting for a receipt forever
+        print('sequential baseline skipped: it cannot recover dropped transactions')
+    else:
+        timed('sequential sign/send/wait', args.count, chain, send_one_by_one,
+              [(seed + 2 ** 128 + i).to_bytes(32, 'big') for i in range(args.count)], account)
+    settings.TX_POLL_INTERVAL = POLL_LATENCY
+    settings.TX_RESUBMIT_AFTER = args.resubmit_after
+    for max_in_flight in args.max_in_flight:
+        settings.TX_MAX_IN_FLIGHT = max_in_flight
+        certificates = create_certificates(args.count, seed + max_in_flight * 2 ** 64)
+        timed(f'submitter, {max_in_flight} in flight', args.count, chain, send_pipelined, certificates, private_key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added per HTTP round trip')
+    parser.add_argument('--block-time', type=float, default=0.05, help='seconds before a sent transaction is mined')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='fraction of first broadcasts the fake chain loses')
+    parser.add_argument('--resubmit-after', type=float, default=1.0, help='seconds before a rebroadcast')
+    parser.add_argument('--max-in-flight', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--provider', help='JSON-RPC URL of a dev chain; defaults to the in-process fake chain')
+    parser.add_argument('--contract', help='CertificateContract address on --provider')
+    parser.add_argument('--private-key', help='funded account on --provider')
+    args = parser.parse_args()
+
+    settings.WEB3_POOL_SIZE = 1
+    with benchmark_database():
+        if args.provider:
+            settings.WEB3_PROVIDER = args.provider
+            settings.CONTRACT_ADDRESS = args.contract
+            blockchain.reset_client()
+            run(args, args.private_key)
+        else:
+            with FakeChain(latency=args.latency, block_time=args.block_time, drop_rate=args.drop_rate) as chain:
+                settings.WEB3_PROVIDER = chain.url
+                settings.CONTRACT_ADDRESS = CONTRACT_ADDRESS
+                blockchain.reset_client()
+                print(f'fake chain, {args.latency * 1000:.1f} ms latency, {args.block_time * 1000:.1f} ms block time, '
+                      f'{args.drop_rate:.0%} of broadcasts dropped')
+                run(args, Account.create().key.hex(), chain)
+    blockchain.reset_client()
+
+
+if __name__ == '__main__':
+    main()
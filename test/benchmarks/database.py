@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def benchmark_database(name=None):
+    """
+    Run against a freshly migrated throwaway database instead of the configured one.
+    name overrides the test database name, e.g. with a file so that other
+    processes can open an SQLite database that would otherwise live in memory.
+    """
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,389 @@
+"""
+In-process JSON-RPC node that implements CertificateContract.
+
+Good enough to stand in for Ganache/anvil when measuring client behaviour:
+it answers single and batched requests and can add a fixed latency to every
+HTTP round trip to simulate a remote node. Transactions sent with
+eth_sendTransaction, or signed and sent with eth_sendRawTransaction (mined
+in nonce order, replaceable with a 10% fee bump, and left in the pool while
+their maxFeePerGas is below min_fee), are mined at once (or after block_time
+seconds) and priced with an approximation of the EVM gas schedule. Signed
+transactions without calldata are plain transfers.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from web3 import Web3
+
+VERIFY_SELECTOR = Web3.keccak(text='verifyCertificate(bytes32)')[:4]
+BATCHES_SELECTOR = Web3.keccak(text='batches(bytes32)')[:4]
+REVOKED_BATCHED_SELECTOR = Web3.keccak(text='revokedBatchedCertificates(bytes32)')[:4]
+ISSUE_SELECTOR = Web3.keccak(text='issueCertificate(bytes32,address)')[:4]
+ISSUE_BATCH_SELECTOR = Web3.keccak(text='issueCertificateBatch(bytes32,uint256)')[:4]
+ISSUED_TOPIC = Web3.to_hex(Web3.keccak(text='CertificateIssued(bytes32,address,address)'))
+REVOKED_TOPIC = Web3.to_hex(Web3.keccak(text='CertificateRevoked(bytes32)'))
+BATCH_ISSUED_TOPIC = Web3.to_hex(Web3.keccak(text='CertificateBatchIssued(bytes32,address,uint256)'))
+CHAIN_ID = 1337
+GAS_PER_TX = 52000
+
+# Approximate EVM gas schedule for transactions sent to the fake chain
+TX_BASE_GAS = 21000
+CALLDATA_ZERO_BYTE_GAS = 4
+CALLDATA_BYTE_GAS = 16
+SSTORE_SET_GAS = 22100
+LOG_GAS = 375
+LOG_TOPIC_GAS = 375
+LOG_DATA_BYTE_GAS = 8
+# Storage slots written by issueCertificate (Certificate struct) and issueCertificateBatch (Batch struct)
+CERTIFICATE_SLOTS = 4
+BATCH_SLOTS = 3
+
+
+def calldata_gas(data):
+    return sum(CALLDATA_BYTE_GAS if byte else CALLDATA_ZERO_BYTE_GAS for byte in data)
+
+
+def _topic(value):
+    """Left-pad a bytes32 or address value to a 32-byte log topic"""
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:])
+    return '0x' + value.rjust(32, b'\0').hex()
+
+
+class RPCError(Exception):
+    """A node-level error such as a rejected nonce, as opposed to a contract revert"""
+
+
+def _block_hash(number):
+    return Web3.to_hex(Web3.keccak(number.to_bytes(32, 'big')))
+
+
+class FakeChain:
+    def __init__(self, latency=0.0, block_time=0.0, drop_rate=0.0, seed=0, min_fee=0):
+        self.latency = latency
+        self.block_time = block_time
+        self.min_fee = min_fee
+        # Fraction of first broadcasts silently lost, to exercise rebroadcasting
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self.nonces = {}
+        self.txpool = {}
+        self.broadcast_nonces = set()
+        self.certificates = {}
+        self.batches = {}
+        self.revoked_batched = set()
+        self.logs = []
+        self.receipts = {}
+        self.block_gas = {}
+        self.block_number = 0
+        self.address = '0x' + '33' * 20
+        self.sender = '0x' + '11' * 20
+        self.genesis_timestamp = int(time.time())
+        self.http_requests = 0
+        self.rpc_calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def issue(self, certificate_hash, issuer, student, timestamp=None, revoked=False):
+        self.certificates[bytes(certificate_hash)] = (
+            issuer, student, revoked, timestamp or int(time.time())
+        )
+        return self._emit([ISSUED_TOPIC, certificate_hash, issuer, student])
+
+    def revoke(self, certificate_hash):
+        issuer, student, _, timestamp = self.certificates[bytes(certificate_hash)]
+        self.certificates[bytes(certificate_hash)] = (issuer, student, True, timestamp)
+        self._emit([REVOKED_TOPIC, certificate_hash])
+
+    def revoke_batched(self, certificate_hash):
+        self.revoked_batched.add(bytes(certificate_hash))
+        self._emit([REVOKED_TOPIC, certificate_hash])
+
+    def _emit(self, topics, data=b'', gas_used=GAS_PER_TX, sender=None, tx_hash=None):
+        """
+        Mine a block holding a single transaction that logs the given topics
+        (or, with topics=None, one that reverted, and with no topics, a plain
+        transfer); returns its hash.
+        """
+        self.block_number += 1
+        tx_hash = tx_hash or '0x' + (self.block_number + 2 ** 128).to_bytes(32, 'big').hex()
+        log = {
+            'address': self.address,
+            'topics': [
+                topic if isinstance(topic, str) and len(topic) == 66 else _topic(topic) for topic in topics
+            ],
+            'data': '0x' + data.hex(),
+            'blockNumber': hex(self.block_number),
+            'blockHash': _block_hash(self.block_number),
+            'transactionHash': tx_hash,
+            'transactionIndex': '0x0',
+            'logIndex': '0x0',
+            'removed': False,
+        }
+        if topics:
+            self.logs.append(log)
+        self.block_gas[self.block_number] = gas_used
+        self.receipts[tx_hash] = ({
+            'transactionHash': tx_hash,
+            'transactionIndex': '0x0',
+            'blockHash': log['blockHash'],
+            'blockNumber': log['blockNumber'],
+            'from': sender or self.sender,
+            'to': self.address,
+            'gasUsed': hex(gas_used),
+            'cumulativeGasUsed': hex(gas_used),
+            'contractAddress': None,
+            'logs': [log] if topics else [],
+            'logsBloom': '0x' + '00' * 256,
+            'status': '0x1' if topics is not None else '0x0',
+            'type': '0x2',
+            'effectiveGasPrice': hex(10 ** 9),
+        }, time.monotonic() + self.block_time)
+        return tx_hash
+
+    def handle(self, request):
+        method = request.get('method')
+        params = request.get('params') or []
+        handler = getattr(self, f'rpc_{method}', None)
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': f'Method {method} not found'}}
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': handler(*params)}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': 3, 'message': f'execution reverted: {e}'}}
+        except RPCError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32000, 'message': str(e)}}
+
+    def rpc_eth_chainId(self):
+        return hex(CHAIN_ID)
+
+    def rpc_web3_clientVersion(self):
+        return 'FakeChain/v1'
+
+    def rpc_eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def rpc_eth_getBlockByNumber(self, block, full_transactions=False):
+        number = self.block_number if block == 'latest' else int(block, 16)
+        if number > self.block_number:
+            return None
+        return {
+            'number': hex(number),
+            'hash': _block_hash(number),
+            'parentHash': _block_hash(number - 1) if number else '0x' + '00' * 32,
+            'timestamp': hex(self.genesis_timestamp + number),
+            'gasUsed': hex(self.block_gas.get(number, 0)),
+            'gasLimit': hex(30_000_000),
+            'baseFeePerGas': hex(10 ** 9),
+            'transactions': [],
+        }
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash):
+        receipt, mined_at = self.receipts.get(tx_hash, (None, 0))
+        if receipt is None or time.monotonic() < mined_at:
+            return None
+        return receipt
+
+    def rpc_eth_getTransactionByHash(self, tx_hash):
+        receipt, mined_at = self.receipts.get(tx_hash, (None, 0))
+        if receipt is None or time.monotonic() < mined_at:
+            return None
+        return {
+            'hash': tx_hash,
+            'blockHash': receipt['blockHash'],
+            'blockNumber': receipt['blockNumber'],
+            'transactionIndex': receipt['transactionIndex'],
+            'from': receipt['from'],
+            'to': receipt['to'],
+            'nonce': '0x0',
+            'gas': receipt['gasUsed'],
+            'gasPrice': receipt['effectiveGasPrice'],
+            'value': '0x0',
+            'input': '0x',
+            'type': '0x0',
+            'v': '0x1b',
+            'r': '0x' + '11' * 32,
+            's': '0x' + '22' * 32,
+        }
+
+    def rpc_eth_sendTransaction(self, transaction):
+        with self._lock:
+            return self._execute(transaction)
+
+    def rpc_eth_sendRawTransaction(self, raw_transaction):
+        raw = HexBytes(raw_transaction)
+        transaction = TypedTransaction.from_bytes(raw).as_dict()
+        sender = Account.recover_transaction(raw)
+        tx_hash = Web3.to_hex(Web3.keccak(raw))
+        nonce = transaction['nonce']
+        with self._lock:
+            if nonce < self.nonces.get(sender, 0):
+                raise RPCError('nonce too low')
+            pending = self.txpool.get((sender, nonce))
+            if pending is not None:
+                if pending[0] == tx_hash:
+                    raise RPCError('already known')
+                if transaction['maxFeePerGas'] * 10 < pending[1]['maxFeePerGas'] * 11:
+                    raise RPCError('replacement transaction underpriced')
+            if (sender, nonce) not in self.broadcast_nonces:
+                self.broadcast_nonces.add((sender, nonce))
+                if self._random.random() < self.drop_rate:
+                    return tx_hash
+            self.txpool[(sender, nonce)] = (tx_hash, transaction)
+            self._mine_pending(sender)
+        return tx_hash
+
+    def _mine_pending(self, sender):
+        """Execute the sender's pooled transactions whose nonces are next in line"""
+        while (sender, self.nonces.get(sender, 0)) in self.txpool:
+            if self.txpool[(sender, self.nonces.get(sender, 0))][1]['maxFeePerGas'] < self.min_fee:
+                break  # priced too low; later nonces wait behind it
+            tx_hash, transaction = self.txpool.pop((sender, self.nonces.get(sender, 0)))
+            self.nonces[sender] = self.nonces.get(sender, 0) + 1
+            if not transaction['data']:
+                self._emit([], gas_used=TX_BASE_GAS, sender=sender, tx_hash=tx_hash)
+                continue
+            call = {'from': sender, 'data': Web3.to_hex(transaction['data'])}
+            try:
+                self._execute(call, tx_hash=tx_hash)
+            except ValueError:
+                self._emit(None, gas_used=TX_BASE_GAS, sender=sender, tx_hash=tx_hash)
+
+    def rpc_eth_getTransactionCount(self, address, block='latest'):
+        address = Web3.to_checksum_address(address)
+        with self._lock:
+            return hex(self.nonces.get(address, 0))
+
+    def rpc_eth_estimateGas(self, transaction, block='latest'):
+        with self._lock:
+            return hex(self._execute(transaction, estimate=True))
+
+    def rpc_eth_gasPrice(self):
+        return hex(10 ** 9)
+
+    def rpc_eth_maxPriorityFeePerGas(self):
+        return hex(10 ** 9)
+
+    def _execute(self, transaction, estimate=False, tx_hash=None):
+        """Apply a contract transaction and mine it; with estimate=True only price it"""
+        data = bytes.fromhex(transaction['data'][2:])
+        sender = Web3.to_checksum_address(transaction['from'])
+        selector, args = data[:4], data[4:]
+        if selector == ISSUE_SELECTOR:
+            certificate_hash, student = decode(['bytes32', 'address'], args)
+            if certificate_hash in self.certificates:
+                raise ValueError('Certificate already exists')
+            if not estimate:
+                self.certificates[certificate_hash] = (sender, student, False, int(time.time()))
+            topics = [ISSUED_TOPIC, certificate_hash, sender, student]
+            log_data, slots = b'', CERTIFICATE_SLOTS
+        elif selector == ISSUE_BATCH_SELECTOR:
+            merkle_root, size = decode(['bytes32', 'uint256'], args)
+            if merkle_root in self.batches:
+                raise ValueError('Batch already exists')
+            if not estimate:
+                self.batches[merkle_root] = (sender, size, int(time.time()))
+            topics = [BATCH_ISSUED_TOPIC, merkle_root, sender]
+            log_data, slots = encode(['uint256'], [size]), BATCH_SLOTS
+        else:
+            raise ValueError('unknown function')
+
+        gas_used = (
+            TX_BASE_GAS + calldata_gas(data) + slots * SSTORE_SET_GAS
+            + LOG_GAS + LOG_TOPIC_GAS * len(topics) + LOG_DATA_BYTE_GAS * len(log_data)
+        )
+        if estimate:
+            return gas_used
+        return self._emit(topics, log_data, gas_used, sender, tx_hash)
+
+    def rpc_eth_getLogs(self, log_filter):
+        from_block = int(log_filter.get('fromBlock', '0x0'), 16)
+        to_block = int(log_filter.get('toBlock', hex(self.block_number)), 16)
+        topics = (log_filter.get('topics') or [None])[0]
+        if isinstance(topics, str):
+            topics = [topics]
+        return [
+            log for log in self.logs
+            if from_block <= int(log['blockNumber'], 16) <= to_block
+            and (not topics or log['topics'][0] in topics)
+        ]
+
+    def rpc_eth_call(self, transaction, block='latest'):
+        data = bytes.fromhex(transaction['data'][2:])
+        if data[:4] == BATCHES_SELECTOR:
+            (merkle_root,) = decode(['bytes32'], data[4:])
+            issuer, size, timestamp = self.batches.get(merkle_root, ('0x' + '00' * 20, 0, 0))
+            return '0x' + encode(['address', 'uint256', 'uint256'], [issuer, size, timestamp]).hex()
+        if data[:4] == REVOKED_BATCHED_SELECTOR:
+            (certificate_hash,) = decode(['bytes32'], data[4:])
+            return '0x' + encode(['bool'], [certificate_hash in self.revoked_batched]).hex()
+        if data[:4] != VERIFY_SELECTOR:
+            raise ValueError('unknown function')
+        (certificate_hash,) = decode(['bytes32'], data[4:])
+        if certificate_hash not in self.certificates:
+            raise ValueError('Certificate does not exist')
+        issuer, student, revoked, timestamp = self.certificates[certificate_hash]
+        return '0x' + encode(
+            ['bool', 'address', 'address', 'uint256'], [not revoked, issuer, student, timestamp]
+        ).hex()
+
+    def start(self):
+        chain = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if chain.latency:
+                    time.sleep(chain.latency)
+                with chain._lock:
+                    chain.http_requests += 1
+                    chain.rpc_calls += len(payload) if isinstance(payload, list) else 1
+                if isinstance(payload, list):
+                    response = [chain.handle(item) for item in payload]
+                else:
+                    response = chain.handle(payload)
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(ThreadingHTTPServer):
+            # The default listen backlog of 5 resets connections under hundreds of concurrent clients
+            request_queue_size = 1024
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,127 @@
+"""
+In-process stand-in for the IPFS (kubo) HTTP API.
+
+Implements /api/v0/add and /api/v0/cat, the two endpoints the IPFS clients
+use, with a fixed latency added to every call to simulate a remote daemon.
+Uploads may be sent with Content-Length or chunked, as add_stream does.
+Content is kept in memory under a CIDv0-shaped base58 multihash of its
+SHA-256 (not the UnixFS CID a real node would compute).
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def base58(data):
+    number = int.from_bytes(data, 'big')
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    return '1' * (len(data) - len(data.lstrip(b'\0'))) + encoded
+
+
+def content_id(data):
+    # sha2-256 multihash: function code 0x12, digest length 32
+    return base58(b'\x12\x20' + hashlib.sha256(data).digest())
+
+
+def multipart_file(body, content_type):
+    """The first part of a multipart/form-data body"""
+    boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+    start = body.index(b'\r\n\r\n', body.index(b'--' + boundary)) + 4
+    return body[start:body.index(b'\r\n--' + boundary, start)]
+
+
+class FakeIPFS:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.blobs = {}
+        self.http_requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def add(self, data):
+        cid = content_id(data)
+        with self._lock:
+            self.blobs[cid] = data
+        return cid
+
+    def start(self):
+        ipfs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+                    return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                chunks = []
+                while size := int(self.rfile.readline().split(b';')[0], 16):
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                # Trailers, if any, end with an empty line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+
+            def respond(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                body = self.read_body()
+                if ipfs.latency:
+                    time.sleep(ipfs.latency)
+                with ipfs._lock:
+                    ipfs.http_requests += 1
+
+                if url.path == '/api/v0/add':
+                    data = multipart_file(body, self.headers['Content-Type'])
+                    cid = ipfs.add(data)
+                    self.respond(200, json.dumps({'Name': cid, 'Hash': cid, 'Size': str(len(data))}).encode())
+                elif url.path == '/api/v0/cat':
+                    cid = parse_qs(url.query).get('arg', [''])[0]
+                    data = ipfs.blobs.get(cid)
+                    if data is None:
+                        # kubo's answer for content it can't resolve
+                        self.respond(500, json.dumps({'Message': 'block was not found locally', 'Code': 0}).encode())
+                    else:
+                        self.respond(200, data, 'text/plain')
+                else:
+                    self.respond(404, b'404 page not found', 'text/plain')
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,436 @@
+"""
+Load-test the HTTP hot paths against local stand-ins for the chain and IPFS.
+
+Serves the project from a child process against a throwaway database, the
+fake chain and a fake IPFS API, drives each scenario at fixed concurrency
+levels and writes latency percentiles and throughput to a JSON file. With
+--compare, results are checked against an earlier run (e.g. of another
+commit) and the command exits non-zero if any level regressed by more than
+--threshold. MongoDB is only written by the outbox relay, off the request
+path; pass --mongo-uri to also time draining the outbox the write scenarios
+filled.
+
+Run from the project directory:
+
+    python -m benchmarks.loadtest --concurrency 1 10 50 --output base.json
+    python -m benchmarks.loadtest --concurrency 1 10 50 --compare base.json
+    python -m benchmarks.loadtest --compare base.json new.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import aiohttp
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'certblock.settings')
+# Per-request warnings (slow calls, 4xx) would drown the results; errors are counted anyway
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils.crypto import get_random_string  # noqa: E402
+from web3 import Web3  # noqa: E402
+
+from benchmarks.database import benchmark_database  # noqa: E402
+from benchmarks.fake_chain import FakeChain  # noqa: E402
+from benchmarks.fake_ipfs import FakeIPFS  # noqa: E402
+from certificates.models import Certificate, OutboxMessage, User  # noqa: E402
+from certificates.outbox import relay_outbox  # noqa: E402
+
+ISSUER = '0x' + '11' * 20
+STUDENT = '0x' + '22' * 20
+CONTRACT_ADDRESS = '0x' + '33' * 20
+PERCENTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+
+
+class Fixtures:
+    """Users, certificates and credentials shared by the scenarios"""
+
+    def __init__(self, chain, verify_count, pending_count, upload_size):
+        self.university = User.objects.create(
+            username='loadtest-university', role=User.UNIVERSITY, email='university@example.com'
+        )
+        self.student = User.objects.create(
+            username='loadtest-student', role=User.STUDENT, email='student@example.com'
+        )
+        issued = []
+        for i in range(verify_count):
+            certificate_hash = Web3.keccak(text=f'loadtest-issued-{i}')
+            tx_hash = chain.issue(certificate_hash, ISSUER, STUDENT)
+            issued.append(self._certificate(Web3.to_hex(certificate_hash), blockchain_tx=tx_hash, status='ISSUED'))
+        pending = [
+            self._certificate(Web3.to_hex(Web3.keccak(text=f'loadtest-pending-{i}')), status='PENDING')
+            for i in range(pending_count)
+        ]
+        Certificate.objects.bulk_create(issued + pending)
+        self.verify_hashes = [certificate.certificate_hash for certificate in issued]
+        self.pending_ids = list(
+            Certificate.objects.filter(status='PENDING').order_by('id').values_list('id', flat=True)
+        )
+        self.upload_body = os.urandom(upload_size)
+
+        client = Client()
+        client.force_login(self.university)
+        self.session_id = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.csrf_token = get_random_string(32)
+
+    def _certificate(self, certificate_hash, **kwargs):
+        return Certificate(
+            student=self.student, university=self.university, course_name='Load testing',
+            completion_date='2025-01-01', certificate_hash=certificate_hash, **kwargs
+        )
+
+    def headers(self, authenticated):
+        # A matching cookie and header pass CsrfViewMiddleware without fetching a form first
+        cookies = f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}'
+        if authenticated:
+            cookies += f'; {settings.SESSION_COOKIE_NAME}={self.session_id}'
+        return {'Cookie': cookies, 'X-CSRFToken': self.csrf_token}
+
+
+# Each scenario builds its index-th request: (path, form data, sent as the university)
+
+def verify_request(fixtures, index):
+    return f'/verify/{fixtures.verify_hashes[index % len(fixtures.verify_hashes)]}/', None, False
+
+
+def upload_request(fixtures, index):
+    form = aiohttp.FormData()
+    # Distinct content per request, so every upload is a new CID
+    form.add_field('file', f'{index}\n'.encode() + fixtures.upload_body, filename=f'loadtest-{index}.bin')
+    return '/upload/', form, False
+
+
+def issue_request(fixtures, index):
+    return '/issue/', {
+        'student_name': fixtures.student.username,
+        'course_name': f'Load testing {index}',
+        'issue_date': '2025-01-01',
+    }, True
+
+
+def approve_request(fixtures, index):
+    return f'/requests/{fixtures.pending_ids[index]}/review/', {'action': 'approve'}, True
+
+
+SCENARIOS = {
+    'verify': verify_request,
+    'upload': upload_request,
+    'issue': issue_request,
+    'approve': approve_request,
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile"""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    summary = {'mean': sum(latencies) / len(latencies) * 1000}
+    summary.update((name, percentile(latencies, q) * 1000) for name, q in PERCENTILES.items())
+    summary['max'] = latencies[-1] * 1000
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'latency_ms': {name: round(value, 3) for name, value in summary.items()},
+    }
+
+
+async def drive(base_url, fixtures, build, indexes, concurrency, count, timeout):
+    """Send count requests with concurrency in flight; returns (latencies, statuses, elapsed)"""
+    latencies = []
+    statuses = Counter()
+    remaining = iter(range(count))
+    session = aiohttp.ClientSession(
+        base_url,
+        connector=aiohttp.TCPConnector(limit=concurrency),
+        cookie_jar=aiohttp.DummyCookieJar(),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    )
+
+    async def worker():
+        for _ in remaining:
+            path, data, authenticated = build(fixtures, next(indexes))
+            start = time.perf_counter()
+            try:
+                async with session.post(path, data=data, headers=fixtures.headers(authenticated),
+                                        allow_redirects=False) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    async with session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+def run_scenario(base_url, fixtures, name, levels, count, warmup, timeout):
+    build = SCENARIOS[name]
+    # One sequence per scenario, so no level reuses another's certificates or course names
+    indexes = itertools.count()
+    results = []
+    for concurrency in levels:
+        if warmup:
+            asyncio.run(drive(base_url, fixtures, build, indexes, concurrency, warmup, timeout))
+        latencies, statuses, elapsed = asyncio.run(
+            drive(base_url, fixtures, build, indexes, concurrency, count, timeout)
+        )
+        result = {'concurrency': concurrency, **summarize(latencies, elapsed)}
+        # Redirects count as success: approve_request answers with one
+        result['errors'] = sum(n for status, n in statuses.items() if not isinstance(status, int) or status >= 400)
+        result['statuses'] = {str(status): n for status, n in sorted(statuses.items(), key=str)}
+        results.append(result)
+        print_result(name, result)
+    return results
+
+
+def relay_scenario(mongo_uri):
+    """Time draining the outbox filled by the write scenarios into MongoDB, batch by batch"""
+    settings.MONGODB_URI = mongo_uri
+    queued = OutboxMessage.objects.count()
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        batch_start = time.perf_counter()
+        if not relay_outbox():
+            break
+        latencies.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - start
+    if not latencies:
+        print(f'outbox relay: nothing relayed out of {queued} messages')
+        return []
+    left = OutboxMessage.objects.count()
+    result = {'concurrency': 1, **summarize(latencies, elapsed), 'errors': left}
+    # Throughput in messages rather than batches
+    result['throughput'] = (queued - left) / elapsed
+    print_result('relay', result)
+    return [result]
+
+
+def print_result(name, result):
+    latency = result['latency_ms']
+    print(
+        f"{name:<8} {result['concurrency']:>5} in flight {result['throughput']:9.1f}/s "
+        f"p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms  "
+        f"{result['errors']} errors"
+    )
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, database_name, overrides, server):
+    """Child process: serve the project against the benchmark database and the fakes"""
+    connection.settings_dict['NAME'] = database_name
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    if server == 'asgi':
+        import uvicorn
+        from certblock.asgi import application
+        uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning')
+    else:
+        from certblock.wsgi import application
+        make_server('127.0.0.1', port, application, ThreadingWSGIServer, QuietHandler).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise SystemExit(f'Server exited with code {process.exitcode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f'Server did not start listening on port {port} within {timeout}s')
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def run(args):
+    levels = sorted(set(args.concurrency))
+    writes = (args.requests + args.warmup) * len(levels)
+    if args.server == 'asgi':
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise SystemExit('--server asgi needs uvicorn installed')
+
+    with tempfile.TemporaryDirectory() as directory, FakeChain(latency=args.chain_latency) as chain, \
+            FakeIPFS(latency=args.ipfs_latency) as ipfs:
+        name = os.path.join(directory, 'loadtest.sqlite3') if connection.vendor == 'sqlite' else None
+        with benchmark_database(name):
+            fixtures = Fixtures(
+                chain, args.verify_certificates, writes if 'approve' in args.scenarios else 0, args.upload_size
+            )
+            overrides = {
+                'DEBUG': False,
+                'ALLOWED_HOSTS': ['127.0.0.1'],
+                'WEB3_PROVIDER': chain.url,
+                'CONTRACT_ADDRESS': CONTRACT_ADDRESS,
+                'WEB3_POOL_SIZE': max(settings.WEB3_POOL_SIZE, max(levels)),
+                'IPFS_API_URL': ipfs.url,
+                'IPFS_CACHE_DIR': os.path.join(directory, 'ipfs_cache'),
+                'MEDIA_ROOT': os.path.join(directory, 'media'),
+                # Every request comes from one address; measure the views, not the per-client limit
+                'RATE_LIMITED_VIEWS': [],
+            }
+            port = free_port()
+            # spawn, not fork: the parent holds database connections and server threads
+            server = multiprocessing.get_context('spawn').Process(
+                target=serve, args=(port, connection.settings_dict['NAME'], overrides, args.server), daemon=True
+            )
+            server.start()
+            try:
+                wait_for_port(port, server)
+                print(
+                    f'{args.requests} requests per level, chain latency {args.chain_latency * 1000:.1f} ms, '
+                    f'IPFS latency {args.ipfs_latency * 1000:.1f} ms, {args.server} server on '
+                    f'{connection.vendor}'
+                )
+                scenarios = {
+                    scenario: run_scenario(f'http://127.0.0.1:{port}', fixtures, scenario, levels,
+                                           args.requests, args.warmup, args.timeout)
+                    for scenario in args.scenarios
+                }
+            finally:
+                server.terminate()
+                server.join()
+            if args.mongo_uri:
+                scenarios['relay'] = relay_scenario(args.mongo_uri)
+
+    return {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            'server': args.server,
+            'database': connection.vendor,
+            'concurrency': levels,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'chain_latency': args.chain_latency,
+            'ipfs_latency': args.ipfs_latency,
+            'verify_certificates': args.verify_certificates,
+            'upload_size': args.upload_size,
+        },
+        'scenarios': scenarios,
+    }
+
+
+def compare(base, new, threshold):
+    """Print the change per scenario and level; returns the regressions beyond threshold"""
+    print(f"{base['commit']} -> {new['commit']}")
+    regressions = []
+    for scenario, results in new['scenarios'].items():
+        base_levels = {result['concurrency']: result for result in base['scenarios'].get(scenario, [])}
+        for result in results:
+            old = base_levels.get(result['concurrency'])
+            if old is None:
+                continue
+            changes = {'throughput': result['throughput'] / old['throughput'] - 1}
+            for name in PERCENTILES:
+                changes[name] = result['latency_ms'][name] / old['latency_ms'][name] - 1 if old['latency_ms'][name] else 0
+            print(f"{scenario:<8} {result['concurrency']:>5} in flight  " + '  '.join(
+                f'{name} {change:+7.1%}' for name, change in changes.items()
+            ))
+            # Less throughput or more latency is worse
+            worse = [name for name, change in changes.items()
+                     if (-change if name == 'throughput' else change) > threshold]
+            if worse or result['errors'] > old['errors']:
+                regressions.append((scenario, result['concurrency'], worse or ['errors']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50], help='requests in flight')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario and level')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests before each level')
+    parser.add_argument('--chain-latency', type=float, default=0.02, help='seconds added per RPC round trip')
+    parser.add_argument('--ipfs-latency', type=float, default=0.05, help='seconds added per IPFS API call')
+    parser.add_argument('--verify-certificates', type=int, default=500, help='issued certificates to verify')
+    parser.add_argument('--upload-size', type=int, default=64 * 1024, help='bytes per uploaded file')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds before a request counts as failed')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                        help='threaded stdlib WSGI server, or uvicorn if installed')
+    parser.add_argument('--mongo-uri', help='also time relaying the outbox to this MongoDB')
+    parser.add_argument('--output', help='results file (default loadtest-<commit>.json)')
+    parser.add_argument('--compare', nargs='+', metavar='RESULTS',
+                        help='compare BASE with NEW, or with a run of the current tree if only BASE is given')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes BASE [NEW]')
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as base_file, open(args.compare[1]) as new_file:
+            base, new = json.load(base_file), json.load(new_file)
+    else:
+        new = run(args)
+        output = args.output or f"loadtest-{new['commit']}.json"
+        with open(output, 'w') as results_file:
+            json.dump(new, results_file, indent=2)
+        print(f'Results written to {output}')
+        if not args.compare:
+            return
+        with open(args.compare[0]) as base_file:
+            base = json.load(base_file)
+
+    regressions = compare(base, new, args.threshold)
+    for scenario, concurrency, metrics in regressions:
+        print(f"Regression: {scenario} at {concurrency} in flight ({', '.join(metrics)})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
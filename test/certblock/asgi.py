@@ -3,6 +3,15 @@ ASGI config for certblock project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The verification views are async, so serve the project with an ASGI server to
+let one worker hold many verifications that are waiting on the chain:
+
+    uvicorn certblock.asgi:application --workers 4
+
+(or gunicorn -k uvicorn.workers.UvicornWorker). Under ASGI each request's sync
+ORM work runs in its own thread, so enable the psycopg pool
+(POSTGRES_POOL_MAX_SIZE) rather than persistent connections.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the other middleware too
+    'certificates.instrumentation.RequestMetricsMiddleware',
+    # Before sessions and auth, so refused requests cost no database queries
+    'certificates.ratelimit.RateLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,12 +80,45 @@ WSGI_APPLICATION = 'certblock.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite unless POSTGRES_DB is set. POSTGRES_REPLICA_HOST adds a 'replica' alias that
+# read-only views read from (see certificates.routers).
+if os.environ.get('POSTGRES_DB'):
+    def postgres_database(host):
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        if os.environ.get('POSTGRES_POOL_MAX_SIZE'):
+            # psycopg pool shared by the threads of a worker; it replaces persistent connections
+            database['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ['POSTGRES_POOL_MAX_SIZE']),
+                'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', '10')),
+            }
+        else:
+            database['CONN_MAX_AGE'] = int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60'))
+        return database
+
+    DATABASES = {'default': postgres_database(os.environ.get('POSTGRES_HOST', 'localhost'))}
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = postgres_database(os.environ['POSTGRES_REPLICA_HOST'])
+        # Tests read the replica alias from the test database instead of creating a second one
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+
+DATABASE_ROUTERS = ['certificates.routers.ReplicaRouter']
 
 
 # Password validation
@@ -133,6 +171,67 @@ AUTH_USER_MODEL = 'certificates.User'
 # Add Web3 settings
 WEB3_PROVIDER = 'http://127.0.0.1:8545'  # Ganache default
 CONTRACT_ADDRESS = 'YOUR_DEPLOYED_CONTRACT_ADDRESS'
+CONTRACT_ABI_PATH = BASE_DIR / 'static' / 'contracts' / 'CertificateContract.json'
+WEB3_REQUEST_TIMEOUT = 10  # seconds per JSON-RPC call
+WEB3_POOL_SIZE = 20  # keep-alive connections shared by all worker threads
+WEB3_HEALTH_CHECK_INTERVAL = 30  # seconds between node reachability checks
+WEB3_BATCH_SIZE = 100  # eth_calls per JSON-RPC batch request
+RPC_MAX_IN_FLIGHT = 20  # JSON-RPC requests a process sends to the node at once
+RPC_ADMISSION_QUEUE_SIZE = 200  # callers allowed to wait for a free slot; the rest get 503 at once
+RPC_ADMISSION_TIMEOUT = 5  # seconds a caller waits for a slot before getting 503
+RPC_BUSY_RETRY_AFTER = 1  # Retry-After seconds sent with those 503s
+
+# Server-side transaction submitter
+ISSUER_PRIVATE_KEY = os.environ.get('ISSUER_PRIVATE_KEY')  # hex key of the account that signs issuances
+TX_MAX_IN_FLIGHT = 64  # unconfirmed transactions allowed at once
+TX_GAS_LIMIT = 200000  # gas limit for issueCertificate, so each send skips eth_estimateGas
+TX_RESUBMIT_AFTER = 30  # seconds before an unmined transaction is rebroadcast with more gas
+TX_GAS_BUMP_PERCENT = 15  # nodes require at least 10% to replace a pending transaction
+TX_MAX_REBROADCASTS = 5
+TX_POLL_INTERVAL = 1  # seconds between receipt polls
+BULK_VERIFY_MAX_HASHES = 1000  # largest list accepted by the bulk verify endpoint
+DOCUMENT_FINGERPRINT_BATCH_SIZE = 200  # certificates hashed per backfill batch
+DOCUMENT_FINGERPRINT_WORKERS = 8  # files hashed in parallel by the backfill
+MERKLE_BATCH_SIZE = 1024  # certificates anchored under one Merkle root
+MERKLE_RECEIPT_TIMEOUT = 120  # seconds to wait for a batch anchor to be mined
+
+# Caching
+# The verification cache is only invalidated across processes when 'default'
+# is a shared backend (Redis, Memcached); with local memory, entries are kept
+# for VERIFICATION_CACHE_LOCAL_TTL instead, so a revocation reaches every
+# worker within a few seconds.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+VERIFICATION_CACHE_ALIAS = 'default'
+VERIFICATION_CACHE_TTL = 300  # seconds a chain result stays in the shared cache
+VERIFICATION_CACHE_LOCAL_SIZE = 10000  # entries in the per-process LRU tier
+VERIFICATION_CACHE_LOCAL_TTL = 5  # seconds; bounds how long a worker misses an invalidation
+RATE_LIMIT_CACHE_ALIAS = 'default'  # shared token buckets; None keeps them per process
+RATE_LIMIT_LOCAL_SIZE = 10000  # buckets kept in memory while the cache is unreachable
+RATE_LIMITED_VIEWS = [  # route names of the public, chain-backed endpoints
+    'certificates:verify_certificate',
+    'certificates:verify_by_document',
+    'certificates:verify_bulk',
+    'certificates:certificate_verification',
+]
+RATE_LIMIT_RATE = 10  # requests per second per client IP
+RATE_LIMIT_BURST = 50  # requests a client may send at once after a pause
+RATE_LIMIT_API_KEYS = {}  # X-API-Key value -> (requests per second, burst) for clients needing more than an IP
+RATE_LIMIT_TRUSTED_PROXIES = 0  # reverse proxies in front of Django that append to X-Forwarded-For
+VERIFICATION_API_ISSUED_MAX_AGE = 300  # seconds clients may reuse an issued certificate's status; it can still be revoked
+VERIFICATION_API_REVOKED_MAX_AGE = 86400  # revocation is final
+VERIFICATION_API_PENDING_MAX_AGE = 30  # unknown, not yet on chain or not yet indexed
+VERIFICATION_EVENT_POLL_INTERVAL = 2  # seconds between watch_certificate_events polls
+
+# Event indexer (index_certificate_events)
+INDEXER_START_BLOCK = 0  # block the contract was deployed in
+INDEXER_MAX_BLOCK_RANGE = 2000  # largest eth_getLogs range per request
+INDEXER_CONFIRMATIONS = 0  # blocks to stay behind the head; raise on public networks
+INDEXER_REORG_DEPTH = 12  # blocks to rewind when the checkpoint block is reorged out
+INDEXER_POLL_INTERVAL = 2  # seconds between polls once caught up
 
 # Add these lines at the end of settings.py
 MEDIA_URL = '/media/'
@@ -148,8 +247,80 @@ AUTH_USER_MODEL = 'certificates.User'
 # IPFS Configuration
 IPFS_HOST = 'localhost'  # or your IPFS node address
 IPFS_PORT = 5001
+IPFS_API_URL = f'http://{IPFS_HOST}:{IPFS_PORT}'  # or a hosted API such as Infura
+IPFS_AUTH = None  # (project_id, project_secret) for hosted IPFS APIs
+IPFS_MAX_RETRIES = 3  # retries for connection errors and 502/503/504
+IPFS_RETRY_BACKOFF = 0.2  # seconds, doubled on every retry
+IPFS_UPLOAD_CONCURRENCY = 16  # parallel uploads during bulk approval
+IPFS_POOL_SIZE = 20  # keep-alive connections to the IPFS API
+IPFS_TIMEOUT = 60  # seconds per IPFS API call
+IPFS_CACHE_DIR = BASE_DIR / 'ipfs_cache'  # local content-addressed blob cache
+IPFS_CACHE_MAX_BYTES = 2 * 1024 ** 3
+IPFS_CACHE_SCAN_INTERVAL = 60  # seconds between re-measuring the cache directory, which other workers also fill
+IPFS_CACHE_MAX_AGE = 31536000  # CIDs never change, so clients may cache for a year
+
+BULK_APPROVE_MAX_IDS = 5000  # largest list accepted by the bulk approve/reject endpoint
+CERTIFICATES_PAGE_SIZE = 50  # rows per dashboard/list page
+BULK_IMPORT_BATCH_SIZE = 1000  # roster rows resolved, inserted and pinned together by import_certificates
+BULK_IMPORT_MAX_ERRORS = 100  # per-row errors kept in an import summary
+ENCODING_PROCESSES = None  # hash_many worker processes; None means one per CPU
+ENCODING_PARALLEL_THRESHOLD = 50000  # smaller hash_many batches are hashed in-process
 
 # MongoDB Settings
 MONGODB_URI = 'mongodb://localhost:27017/'
 MONGODB_NAME = 'certblock'
-BLOCKCHAIN_NETWORK = 'polygon_mumbai'  # or 'ethereum_mainnet', etc.
\ No newline at end of file
+MONGODB_MAX_POOL_SIZE = 50  # connections per worker process
+MONGODB_MIN_POOL_SIZE = 0
+MONGODB_MAX_IDLE_TIME_MS = 60000
+MONGODB_CONNECT_TIMEOUT_MS = 5000
+MONGODB_SOCKET_TIMEOUT_MS = 10000
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = 5000
+MONGODB_WRITE_CONCERN = 1  # or 'majority'
+MONGODB_WRITE_CONCERN_TIMEOUT_MS = 5000
+MONGODB_INDEX_RETRY_INTERVAL = 300  # seconds before a process retries indexes that failed to build
+
+# Outbox relay to MongoDB (relay_outbox)
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_POLL_INTERVAL = 1  # seconds to wait when the outbox is empty
+OUTBOX_MAX_ATTEMPTS = 10  # failed messages stay in the table for inspection after this
+OUTBOX_MAX_BACKOFF = 60  # seconds; longest wait between retries after a database or MongoDB error
+
+# Email notification queue (send_notifications)
+NOTIFICATION_BATCH_SIZE = 200
+NOTIFICATION_POLL_INTERVAL = 5  # seconds between queue polls
+NOTIFICATION_DIGEST_WINDOW = 300  # seconds to collect pending-request notices per admin into one digest
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_MAX_BACKOFF = 60  # seconds; longest wait between retries after a database or SMTP error
+BLOCKCHAIN_NETWORK = 'polygon_mumbai'  # or 'ethereum_mainnet', etc.
+
+# Instrumentation: spans, /metrics and structured logs (certificates.instrumentation)
+METRICS_LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # seconds
+METRICS_SLOW_SPAN_SECONDS = 1  # external calls slower than this are also logged
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, /metrics requires 'Authorization: Bearer <token>'
+INTERNAL_IPS = [ip for ip in os.environ.get('INTERNAL_IPS', '').split(',') if ip]  # may scrape /metrics without a token
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'certificates.instrumentation.RequestIDFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'certificates.instrumentation.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'json',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
+    'loggers': {
+        # web3 logs every provider connect/disconnect at INFO
+        'web3': {'level': 'WARNING'},
+    },
+}
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CertificatesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'certificates'
+
+    def ready(self):
+        # Hooks SQL timing onto every new database connection, including in management commands
+        from . import instrumentation  # noqa: F401
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import transaction
+from web3 import Web3
+
+from . import verification_cache
+from .blockchain import get_contract, get_web3
+from .merkle import MerkleTree, batch_cache_key
+from .models import Certificate
+from .outbox import enqueue_certificates
+
+# Only 32-byte hex hashes fit the contract's bytes32; request IDs that are UUIDs can't be issued
+ISSUABLE_HASH_REGEX = r'^(0x)?[0-9a-fA-F]{64}$'
+
+
+def issuable_certificates(university):
+    """Approved certificates of a university that are not on chain yet, oldest first"""
+    return Certificate.objects.filter(
+        university=university,
+        status='APPROVED',
+        blockchain_tx__isnull=True,
+        certificate_hash__regex=ISSUABLE_HASH_REGEX,
+    ).select_related('student', 'university').order_by('id')
+
+
+def anchor_batch(certificates, sender):
+    """
+    Anchor one Merkle root over the certificates' hashes with a single
+    issueCertificateBatch transaction, then store each certificate's proof.
+    Returns the transaction hash.
+    """
+    tree = MerkleTree([certificate.certificate_hash for certificate in certificates])
+    tx_hash = get_contract().functions.issueCertificateBatch(tree.root, len(certificates)).transact(
+        {'from': sender}
+    )
+    receipt = get_web3().eth.wait_for_transaction_receipt(tx_hash, timeout=settings.MERKLE_RECEIPT_TIMEOUT)
+    if receipt['status'] != 1:
+        raise RuntimeError(f'Batch anchor transaction {Web3.to_hex(tx_hash)} reverted')
+
+    merkle_root = Web3.to_hex(tree.root)
+    for index, certificate in enumerate(certificates):
+        certificate.merkle_root = merkle_root
+        certificate.merkle_proof = [Web3.to_hex(node) for node in tree.proof(index)]
+        certificate.blockchain_tx = Web3.to_hex(tx_hash)
+        certificate.status = 'ISSUED'
+
+    with transaction.atomic():
+        Certificate.objects.bulk_update(
+            certificates, ['merkle_root', 'merkle_proof', 'blockchain_tx', 'status'], batch_size=500
+        )
+        enqueue_certificates(certificates)
+
+    # Drop any "not anchored" results cached before the transaction was mined
+    verification_cache.invalidate(batch_cache_key(merkle_root))
+    for certificate in certificates:
+        verification_cache.invalidate(certificate.certificate_hash)
+    return Web3.to_hex(tx_hash)
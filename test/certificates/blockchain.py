@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncWeb3, Web3
+from web3._utils.http_session_manager import HTTPSessionManager
+from django.conf import settings
+
+from .instrumentation import RPCMetricsMiddleware
+from .ratelimit import RPCAdmissionMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class _SharedSessionManager(HTTPSessionManager):
+    """Hand every thread the same pooled session instead of one session per thread"""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def cache_and_return_session(self, endpoint_uri, session=None, request_timeout=None):
+        return self.session
+
+
+def load_contract_abi():
+    """Return the contract ABI from settings or from the compiled contract artifact"""
+    abi = getattr(settings, 'CONTRACT_ABI', None)
+    if abi:
+        return abi
+    with open(settings.CONTRACT_ABI_PATH) as artifact:
+        return json.load(artifact)['abi']
+
+
+def to_bytes32(certificate_hash):
+    """Convert a hex certificate hash to the bytes32 value the contract expects"""
+    if isinstance(certificate_hash, bytes):
+        return certificate_hash.rjust(32, b'\0')
+    return Web3.to_bytes(hexstr=certificate_hash).rjust(32, b'\0')
+
+
+class BlockchainClient:
+    """Process-wide Web3 connection with a keep-alive session pool and a cached contract"""
+
+    def __init__(self):
+        self.provider_uri = settings.WEB3_PROVIDER
+        self.timeout = settings.WEB3_REQUEST_TIMEOUT
+        self.pool_size = settings.WEB3_POOL_SIZE
+        self.health_check_interval = settings.WEB3_HEALTH_CHECK_INTERVAL
+        self._lock = threading.Lock()
+        self._abi = None
+        self._contract = None
+        self._last_health_check = time.monotonic()
+        self._connect()
+
+    def _connect(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        provider = Web3.HTTPProvider(
+            self.provider_uri,
+            request_kwargs={'timeout': self.timeout},
+            # eth_chainId and friends never change for a node; don't re-ask on every call
+            cache_allowed_requests=True,
+        )
+        provider._request_session_manager = _SharedSessionManager(session)
+
+        self.session = session
+        self.w3 = Web3(provider)
+        self.w3.middleware_onion.add(RPCMetricsMiddleware, name='metrics')
+        # Outermost, so time spent queueing for a slot isn't counted as RPC latency
+        self.w3.middleware_onion.add(RPCAdmissionMiddleware, name='admission')
+        self._contract = None
+
+    def reconnect(self):
+        """Drop the current session and build a fresh provider"""
+        with self._lock:
+            old_session = self.session
+            self._connect()
+        old_session.close()
+
+    def is_connected(self):
+        try:
+            return self.w3.is_connected()
+        except Exception:
+            return False
+
+    def ensure_connected(self):
+        """Reconnect if the periodic health check finds the node unreachable"""
+        now = time.monotonic()
+        if now - self._last_health_check < self.health_check_interval:
+            return
+        self._last_health_check = now
+        if not self.is_connected():
+            self.reconnect()
+
+    @property
+    def web3(self):
+        self.ensure_connected()
+        return self.w3
+
+    @property
+    def contract(self):
+        self.ensure_connected()
+        if self._contract is None:
+            with self._lock:
+                if self._abi is None:
+                    self._abi = load_contract_abi()
+                if self._contract is None:
+                    self._contract = self.w3.eth.contract(
+                        address=settings.CONTRACT_ADDRESS,
+                        abi=self._abi
+                    )
+        return self._contract
+
+    def get_certificate_events(self, from_block, to_block):
+        """Return decoded CertificateIssued/CertificateRevoked/CertificateBatchIssued logs in a block range"""
+        contract = self.contract
+        events = {
+            event.topic: event
+            for event in (
+                contract.events.CertificateIssued, contract.events.CertificateRevoked,
+                contract.events.CertificateBatchIssued,
+            )
+        }
+        logs = self.w3.eth.get_logs({
+            'address': contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': [list(events)],
+        })
+        return [events[Web3.to_hex(log['topics'][0])]().process_log(log) for log in logs]
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncBlockchainClient:
+    """
+    AsyncWeb3 connection for async views. Its aiohttp session belongs to the
+    event loop that created it, so there is one per process, on a loop of its
+    own; get it with get_async_client() and await its calls through
+    on_client_loop().
+    """
+
+    def __init__(self):
+        self.provider = AsyncWeb3.AsyncHTTPProvider(
+            settings.WEB3_PROVIDER,
+            request_kwargs={'timeout': aiohttp.ClientTimeout(total=settings.WEB3_REQUEST_TIMEOUT)},
+            cache_allowed_requests=True,
+            # Only constants: validating cached block data switches caching off provider-wide
+            # while it runs, which makes concurrent callers miss the cache
+            cacheable_requests={'eth_chainId', 'net_version', 'web3_clientVersion'},
+        )
+        self.w3 = AsyncWeb3(self.provider)
+        self.w3.middleware_onion.add(RPCMetricsMiddleware, name='metrics')
+        self.w3.middleware_onion.add(RPCAdmissionMiddleware, name='admission')
+        self.session = None
+        self._contract = None
+
+    async def connect(self):
+        # web3's default session closes the connection after every request; keep them alive instead
+        self.session = aiohttp.ClientSession(
+            raise_for_status=True,
+            connector=aiohttp.TCPConnector(limit=settings.WEB3_POOL_SIZE),
+        )
+        await self.provider.cache_async_session(self.session)
+        return self
+
+    @property
+    def contract(self):
+        if self._contract is None:
+            self._contract = self.w3.eth.contract(address=settings.CONTRACT_ADDRESS, abi=load_contract_abi())
+        return self._contract
+
+    async def close(self):
+        await self.provider.disconnect()
+
+
+_client = None
+_client_lock = threading.Lock()
+_client_loop = None
+_async_client = None
+
+
+def get_client():
+    """Return the shared BlockchainClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BlockchainClient()
+    return _client
+
+
+def client_loop():
+    """
+    The process's event loop for async JSON-RPC, run by a daemon thread. Under
+    WSGI each async view runs on a throwaway loop of its own (async_to_sync), so
+    a client kept on the caller's loop would be rebuilt, with a new connection
+    pool, for every request.
+    """
+    global _client_loop
+    if _client_loop is None:
+        with _client_lock:
+            if _client_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-web3', daemon=True).start()
+                _client_loop = loop
+    return _client_loop
+
+
+async def on_client_loop(coroutine):
+    """Await a coroutine that uses the async client; it runs on client_loop()"""
+    loop = client_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coroutine
+    # Scheduled from the caller's context, so context variables such as the request id carry over
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+
+async def get_async_client():
+    """Return the shared AsyncBlockchainClient, creating it on first use"""
+    global _async_client
+    loop = client_loop()
+    with _client_lock:
+        if _async_client is None:
+            # A future, so concurrent first callers wait on the same client
+            _async_client = asyncio.run_coroutine_threadsafe(AsyncBlockchainClient().connect(), loop)
+        client = _async_client
+    return await asyncio.wrap_future(client)
+
+
+def get_web3():
+    return get_client().web3
+
+
+def get_contract():
+    return get_client().contract
+
+
+def reset_client():
+    """Close and forget the shared clients (used after settings changes and in tests)"""
+    global _client, _async_client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        if _async_client is not None and _async_client.done() and not _async_client.exception():
+            asyncio.run_coroutine_threadsafe(_async_client.result().close(), _client_loop).result()
+        _client = None
+        _async_client = None
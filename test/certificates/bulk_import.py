@@ -0,0 +1,261 @@
+"""
+Streaming import of a registrar's roster (CSV or JSON Lines) as approved certificates.
+
+Each stage is a generator over fixed-size chunks, so memory stays flat however
+large the file is: records are parsed lazily, students are resolved with one
+in_bulk query per chunk, and each chunk is inserted with bulk_create and queued
+for MongoDB through the outbox in one transaction. Pinning the certificate
+documents to IPFS and sending issuance transactions happen on a background
+thread, overlapping the next chunk's database work.
+
+Roster columns: student (username), course_name, completion_date (YYYY-MM-DD),
+and optionally student_identifier and wallet_address.
+"""
+import csv
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from .models import Certificate, User
+from .outbox import enqueue_certificates
+from .services.ipfs_service import get_ipfs_client
+from .encoding import hash_many, to_hex
+from .utils import certificate_ipfs_data
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('student', 'course_name', 'completion_date')
+
+
+class RosterError(ValueError):
+    pass
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    pinned: int = 0
+    pin_failed: int = 0
+    # Only the first BULK_IMPORT_MAX_ERRORS, so a bad file can't grow this without bound
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < settings.BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'pinned': self.pinned,
+            'pin_failed': self.pin_failed,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+        }
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_records(text_stream, fmt):
+    """Yield (line_number, record) from a text stream; malformed lines come back as (line_number, None)"""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        reader = csv.DictReader(text_stream)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise RosterError(f"Missing columns: {', '.join(missing)}")
+        for record in reader:
+            yield reader.line_num, record
+
+
+def open_upload(uploaded_file):
+    """Text stream over an uploaded file that decodes as it is read"""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def certificate_record(record, university):
+    """The canonical certificate fields of a roster line (see certificates.encoding)"""
+    values = {column: str(record.get(column) or '').strip() for column in REQUIRED_COLUMNS}
+    if not all(values.values()):
+        raise RosterError(f"Missing {', '.join(column for column, value in values.items() if not value)}")
+    try:
+        completion_date = date.fromisoformat(values['completion_date'])
+    except ValueError:
+        raise RosterError(f"Invalid completion_date {values['completion_date']!r}")
+    return {
+        'student': values['student'],
+        'university': university.username,
+        'course_name': values['course_name'],
+        'completion_date': completion_date,
+        'student_identifier': str(record.get('student_identifier') or '').strip(),
+    }
+
+
+class RosterImport:
+    """
+    Import roster records for one university. pin uploads each certificate
+    document to IPFS; submitter, a started TransactionSubmitter, receives the
+    new certificates for issuance. progress(stats) is called after every chunk.
+    """
+
+    def __init__(self, university, batch_size=None, pin=True, submitter=None, progress=None):
+        self.university = university
+        self.batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+        self.pin = pin
+        self.submitter = submitter
+        self.progress = progress
+        self.stats = ImportStats()
+        # Bounded so a slow IPFS daemon slows the import down instead of piling up chunks
+        self._handoff = queue.Queue(maxsize=2)
+
+    def run(self, records):
+        worker = threading.Thread(target=self._hand_off_chunks, name='roster-import-handoff', daemon=True)
+        worker.start()
+        try:
+            for chunk in chunked(records, self.batch_size):
+                certificates = self._import_chunk(chunk)
+                if certificates:
+                    self._handoff.put(certificates)
+                if self.progress:
+                    self.progress(self.stats)
+        finally:
+            self._handoff.put(None)
+            worker.join()
+        return self.stats
+
+    def _import_chunk(self, chunk):
+        self.stats.rows += len(chunk)
+        parsed = []
+        for line_number, record in chunk:
+            if record is None:
+                self.stats.error(line_number, 'Malformed record')
+                continue
+            try:
+                parsed.append((line_number, record, certificate_record(record, self.university)))
+            except RosterError as e:
+                self.stats.error(line_number, str(e))
+
+        students = User.objects.filter(role=User.STUDENT).in_bulk(
+            {fields['student'] for _, _, fields in parsed}, field_name='username'
+        )
+        hashes = [to_hex(digest) for digest in hash_many(fields for _, _, fields in parsed)]
+        existing = set(Certificate.objects.filter(certificate_hash__in=hashes).values_list('certificate_hash', flat=True))
+
+        certificates = []
+        for (line_number, record, fields), certificate_hash in zip(parsed, hashes):
+            student = students.get(fields['student'])
+            if student is None:
+                self.stats.error(line_number, f"Student {fields['student']} not found")
+                continue
+            if certificate_hash in existing:
+                self.stats.duplicates += 1
+                continue
+            existing.add(certificate_hash)
+            certificates.append(Certificate(
+                student=student,
+                university=self.university,
+                student_identifier=fields['student_identifier'],
+                course_name=fields['course_name'],
+                completion_date=fields['completion_date'],
+                certificate_hash=certificate_hash,
+                wallet_address=str(record.get('wallet_address') or '').strip() or student.wallet_address,
+                status='APPROVED',
+                verification_status='VERIFIED',
+            ))
+
+        try:
+            self._insert(certificates)
+        except IntegrityError:
+            # A concurrent import added some of these since we looked; they are duplicates too
+            taken = set(Certificate.objects.filter(
+                certificate_hash__in=[certificate.certificate_hash for certificate in certificates]
+            ).values_list('certificate_hash', flat=True))
+            certificates = [certificate for certificate in certificates if certificate.certificate_hash not in taken]
+            self.stats.duplicates += len(taken)
+            self._insert(certificates)
+        self.stats.imported += len(certificates)
+        return certificates
+
+    def _insert(self, certificates):
+        with transaction.atomic():
+            Certificate.objects.bulk_create(certificates, batch_size=self.batch_size)
+            enqueue_certificates(certificates)
+
+    def _hand_off_chunks(self):
+        try:
+            while (certificates := self._handoff.get()) is not None:
+                try:
+                    if self.pin:
+                        self._pin(certificates)
+                    if self.submitter:
+                        self.submitter.submit(certificates)
+                except Exception as e:
+                    # The rows are committed; pinning can be retried and issuance picks them up later
+                    logger.exception('Roster import hand-off error: %s', e)
+        finally:
+            connection.close()
+
+    def _pin(self, certificates):
+        documents = (json.dumps(certificate_ipfs_data(certificate)) for certificate in certificates)
+        pinned = []
+        for certificate, ipfs_hash in zip(certificates, get_ipfs_client().add_many(documents)):
+            if ipfs_hash is not None:
+                certificate.ipfs_hash = ipfs_hash
+                pinned.append(certificate)
+        if len(pinned) < len(certificates):
+            logger.warning('%d of %d certificate documents could not be pinned to IPFS',
+                           len(certificates) - len(pinned), len(certificates))
+            self.stats.pin_failed += len(certificates) - len(pinned)
+        if not pinned:
+            return
+        certificates = pinned
+        # bulk_create gives back primary keys only on some backends
+        if certificates[0].pk is None:
+            ids = dict(Certificate.objects.filter(
+                certificate_hash__in=[certificate.certificate_hash for certificate in certificates]
+            ).values_list('certificate_hash', 'id'))
+            for certificate in certificates:
+                certificate.pk = ids[certificate.certificate_hash]
+        Certificate.objects.bulk_update(certificates, ['ipfs_hash'], batch_size=self.batch_size)
+        self.stats.pinned += len(certificates)
@@ -0,0 +1,177 @@
+"""
+Canonical certificate encoding and content hashing.
+
+A certificate's identity is the SHA-256 of a deterministic byte layout of the
+fields that define it, so anyone holding the same details can recompute the
+hash that was anchored on chain:
+
+    b'CBC' | schema version (1 byte) | byte length of each field (big-endian uint32) | fields
+
+Fields come in FIELDS order as NFC-normalized, whitespace-stripped UTF-8 text,
+dates as ISO 8601. The length header keeps field boundaries unambiguous
+without escaping. Changing the fields or their normalization means a new
+SCHEMA_VERSION; older hashes stay reproducible with encode_certificate(...,
+version=...).
+
+Encoding, not SHA-256, is most of the cost of a hash, so hash_many hands large
+batches to a process pool as plain field tuples; each worker encodes and hashes
+its chunk and sends the digests back as one packed buffer.
+"""
+import hashlib
+import itertools
+import multiprocessing
+import os
+import struct
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+
+from django.conf import settings
+
+MAGIC = b'CBC'
+SCHEMA_VERSION = 1
+FIELDS = {
+    1: ('university', 'student', 'student_identifier', 'course_name', 'completion_date'),
+}
+DATE_FIELDS = {'completion_date'}
+DIGEST_SIZE = 32
+
+_normalize = unicodedata.normalize
+
+
+class _Layout:
+    def __init__(self, version, names):
+        self.names = names
+        self.prefix = MAGIC + bytes([version])
+        self.lengths = struct.Struct(f'>{len(names)}I')
+        self.dates = frozenset(index for index, name in enumerate(names) if name in DATE_FIELDS)
+
+
+_layouts = {version: _Layout(version, names) for version, names in FIELDS.items()}
+
+
+def certificate_fields(certificate):
+    """Canonical fields of a Certificate"""
+    return {
+        'university': certificate.university.username,
+        'student': certificate.student.username,
+        'student_identifier': certificate.student_identifier,
+        'course_name': certificate.course_name,
+        'completion_date': certificate.completion_date,
+    }
+
+
+def _layout(version):
+    try:
+        return _layouts[version]
+    except KeyError:
+        raise ValueError(f'Unknown certificate schema version {version}')
+
+
+@lru_cache(maxsize=4096)
+def _iso_date(value):
+    # Batches share a handful of dates, so parse each once
+    return date.fromisoformat(value.strip()).isoformat()
+
+
+def _encode(values, layout):
+    encoded = []
+    for index, value in enumerate(values):
+        if index in layout.dates:
+            value = value.isoformat() if isinstance(value, date) else _iso_date(str(value))
+        elif value is None:
+            value = ''
+        else:
+            value = str(value).strip()
+            if not value.isascii():
+                value = _normalize('NFC', value)
+        encoded.append(value.encode())
+    return layout.prefix + layout.lengths.pack(*map(len, encoded)) + b''.join(encoded)
+
+
+def encode_certificate(fields, version=SCHEMA_VERSION):
+    """Canonical bytes of a mapping with the schema's fields; dates may be date objects or ISO strings"""
+    layout = _layout(version)
+    return _encode([fields.get(name) for name in layout.names], layout)
+
+
+def hash_certificate(fields):
+    """bytes32 content hash, as the contract takes it"""
+    return hashlib.sha256(encode_certificate(fields)).digest()
+
+
+def to_hex(digest):
+    """The Certificate.certificate_hash form of a digest"""
+    return '0x' + digest.hex()
+
+
+def certificate_hash(fields):
+    return to_hex(hash_certificate(fields))
+
+
+def _hash_rows(rows, layout):
+    sha256 = hashlib.sha256
+    return [sha256(_encode(values, layout)).digest() for values in rows]
+
+
+def _hash_chunk(rows, version):
+    """Process pool task: digests of field tuples, packed back to back"""
+    return b''.join(_hash_rows(rows, _layout(version)))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_size():
+    return settings.ENCODING_PROCESSES or os.cpu_count() or 1
+
+
+def get_pool():
+    """Return the process-wide hashing pool, started on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: forking a threaded server process can deadlock the child
+                _pool = ProcessPoolExecutor(
+                    max_workers=pool_size(),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def hash_many(records, parallel=None, version=SCHEMA_VERSION):
+    """
+    bytes32 content hashes of an iterable of field mappings, in order.
+    parallel forces the process pool on or off; by default it is used for
+    batches of at least ENCODING_PARALLEL_THRESHOLD records when there is
+    more than one CPU to spread them over.
+    """
+    layout = _layout(version)
+    rows = [tuple([fields.get(name) for name in layout.names]) for fields in records]
+    if parallel is None:
+        parallel = len(rows) >= settings.ENCODING_PARALLEL_THRESHOLD and pool_size() > 1
+    if not parallel or not rows:
+        return _hash_rows(rows, layout)
+
+    pool = get_pool()
+    # A few chunks per worker evens out stragglers without paying per-task overhead per record
+    size = -(-len(rows) // (pool_size() * 4))
+    chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+    packed = pool.map(_hash_chunk, chunks, itertools.repeat(version, len(chunks)))
+    digests = []
+    for buffer in packed:
+        view = memoryview(buffer)
+        digests += [bytes(view[i:i + DIGEST_SIZE]) for i in range(0, len(buffer), DIGEST_SIZE)]
+    return digests
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import transaction
+from web3 import Web3
+
+from . import verification_cache
+from .blockchain import get_client
+from .merkle import batch_cache_key
+from .models import Certificate, CertificateEvent, IndexerCheckpoint
+from .outbox import enqueue_certificates
+
+CHECKPOINT_NAME = 'certificate_events'
+
+EVENT_TYPES = {
+    'CertificateIssued': CertificateEvent.ISSUED,
+    'CertificateRevoked': CertificateEvent.REVOKED,
+    'CertificateBatchIssued': CertificateEvent.BATCH_ISSUED,
+}
+
+
+def normalize_hash(value):
+    """Return a 0x-prefixed lowercase hex string for bytes or hex input"""
+    return Web3.to_hex(value).lower() if isinstance(value, bytes) else value.lower()
+
+
+class CertificateEventIndexer:
+    """Mirror CertificateIssued/CertificateRevoked/CertificateBatchIssued logs into CertificateEvent rows"""
+
+    def __init__(self, client=None, max_block_range=None, reorg_depth=None, confirmations=None):
+        self.client = client or get_client()
+        self.max_block_range = max_block_range or settings.INDEXER_MAX_BLOCK_RANGE
+        self.reorg_depth = reorg_depth if reorg_depth is not None else settings.INDEXER_REORG_DEPTH
+        self.confirmations = confirmations if confirmations is not None else settings.INDEXER_CONFIRMATIONS
+
+    @property
+    def w3(self):
+        return self.client.web3
+
+    def get_checkpoint(self, start_block=None):
+        checkpoint = IndexerCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+        if checkpoint is None or start_block is not None:
+            if start_block is None:
+                start_block = settings.INDEXER_START_BLOCK
+            block_number = max(start_block - 1, 0)
+            checkpoint, _ = IndexerCheckpoint.objects.update_or_create(
+                name=CHECKPOINT_NAME,
+                defaults={
+                    'block_number': block_number,
+                    'block_hash': normalize_hash(self.w3.eth.get_block(block_number)['hash'])
+                }
+            )
+        return checkpoint
+
+    def handle_reorg(self, checkpoint):
+        """
+        If the checkpoint block is no longer canonical, drop everything indexed
+        in the last reorg_depth blocks and rewind so it gets re-scanned.
+        Returns True when a reorg was detected.
+        """
+        canonical = normalize_hash(self.w3.eth.get_block(checkpoint.block_number)['hash'])
+        if canonical == checkpoint.block_hash:
+            return False
+
+        fork_block = max(checkpoint.block_number - self.reorg_depth, 0)
+        with transaction.atomic():
+            removed = CertificateEvent.objects.filter(block_number__gt=fork_block)
+            orphaned = list(removed.values_list('certificate_hash', 'event'))
+            removed.delete()
+            self.rederive_revocations(
+                {certificate_hash for certificate_hash, event in orphaned if event == CertificateEvent.REVOKED}
+            )
+            checkpoint.block_number = fork_block
+            checkpoint.block_hash = normalize_hash(self.w3.eth.get_block(fork_block)['hash'])
+            checkpoint.save()
+        for certificate_hash, event in orphaned:
+            verification_cache.invalidate(
+                batch_cache_key(certificate_hash) if event == CertificateEvent.BATCH_ISSUED else certificate_hash
+            )
+        return True
+
+    def rederive_revocations(self, certificate_hashes):
+        """Un-revoke certificates whose revocation events were all rolled back"""
+        still_revoked = set(CertificateEvent.objects.filter(
+            certificate_hash__in=certificate_hashes, event=CertificateEvent.REVOKED
+        ).values_list('certificate_hash', flat=True))
+        restored = [certificate_hash for certificate_hash in certificate_hashes if certificate_hash not in still_revoked]
+        certificates = list(Certificate.objects.filter(
+            certificate_hash__in=restored + [certificate_hash[2:] for certificate_hash in restored], is_revoked=True
+        ).select_related('student', 'university'))
+        for certificate in certificates:
+            certificate.is_revoked = False
+            certificate.status = 'ISSUED'
+        Certificate.objects.bulk_update(certificates, ['is_revoked', 'status'], batch_size=500)
+        enqueue_certificates(certificates)
+        return len(certificates)
+
+    def sync_once(self, start_block=None):
+        """Index every new event up to the confirmed head; returns the number of events stored"""
+        checkpoint = self.get_checkpoint(start_block)
+        self.handle_reorg(checkpoint)
+
+        head = self.w3.eth.block_number - self.confirmations
+        indexed = 0
+        while checkpoint.block_number < head:
+            from_block = checkpoint.block_number + 1
+            to_block = min(checkpoint.block_number + self.max_block_range, head)
+            events = self.client.get_certificate_events(from_block, to_block)
+            to_block_hash = normalize_hash(self.w3.eth.get_block(to_block)['hash'])
+
+            with transaction.atomic():
+                indexed += self.store_events(events)
+                checkpoint.block_number = to_block
+                checkpoint.block_hash = to_block_hash
+                checkpoint.save()
+        return indexed
+
+    def store_events(self, events):
+        blocks = {}
+        receipts = {}
+        rows = []
+        for event in events:
+            block_number = event['blockNumber']
+            tx_hash = normalize_hash(event['transactionHash'])
+            if block_number not in blocks:
+                blocks[block_number] = self.w3.eth.get_block(block_number)
+            if tx_hash not in receipts:
+                receipts[tx_hash] = self.w3.eth.get_transaction_receipt(tx_hash)
+            receipt = receipts[tx_hash]
+
+            rows.append(CertificateEvent(
+                certificate_hash=normalize_hash(
+                    event['args']['merkleRoot'] if event['event'] == 'CertificateBatchIssued'
+                    else event['args']['certificateHash']
+                ),
+                event=EVENT_TYPES[event['event']],
+                block_number=block_number,
+                block_hash=normalize_hash(event['blockHash']),
+                transaction_hash=tx_hash,
+                log_index=event['logIndex'],
+                issuer=event['args'].get('issuer', receipt['from']),
+                contract_address=event['address'],
+                gas_used=receipt['gasUsed'],
+                timestamp=blocks[block_number]['timestamp'],
+            ))
+
+        CertificateEvent.objects.bulk_create(rows, ignore_conflicts=True)
+
+        revoked = [row.certificate_hash for row in rows if row.event == CertificateEvent.REVOKED]
+        if revoked:
+            certificates = list(Certificate.objects.filter(
+                certificate_hash__in=revoked + [certificate_hash[2:] for certificate_hash in revoked]
+            ).exclude(is_revoked=True, status='REVOKED').select_related('student', 'university'))
+            for certificate in certificates:
+                certificate.is_revoked = True
+                certificate.status = 'REVOKED'
+            Certificate.objects.bulk_update(certificates, ['is_revoked', 'status'], batch_size=500)
+            enqueue_certificates(certificates)
+        for row in rows:
+            verification_cache.invalidate(
+                batch_cache_key(row.certificate_hash) if row.event == CertificateEvent.BATCH_ISSUED
+                else row.certificate_hash
+            )
+        return len(rows)
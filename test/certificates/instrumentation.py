@@ -0,0 +1,363 @@
+"""
+In-process metrics, timing spans and request-scoped structured logging.
+
+Every external call on the request path is timed with span(): SQL through a
+wrapper installed on each database connection, web3 RPCs through
+RPCMetricsMiddleware, MongoDB commands through a pymongo CommandListener and
+IPFS API calls in the IPFS clients. RequestMetricsMiddleware times whole
+requests per view and tags everything logged while handling one with its
+request ID. The views' /metrics endpoint renders the registry in the
+Prometheus text format.
+
+Recording is a bisect and a few integer updates under a per-metric lock, so it
+stays on under full load. Metrics are per process: with several workers,
+scrape each one or put them behind a per-worker port.
+"""
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from pymongo import monitoring
+from web3.middleware import Web3Middleware
+
+logger = logging.getLogger(__name__)
+
+_request_id = ContextVar('request_id', default=None)
+_registry = []
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets or settings.METRICS_LATENCY_BUCKETS))
+        # labels -> per-bucket counts (the last slot is +Inf), not cumulative until collected
+        self._counts = {}
+        self._sums = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    def count(self, *labels):
+        return sum(self._counts.get(labels, ()))
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Snapshot:
+    """
+    Values read from callback() at scrape time, one metric per key of the
+    dict it returns; keys listed in counters are exported as counters.
+    """
+
+    def __init__(self, prefix, documentation, callback, counters=()):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.callback = callback
+        self.counters = set(counters)
+        _registry.append(self)
+
+    def collect(self):
+        for key, value in self.callback().items():
+            kind = 'counter' if key in self.counters else 'gauge'
+            name = f'{self.prefix}_{key}_total' if kind == 'counter' else f'{self.prefix}_{key}'
+            yield f'# HELP {name} {self.documentation}'
+            yield f'# TYPE {name} {kind}'
+            yield f'{name} {value}'
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format"""
+    return '\n'.join(line for metric in _registry for line in metric.collect()) + '\n'
+
+
+SPAN_SECONDS = Histogram(
+    'certblock_span_duration_seconds', 'Time spent in instrumented external calls', ['span']
+)
+SPAN_ERRORS = Counter(
+    'certblock_span_errors_total', 'Instrumented external calls that failed', ['span', 'error']
+)
+REQUEST_SECONDS = Histogram(
+    'certblock_http_request_duration_seconds', 'Request latency by view', ['view', 'method', 'status']
+)
+REQUEST_ERRORS = Counter(
+    'certblock_http_request_errors_total', 'Requests answered with a 5xx', ['view', 'method']
+)
+
+
+class span:
+    """
+    Time a block as an external call named name, e.g. 'rpc.eth_call';
+    exceptions are counted and re-raised. Works around awaits too.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start, exc_type.__name__ if exc_type else None)
+        return False
+
+
+def record(name, elapsed, error=None):
+    """Record a call that was timed elsewhere; error is the failure's name, if it failed"""
+    SPAN_SECONDS.observe(elapsed, name)
+    if error:
+        SPAN_ERRORS.inc(name, error)
+    if elapsed >= settings.METRICS_SLOW_SPAN_SECONDS:
+        logger.warning('Slow call', extra={'span': name, 'duration_ms': round(elapsed * 1000, 1), 'error': error})
+
+
+def traced(name):
+    """Decorator form of span for sync and async functions"""
+    def decorator(fn):
+        if iscoroutinefunction(fn):
+            @wraps(fn)
+            async def wrapped(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @wraps(fn)
+            def wrapped(*args, **kwargs):
+                with span(name):
+                    return fn(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# SQL
+
+SQL_STATEMENTS = {'select', 'insert', 'update', 'delete'}
+
+
+def _sql_wrapper(alias):
+    def execute(execute, sql, params, many, context):
+        statement = sql.lstrip()[:6].lower()
+        with span(f'db.{alias}.{statement if statement in SQL_STATEMENTS else "other"}'):
+            return execute(sql, params, many, context)
+    return execute
+
+
+def instrument_connection(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_sql_wrapper(connection.alias))
+
+
+connection_created.connect(instrument_connection, dispatch_uid='certificates.instrumentation')
+
+
+# web3
+
+class RPCMetricsMiddleware(Web3Middleware):
+    """Times every JSON-RPC request by method; error responses count as failures"""
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            start = time.perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception as e:
+                record(f'rpc.{method}', time.perf_counter() - start, type(e).__name__)
+                raise
+            record(f'rpc.{method}', time.perf_counter() - start, 'RPCError' if 'error' in response else None)
+            return response
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            start = time.perf_counter()
+            try:
+                response = await make_request(method, params)
+            except Exception as e:
+                record(f'rpc.{method}', time.perf_counter() - start, type(e).__name__)
+                raise
+            record(f'rpc.{method}', time.perf_counter() - start, 'RPCError' if 'error' in response else None)
+            return response
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            with span('rpc.batch'):
+                return make_batch_request(requests_info)
+        return middleware
+
+    async def async_wrap_make_batch_request(self, make_batch_request):
+        async def middleware(requests_info):
+            with span('rpc.batch'):
+                return await make_batch_request(requests_info)
+        return middleware
+
+
+# MongoDB
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times MongoDB commands by name from pymongo's own measurements"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record(f'mongodb.{event.command_name}', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record(f'mongodb.{event.command_name}', event.duration_micros / 1e6,
+               (event.failure or {}).get('codeName', 'CommandFailed'))
+
+
+# Requests
+
+_request_id_pattern = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request by view and gives it a request ID: the caller's
+    X-Request-ID when it looks sane, otherwise a new one. The ID is echoed in
+    the response and attached to every log record written meanwhile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, start = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        return self._finish(request, response, start)
+
+    async def __acall__(self, request):
+        token, start = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        return self._finish(request, response, start)
+
+    def _start(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not _request_id_pattern.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return _request_id.set(request_id), time.perf_counter()
+
+    def _finish(self, request, response, start):
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        # Route names, not paths, so URLs with hashes in them don't explode the series count
+        view = match.view_name if match else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view, request.method, response.status_code)
+        if response.status_code >= 500:
+            REQUEST_ERRORS.inc(view, request.method)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+# Logging
+
+_record_attributes = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record):
+        # django.request logs the response after the middleware has returned, but passes the request along
+        record.request_id = current_request_id() or getattr(getattr(record, 'request', None), 'request_id', None)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; extra= fields are kept as keys"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _record_attributes)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,54 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from certificates.models import Certificate, document_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(certificate):
+    try:
+        with certificate.certificate_file.open('rb') as file:
+            return document_fingerprint(file)
+    except (OSError, ValueError) as e:
+        logger.warning('Error hashing %s: %s', certificate.certificate_file.name, e)
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Store the SHA-256 of every certificate_file that has not been fingerprinted yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.DOCUMENT_FINGERPRINT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.DOCUMENT_FINGERPRINT_WORKERS)
+
+    def handle(self, *args, **options):
+        pending = Certificate.objects.filter(document_sha256__isnull=True).exclude(
+            certificate_file=''
+        ).exclude(certificate_file__isnull=True).only('id', 'certificate_file').order_by('id')
+
+        hashed = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                # Keyset pagination: rows that fail to hash stay NULL and must not be re-read forever
+                batch = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                updated = []
+                for certificate, digest in zip(batch, executor.map(fingerprint, batch)):
+                    if digest is None:
+                        failed += 1
+                        continue
+                    certificate.document_sha256 = digest
+                    updated.append(certificate)
+                Certificate.objects.bulk_update(updated, ['document_sha256'])
+                hashed += len(updated)
+                self.stdout.write(f'Fingerprinted {hashed} certificates')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {hashed} fingerprinted, {failed} failed'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from certificates.mongodb import MongoDBClient, ensure_indexes
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes used by certificate_requests'
+
+    def handle(self, *args, **options):
+        collection = MongoDBClient().certificate_requests
+        errors = ensure_indexes(collection, force=True)
+        for name, spec in collection.index_information().items():
+            self.stdout.write(f"{name}: {spec['key']}")
+        if errors:
+            raise CommandError('Could not create MongoDB indexes: ' + '; '.join(
+                f'{name}: {error}' for name, error in errors.items()
+            ))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from certificates.bulk_import import RosterError, RosterImport, detect_format, read_records
+from certificates.models import User
+from certificates.tx_submitter import TransactionSubmitter
+
+
+class Command(BaseCommand):
+    help = "Import a CSV or JSON Lines roster as approved certificates of a university"
+
+    def add_arguments(self, parser):
+        parser.add_argument('university', help='Username of the issuing university')
+        parser.add_argument('path', help='Roster file; .jsonl/.ndjson is read as JSON Lines, anything else as CSV')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override the format guessed from the extension')
+        parser.add_argument('--batch-size', type=int, help='Rows per bulk insert')
+        parser.add_argument('--no-pin', action='store_true', help='Skip uploading certificate documents to IPFS')
+        parser.add_argument('--issue', action='store_true',
+                            help='Send issuance transactions as rows are imported instead of leaving them APPROVED')
+
+    def handle(self, *args, **options):
+        try:
+            university = User.objects.get(username=options['university'], role=User.UNIVERSITY)
+        except User.DoesNotExist:
+            raise CommandError(f"University {options['university']} not found")
+
+        submitter = None
+        if options['issue']:
+            try:
+                submitter = TransactionSubmitter().start()
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        def progress(stats):
+            self.stdout.write(
+                f'{stats.rows} rows, {stats.imported} imported, {stats.duplicates} duplicates, '
+                f'{stats.failed} failed ({stats.rows_per_second:.0f} rows/s)'
+            )
+
+        importer = RosterImport(university, batch_size=options['batch_size'], pin=not options['no_pin'],
+                                submitter=submitter, progress=progress)
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as roster:
+                importer.run(read_records(roster, options['format'] or detect_format(options['path'])))
+            if submitter:
+                submitter.drain()
+        except (OSError, RosterError) as e:
+            raise CommandError(str(e))
+        finally:
+            if submitter:
+                submitter.stop()
+
+        stats = importer.stats
+        for error in stats.errors:
+            self.stderr.write(f"line {error['line']}: {error['message']}")
+        self.stdout.write(
+            f'Imported {stats.imported} of {stats.rows} rows in {stats.elapsed:.1f}s '
+            f'({stats.rows_per_second:.0f} rows/s): {stats.duplicates} duplicates, {stats.failed} failed, '
+            f'{stats.pinned} pinned, {stats.pin_failed} not pinned'
+            + (f', {submitter.issued} issued' if submitter else '')
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from certificates.indexer import CertificateEventIndexer
+
+
+class Command(BaseCommand):
+    help = 'Mirror CertificateIssued/CertificateRevoked/CertificateBatchIssued events into the CertificateEvent table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, help='Re-index starting at this block instead of the checkpoint')
+        parser.add_argument('--poll-interval', type=float, default=settings.INDEXER_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Catch up to the chain head and exit')
+
+    def handle(self, *args, **options):
+        indexer = CertificateEventIndexer()
+        start_block = options['from_block']
+
+        while True:
+            try:
+                indexed = indexer.sync_once(start_block)
+                start_block = None
+                checkpoint = indexer.get_checkpoint()
+                if indexed:
+                    self.stdout.write(f'Indexed {indexed} events up to block {checkpoint.block_number}')
+            except Exception as e:
+                self.stderr.write(f'Error indexing certificate events: {e}')
+                indexer.client.reconnect()
+
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
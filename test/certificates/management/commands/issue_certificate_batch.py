@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from certificates.batch_issuance import anchor_batch, issuable_certificates
+from certificates.models import User
+
+
+class Command(BaseCommand):
+    help = "Issue a university's approved certificates on chain under Merkle roots, one transaction per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('university', help='Username of the issuing university')
+        parser.add_argument('--sender', required=True, help='Unlocked node account that sends the transactions')
+        parser.add_argument('--batch-size', type=int, default=settings.MERKLE_BATCH_SIZE)
+        parser.add_argument('--limit', type=int, help='Issue at most this many certificates')
+
+    def handle(self, *args, **options):
+        try:
+            university = User.objects.get(username=options['university'], role=User.UNIVERSITY)
+        except User.DoesNotExist:
+            raise CommandError(f"University {options['university']} not found")
+
+        pending = issuable_certificates(university)
+        if options['limit']:
+            pending = pending[:options['limit']]
+        pending = list(pending)
+
+        for start in range(0, len(pending), options['batch_size']):
+            batch = pending[start:start + options['batch_size']]
+            tx_hash = anchor_batch(batch, options['sender'])
+            self.stdout.write(f'Anchored {len(batch)} certificates in {tx_hash}')
+
+        self.stdout.write(self.style.SUCCESS(f'Issued {len(pending)} certificates'))
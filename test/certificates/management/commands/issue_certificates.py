@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from certificates.batch_issuance import issuable_certificates
+from certificates.models import User
+from certificates.tx_submitter import TransactionSubmitter
+
+
+class Command(BaseCommand):
+    help = "Sign and send one issueCertificate transaction per approved certificate of a university"
+
+    def add_arguments(self, parser):
+        parser.add_argument('university', help='Username of the issuing university')
+        parser.add_argument('--limit', type=int, help='Issue at most this many certificates')
+        parser.add_argument('--max-in-flight', type=int, help='Unconfirmed transactions allowed at once')
+        parser.add_argument('--timeout', type=float, help='Give up waiting for receipts after this many seconds')
+
+    def handle(self, *args, **options):
+        try:
+            university = User.objects.get(username=options['university'], role=User.UNIVERSITY)
+        except User.DoesNotExist:
+            raise CommandError(f"University {options['university']} not found")
+
+        try:
+            submitter = TransactionSubmitter(max_in_flight=options['max_in_flight'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        pending = issuable_certificates(university)
+        if options['limit']:
+            pending = pending[:options['limit']]
+        submitter.submit(pending)
+
+        submitter.start()
+        try:
+            finished = submitter.drain(options['timeout'])
+        finally:
+            submitter.stop()
+
+        self.stdout.write(f'Issued {submitter.issued} certificates, {len(submitter.failed)} failed')
+        if not finished:
+            raise CommandError('Timed out waiting for receipts; unconfirmed certificates stay APPROVED')
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from certificates.outbox import relay_outbox
+
+
+class Command(BaseCommand):
+    help = 'Drain the certificate outbox into MongoDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Drain what is queued now and exit')
+
+    def handle(self, *args, **options):
+        failures = 0
+        while True:
+            try:
+                relayed = relay_outbox(options['batch_size'])
+            except Exception as e:
+                if options['once']:
+                    raise CommandError(f'Error relaying outbox messages: {e}') from e
+                failures += 1
+                self.stderr.write(f'Error relaying outbox messages: {e}')
+                # Drop a broken database connection so the next pass opens a fresh one
+                close_old_connections()
+                time.sleep(min(options['poll_interval'] * 2 ** failures, settings.OUTBOX_MAX_BACKOFF))
+                continue
+            failures = 0
+            if relayed:
+                self.stdout.write(f'Relayed {relayed} outbox messages')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from certificates.notifications import send_queued_notifications
+
+
+class Command(BaseCommand):
+    help = 'Send queued certificate notification emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.NOTIFICATION_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='Send one batch and exit')
+
+    def handle(self, *args, **options):
+        failures = 0
+        while True:
+            try:
+                handled = send_queued_notifications(options['batch_size'])
+            except Exception as e:
+                if options['once']:
+                    raise CommandError(f'Error sending notifications: {e}') from e
+                failures += 1
+                self.stderr.write(f'Error sending notifications: {e}')
+                # Drop a broken database connection so the next pass opens a fresh one
+                close_old_connections()
+                time.sleep(min(options['poll_interval'] * 2 ** failures, settings.NOTIFICATION_MAX_BACKOFF))
+                continue
+            failures = 0
+            if handled:
+                self.stdout.write(f'Handled {handled} notifications')
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from certificates import verification_cache
+from certificates.blockchain import get_client
+from certificates.merkle import batch_cache_key
+
+CHECKPOINT_KEY = 'certificate_events:last_block'
+
+
+class Command(BaseCommand):
+    help = 'Follow certificate and batch anchor events and invalidate cached verifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, help='Block to start from instead of the saved checkpoint')
+        parser.add_argument('--poll-interval', type=float, default=settings.VERIFICATION_EVENT_POLL_INTERVAL)
+        parser.add_argument('--max-block-range', type=int, default=2000, help='Largest eth_getLogs range per request')
+        parser.add_argument('--once', action='store_true', help='Catch up to the chain head and exit')
+
+    def handle(self, *args, **options):
+        cache = caches[settings.VERIFICATION_CACHE_ALIAS]
+        client = get_client()
+
+        if options['from_block'] is not None:
+            last_block = options['from_block'] - 1
+        else:
+            last_block = cache.get(CHECKPOINT_KEY)
+        if last_block is None:
+            last_block = client.web3.eth.block_number
+            cache.set(CHECKPOINT_KEY, last_block, None)
+
+        self.stdout.write(f'Watching certificate events after block {last_block}')
+        while True:
+            try:
+                head = client.web3.eth.block_number
+                while last_block < head:
+                    to_block = min(last_block + options['max_block_range'], head)
+                    for event in client.get_certificate_events(last_block + 1, to_block):
+                        if event['event'] == 'CertificateBatchIssued':
+                            # Batched certificates are checked against their root's cached anchor
+                            key = '0x' + event['args']['merkleRoot'].hex()
+                            verification_cache.invalidate(batch_cache_key(key))
+                        else:
+                            key = '0x' + event['args']['certificateHash'].hex()
+                            verification_cache.invalidate(key)
+                        self.stdout.write(f"{event['event']} {key} at block {event['blockNumber']}")
+                    last_block = to_block
+                    cache.set(CHECKPOINT_KEY, last_block, None)
+            except Exception as e:
+                self.stderr.write(f'Error following certificate events: {e}')
+                client.reconnect()
+
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,67 @@
+"""
+Merkle trees over certificate hashes, matching CertificateContract._verifyProof.
+
+Leaves are keccak256(certificateHash) and each parent is the keccak256 of its
+two children in sorted order, so a proof is just the list of sibling hashes.
+A node without a sibling is carried up to the next level unchanged.
+"""
+from eth_utils import keccak
+from web3 import Web3
+
+from . import verification_cache
+from .blockchain import get_contract, to_bytes32
+
+
+def leaf_hash(certificate_hash):
+    return keccak(to_bytes32(certificate_hash))
+
+
+def hash_pair(a, b):
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+class MerkleTree:
+    def __init__(self, certificate_hashes):
+        if not certificate_hashes:
+            raise ValueError('Cannot build a Merkle tree over an empty batch')
+        self.levels = [[leaf_hash(certificate_hash) for certificate_hash in certificate_hashes]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """Sibling hashes from the leaf at index up to the root"""
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling])
+            index //= 2
+        return proof
+
+
+def verify_proof(certificate_hash, proof, root):
+    node = leaf_hash(certificate_hash)
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+def batch_cache_key(merkle_root):
+    return f'merkle-root:{merkle_root}'
+
+
+def get_anchored_batch(merkle_root):
+    """Return (issuer, timestamp) for an anchored root, or False; served from the verification cache"""
+    def fetch():
+        issuer, _, timestamp = get_contract().functions.batches(to_bytes32(merkle_root)).call()
+        return (Web3.to_checksum_address(issuer), timestamp) if timestamp else False
+
+    return verification_cache.get_or_fetch(batch_cache_key(merkle_root.lower()), fetch)
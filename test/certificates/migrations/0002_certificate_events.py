@@ -0,0 +1,97 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:05
+
+import datetime
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('block_number', models.PositiveBigIntegerField()),
+                ('block_hash', models.CharField(max_length=66)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='certificate_file',
+            field=models.FileField(null=True, upload_to='certificates/'),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='completion_date',
+            field=models.DateField(default=datetime.date(2025, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='mongodb_id',
+            field=models.CharField(blank=True, max_length=24, null=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='request_timestamp',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('ISSUED', 'Issued'), ('REVOKED', 'Revoked')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='student_identifier',
+            field=models.CharField(default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='verification_status',
+            field=models.CharField(choices=[('PENDING', 'Pending Verification'), ('VERIFIED', 'Details Verified'), ('FAILED', 'Verification Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='wallet_address',
+            field=models.CharField(max_length=42, null=True),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='blockchain_tx',
+            field=models.CharField(max_length=66, null=True),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='certificate_hash',
+            field=models.CharField(max_length=66, unique=True),
+        ),
+        migrations.CreateModel(
+            name='CertificateEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('certificate_hash', models.CharField(db_index=True, max_length=66)),
+                ('event', models.CharField(choices=[('ISSUED', 'Certificate Issued'), ('REVOKED', 'Certificate Revoked')], max_length=20)),
+                ('block_number', models.PositiveBigIntegerField(db_index=True)),
+                ('block_hash', models.CharField(max_length=66)),
+                ('transaction_hash', models.CharField(db_index=True, max_length=66)),
+                ('log_index', models.PositiveIntegerField()),
+                ('issuer', models.CharField(max_length=42, null=True)),
+                ('contract_address', models.CharField(max_length=42)),
+                ('gas_used', models.PositiveBigIntegerField()),
+                ('timestamp', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('transaction_hash', 'log_index'), name='unique_certificate_event_log')],
+            },
+        ),
+    ]
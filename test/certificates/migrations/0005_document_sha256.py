@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0004_email_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='document_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0005_document_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='merkle_proof',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='merkle_root',
+            field=models.CharField(blank=True, db_index=True, max_length=66, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0006_merkle_batches'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['university', '-issue_date', '-id'], name='certificate_university_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['university', 'status', '-issue_date', '-id'], name='certificate_uni_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['student', '-issue_date', '-id'], name='certificate_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(fields=['student', 'university', 'course_name', 'status'], name='certificate_duplicate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='certificate',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['university', '-issue_date', '-id'], name='certificate_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('certificates', '0007_certificate_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='certificateevent',
+            name='event',
+            field=models.CharField(choices=[('ISSUED', 'Certificate Issued'), ('REVOKED', 'Certificate Revoked'), ('BATCH_ISSUED', 'Certificate Batch Issued')], max_length=20),
+        ),
+    ]
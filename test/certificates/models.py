@@ -1,12 +1,30 @@
-from django.db import models
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractUser
-from .mongodb import MongoDBClient
+from .mongodb import build_request_document
+from .blockchain import get_async_client, get_contract, get_web3, on_client_loop, to_bytes32
+from .merkle import get_anchored_batch, verify_proof
+from . import verification_cache
+from .instrumentation import span, traced
+from .ratelimit import ChainBusy
+from web3.exceptions import ContractLogicError
 import hashlib
-from web3 import Web3
-from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 # Create your models here.
 
+def document_fingerprint(file):
+    """SHA-256 hex digest of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 class User(AbstractUser):
     STUDENT = 'student'
     UNIVERSITY = 'university'
@@ -57,33 +75,284 @@ class Certificate(models.Model):
         default='PENDING'
     )
     mongodb_id = models.CharField(max_length=24, null=True, blank=True)
+    # SHA-256 of certificate_file, so a document can be looked up without knowing its certificate
+    document_sha256 = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Set for certificates issued in a Merkle batch: the anchored root and this leaf's sibling path
+    merkle_root = models.CharField(max_length=66, null=True, blank=True, db_index=True)
+    merkle_proof = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        # Match the keyset order of certificates.pagination so list pages are index range scans
+        indexes = [
+            models.Index(fields=['university', '-issue_date', '-id'], name='certificate_university_idx'),
+            models.Index(fields=['university', 'status', '-issue_date', '-id'], name='certificate_uni_status_idx'),
+            models.Index(fields=['student', '-issue_date', '-id'], name='certificate_student_idx'),
+            # Duplicate request check; every filtered column is in the key so EXISTS never reads the table
+            models.Index(fields=['student', 'university', 'course_name', 'status'], name='certificate_duplicate_idx'),
+            # Pending requests are a small slice of the table; backends without partial indexes skip this one
+            models.Index(
+                fields=['university', '-issue_date', '-id'],
+                condition=models.Q(status='PENDING'),
+                name='certificate_pending_idx',
+            ),
+        ]
+
+    # Name of the stored certificate_file when the row was loaded, so save() can tell it was replaced
+    _loaded_certificate_file = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'certificate_file' in instance.__dict__:
+            instance._loaded_certificate_file = instance.certificate_file.name
+        return instance
+
+    def _certificate_file_changed(self):
+        return not self.certificate_file._committed or self.certificate_file.name != self._loaded_certificate_file
 
     def save(self, *args, **kwargs):
-        if not self.mongodb_id and self.certificate_hash:
-            # Store in MongoDB when first created
-            mongo_client = MongoDBClient()
-            result = mongo_client.store_certificate_request(self)
-            self.mongodb_id = str(result.inserted_id)
-        super().save(*args, **kwargs)
+        if not self.document_sha256 or ('certificate_file' in self.__dict__ and self._certificate_file_changed()):
+            self.document_sha256 = document_fingerprint(self.certificate_file) if self.certificate_file else None
+        if not self.certificate_hash:
+            super().save(*args, **kwargs)
+        else:
+            # Mirror to MongoDB through the outbox; relay_outbox delivers it after commit
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                OutboxMessage.objects.using(self._state.db).create(
+                    request_id=self.certificate_hash,
+                    payload=build_request_document(self)
+                )
+        if 'certificate_file' in self.__dict__:
+            self._loaded_certificate_file = self.certificate_file.name
 
+    @traced('document.fingerprint')
     def verify_document_hash(self, uploaded_file):
         """Verify if uploaded document matches stored hash"""
-        hasher = hashlib.sha256()
-        for chunk in uploaded_file.chunks():
-            hasher.update(chunk)
-        uploaded_hash = hasher.hexdigest()
-        return uploaded_hash == self.certificate_hash
+        uploaded_hash = document_fingerprint(uploaded_file)
+        return uploaded_hash == (self.document_sha256 or self.certificate_hash)
 
     def verify_on_blockchain(self):
-        """Verify certificate on blockchain"""
-        w3 = Web3(Web3.HTTPProvider('http://127.0.0.1:7545'))
-        contract = w3.eth.contract(
-            address=settings.CONTRACT_ADDRESS,
-            abi=settings.CONTRACT_ABI
-        )
+        """
+        Verify certificate on blockchain, served from the verification cache when possible.
+        Returns the contract's answer, False if the chain doesn't know the certificate, or
+        None if the chain couldn't be asked.
+        """
+        try:
+            return verification_cache.get_or_fetch(self.certificate_hash, self._fetch_blockchain_verification)
+        except ChainBusy:
+            # Overloaded isn't unverified; let the view answer 503
+            raise
+        except Exception as e:
+            logger.warning('Blockchain verification error: %s', e, extra={'certificate_hash': self.certificate_hash})
+            return None
+
+    @traced('chain.verify_certificate')
+    def _fetch_blockchain_verification(self):
+        if self.merkle_root:
+            return self._verify_merkle_proof()
+        contract = get_contract()
+        try:
+            return tuple(contract.functions.verifyCertificate(to_bytes32(self.certificate_hash)).call())
+        except ContractLogicError:
+            # verifyCertificate reverts for hashes that were never issued
+            return False
+
+    async def averify_on_blockchain(self):
+        """Async verify_on_blockchain for async views"""
         try:
-            result = contract.functions.verifyCertificate(self.certificate_hash).call()
-            return result
+            return await verification_cache.aget_or_fetch(self.certificate_hash, self._afetch_blockchain_verification)
+        except ChainBusy:
+            raise
         except Exception as e:
-            print(f"Blockchain verification error: {e}")
+            logger.warning('Blockchain verification error: %s', e, extra={'certificate_hash': self.certificate_hash})
+            return None
+
+    @traced('chain.verify_certificate')
+    async def _afetch_blockchain_verification(self):
+        if self.merkle_root:
+            return await sync_to_async(self._verify_merkle_proof, thread_sensitive=False)()
+        contract = (await get_async_client()).contract
+        try:
+            return tuple(await on_client_loop(
+                contract.functions.verifyCertificate(to_bytes32(self.certificate_hash)).call()
+            ))
+        except ContractLogicError:
+            return False
+
+    def _verify_merkle_proof(self, revoked=None):
+        """
+        Check the stored proof locally against the anchored batch root, which is cached,
+        and revocation on chain unless the caller has already looked it up
+        """
+        if not verify_proof(self.certificate_hash, [to_bytes32(node) for node in self.merkle_proof],
+                            to_bytes32(self.merkle_root)):
             return False
+        batch = get_anchored_batch(self.merkle_root)
+        if not batch:
+            return False
+        if revoked is None:
+            revoked = get_contract().functions.revokedBatchedCertificates(to_bytes32(self.certificate_hash)).call()
+        issuer, timestamp = batch
+        return (not revoked, issuer, self.wallet_address, timestamp)
+
+    def get_transaction_details(self):
+        """Get transaction details from the event index, falling back to Ganache"""
+        if not self.blockchain_tx:
+            return None
+        event = CertificateEvent.objects.filter(
+            transaction_hash=self.blockchain_tx.lower(),
+            event__in=[CertificateEvent.ISSUED, CertificateEvent.BATCH_ISSUED]
+        ).first()
+        if event is not None:
+            return event.as_transaction_details()
+
+        try:
+            w3 = get_web3()
+            tx_hash = self.blockchain_tx
+            with span('chain.transaction_details'):
+                tx_details = w3.eth.get_transaction(tx_hash)
+                tx_receipt = w3.eth.get_transaction_receipt(tx_hash)
+                block = w3.eth.get_block(tx_receipt['blockNumber'])
+
+            return {
+                'block_number': tx_receipt['blockNumber'],
+                'block_hash': tx_receipt['blockHash'].hex(),
+                'transaction_hash': tx_hash,
+                'from_address': tx_details['from'],
+                'to_address': tx_details['to'],
+                'gas_used': tx_receipt['gasUsed'],
+                'timestamp': block['timestamp']
+            }
+        except ChainBusy:
+            raise
+        except Exception as e:
+            logger.warning('Error getting transaction details: %s', e, extra={'transaction_hash': self.blockchain_tx})
+            return None
+
+    async def aget_transaction_details(self):
+        """Async get_transaction_details; the transaction and its receipt are fetched concurrently"""
+        if not self.blockchain_tx:
+            return None
+        event = await CertificateEvent.objects.filter(
+            transaction_hash=self.blockchain_tx.lower(),
+            event__in=[CertificateEvent.ISSUED, CertificateEvent.BATCH_ISSUED]
+        ).afirst()
+        if event is not None:
+            return event.as_transaction_details()
+
+        try:
+            w3 = (await get_async_client()).w3
+            tx_hash = self.blockchain_tx
+
+            async def fetch():
+                tx_details, tx_receipt = await asyncio.gather(
+                    w3.eth.get_transaction(tx_hash),
+                    w3.eth.get_transaction_receipt(tx_hash)
+                )
+                return tx_details, tx_receipt, await w3.eth.get_block(tx_receipt['blockNumber'])
+
+            with span('chain.transaction_details'):
+                tx_details, tx_receipt, block = await on_client_loop(fetch())
+
+            return {
+                'block_number': tx_receipt['blockNumber'],
+                'block_hash': tx_receipt['blockHash'].hex(),
+                'transaction_hash': tx_hash,
+                'from_address': tx_details['from'],
+                'to_address': tx_details['to'],
+                'gas_used': tx_receipt['gasUsed'],
+                'timestamp': block['timestamp']
+            }
+        except ChainBusy:
+            raise
+        except Exception as e:
+            logger.warning('Error getting transaction details: %s', e, extra={'transaction_hash': self.blockchain_tx})
+            return None
+
+
+class CertificateEvent(models.Model):
+    """CertificateIssued/CertificateRevoked/CertificateBatchIssued log mirrored from the chain by index_certificate_events"""
+    ISSUED = 'ISSUED'
+    REVOKED = 'REVOKED'
+    BATCH_ISSUED = 'BATCH_ISSUED'
+
+    EVENT_CHOICES = [
+        (ISSUED, 'Certificate Issued'),
+        (REVOKED, 'Certificate Revoked'),
+        (BATCH_ISSUED, 'Certificate Batch Issued'),
+    ]
+
+    # The Merkle root for BATCH_ISSUED events
+    certificate_hash = models.CharField(max_length=66, db_index=True)
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    block_number = models.PositiveBigIntegerField(db_index=True)
+    block_hash = models.CharField(max_length=66)
+    transaction_hash = models.CharField(max_length=66, db_index=True)
+    log_index = models.PositiveIntegerField()
+    issuer = models.CharField(max_length=42, null=True)
+    contract_address = models.CharField(max_length=42)
+    gas_used = models.PositiveBigIntegerField()
+    timestamp = models.PositiveBigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_hash', 'log_index'], name='unique_certificate_event_log'),
+        ]
+
+    def as_transaction_details(self):
+        """Same shape as Certificate.get_transaction_details() builds from RPC calls"""
+        return {
+            'block_number': self.block_number,
+            'block_hash': self.block_hash,
+            'transaction_hash': self.transaction_hash,
+            'from_address': self.issuer,
+            'to_address': self.contract_address,
+            'gas_used': self.gas_used,
+            'timestamp': self.timestamp
+        }
+
+
+class IndexerCheckpoint(models.Model):
+    """Last block an event indexer has fully processed"""
+    name = models.CharField(max_length=50, unique=True)
+    block_number = models.PositiveBigIntegerField()
+    block_hash = models.CharField(max_length=66)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class OutboxMessage(models.Model):
+    """Certificate request document waiting to be relayed to MongoDB by relay_outbox"""
+    request_id = models.CharField(max_length=66)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+
+class EmailNotification(models.Model):
+    """Email waiting to be sent by send_notifications"""
+    MESSAGE = 'MESSAGE'
+    PENDING_REQUEST = 'PENDING_REQUEST'
+
+    KIND_CHOICES = [
+        (MESSAGE, 'Message'),
+        (PENDING_REQUEST, 'Pending Request Notice'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=MESSAGE)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255, blank=True)
+    body_text = models.TextField(blank=True)
+    body_html = models.TextField(blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'id'], name='email_queue_idx'),
+        ]
@@ -1,46 +1,245 @@
-from pymongo import MongoClient
+import logging
+import os
+import threading
+import time
+from pymongo import ASCENDING, MongoClient, UpdateOne, WriteConcern
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
 from django.conf import settings
 from datetime import datetime
 
+from .instrumentation import CommandMetrics, Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection pool activity so it can be reported as metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'checked_out': 0,
+            'pool_clears': 0,
+        }
+
+    def _incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._incr('checkouts')
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        self._incr('checked_out', -1)
+
+
+pool_metrics = PoolMetrics()
+command_metrics = CommandMetrics()
+Snapshot(
+    'certblock_mongodb_pool', 'MongoDB connection pool activity in this process', pool_metrics.snapshot,
+    counters=['connections_created', 'connections_closed', 'checkouts', 'checkout_failures', 'pool_clears']
+)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_mongo_client():
+    """
+    Return the process-wide MongoClient.
+
+    The client is rebuilt after a fork: pymongo clients are not fork-safe, so a
+    gunicorn/uwsgi worker must never reuse the pool its master created.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(
+                    settings.MONGODB_URI,
+                    maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                    minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                    maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    # Don't start monitor threads until first use, so a preloading master never owns any
+                    connect=False,
+                    event_listeners=[pool_metrics, command_metrics],
+                )
+                _client_pid = pid
+    return _client
+
+
+def close_mongo_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def get_pool_stats():
+    """Connection pool counters for this process, plus the configured pool size"""
+    stats = pool_metrics.snapshot()
+    stats['max_pool_size'] = settings.MONGODB_MAX_POOL_SIZE
+    stats['pid'] = os.getpid()
+    return stats
+
+
+def build_request_document(certificate):
+    """Build the certificate_requests document for a Certificate"""
+    return {
+        'request_id': certificate.certificate_hash,
+        'student': {
+            'id': str(certificate.student.id),
+            'name': certificate.student.get_full_name(),
+            'email': certificate.student.email,
+            'student_id': certificate.student_identifier,
+            'wallet_address': certificate.wallet_address
+        },
+        'university': {
+            'id': str(certificate.university.id),
+            'name': certificate.university.get_full_name(),
+            'email': certificate.university.email
+        },
+        'course': {
+            'name': certificate.course_name,
+            'completion_date': str(certificate.completion_date)
+        },
+        'status': certificate.status,
+        'verification_status': certificate.verification_status,
+        'timestamps': {
+            'requested': certificate.request_timestamp.isoformat(),
+            'last_updated': datetime.now().isoformat()
+        },
+        'metadata': {
+            'source': 'web_application',
+            'blockchain_network': settings.BLOCKCHAIN_NETWORK
+        }
+    }
+
+
+INDEXES = [
+    ([('request_id', ASCENDING)], {'unique': True, 'name': 'request_id_unique'}),
+    ([('university.id', ASCENDING), ('status', ASCENDING)], {'name': 'university_status'}),
+    ([('timestamps.requested', ASCENDING)], {'name': 'requested_at'}),
+]
+
+_indexed_collections = set()
+_index_failures = {}
+
+
+def ensure_indexes(collection, force=False):
+    """
+    Create the certificate_requests indexes once per process. Each index is
+    created on its own, so one failing (e.g. request_id_unique over duplicates
+    left by older releases) doesn't stop the others. Returns {name: error} for
+    the indexes that failed; those are retried after MONGODB_INDEX_RETRY_INTERVAL.
+    """
+    key = (id(get_mongo_client()), collection.full_name)
+    if not force and key in _indexed_collections:
+        return {}
+    failed_at = _index_failures.get(key)
+    if not force and failed_at is not None and time.monotonic() - failed_at < settings.MONGODB_INDEX_RETRY_INTERVAL:
+        return {}
+
+    errors = {}
+    for keys, options in INDEXES:
+        try:
+            collection.create_index(keys, **options)
+        except PyMongoError as e:
+            logger.error('Error creating MongoDB index %s: %s', options['name'], e)
+            errors[options['name']] = e
+    if errors:
+        _index_failures[key] = time.monotonic()
+    else:
+        _index_failures.pop(key, None)
+        _indexed_collections.add(key)
+    return errors
+
+
 class MongoDBClient:
     def __init__(self):
-        self.client = MongoClient(settings.MONGODB_URI)
-        self.db = self.client[settings.MONGODB_NAME]
+        self.client = get_mongo_client()
+        self.db = self.client.get_database(
+            settings.MONGODB_NAME,
+            write_concern=WriteConcern(
+                w=settings.MONGODB_WRITE_CONCERN,
+                wtimeout=settings.MONGODB_WRITE_CONCERN_TIMEOUT_MS
+            )
+        )
         self.certificate_requests = self.db.certificate_requests
+        ensure_indexes(self.certificate_requests)
 
     def store_certificate_request(self, certificate):
-        """Store certificate request in MongoDB"""
-        request_data = {
-            'request_id': certificate.certificate_hash,
-            'student': {
-                'id': str(certificate.student.id),
-                'name': certificate.student.get_full_name(),
-                'email': certificate.student.email,
-                'student_id': certificate.student_identifier,
-                'wallet_address': certificate.wallet_address
-            },
-            'university': {
-                'id': str(certificate.university.id),
-                'name': certificate.university.get_full_name(),
-                'email': certificate.university.email
-            },
-            'course': {
-                'name': certificate.course_name,
-                'completion_date': certificate.completion_date.isoformat()
-            },
-            'status': certificate.status,
-            'verification_status': certificate.verification_status,
-            'timestamps': {
-                'requested': certificate.request_timestamp.isoformat(),
-                'last_updated': datetime.now().isoformat()
-            },
-            'metadata': {
-                'source': 'web_application',
-                'blockchain_network': settings.BLOCKCHAIN_NETWORK
-            }
-        }
-        
-        return self.certificate_requests.insert_one(request_data)
+        """Store certificate request in MongoDB (a no-op if request_id is already stored)"""
+        request_data = build_request_document(certificate)
+        return self.certificate_requests.update_one(
+            {'request_id': request_data['request_id']},
+            {'$setOnInsert': request_data},
+            upsert=True
+        )
+
+    def bulk_upsert_documents(self, documents):
+        """
+        Insert or overwrite request documents keyed on request_id in one unordered
+        round trip. A document with a 'version' only replaces an older version; when
+        a newer one is stored its upsert fails with a duplicate key error instead.
+        """
+        operations = [
+            UpdateOne(
+                {'request_id': doc['request_id'], '$or': [
+                    {'version': {'$lt': doc['version']}}, {'version': {'$exists': False}}
+                ]} if 'version' in doc else {'request_id': doc['request_id']},
+                {'$set': doc},
+                upsert=True
+            )
+            for doc in documents
+        ]
+        if not operations:
+            return None
+        return self.certificate_requests.bulk_write(operations, ordered=False)
 
     def update_request_status(self, request_id, new_status):
         """Update certificate request status"""
@@ -0,0 +1,151 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailNotification
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, recipient_list, html_message=None):
+    """Queue an email for send_notifications instead of sending it inside the request"""
+    EmailNotification.objects.bulk_create([
+        EmailNotification(
+            subject=subject,
+            body_text=message,
+            body_html=html_message or '',
+            recipient=recipient
+        ) for recipient in recipient_list if recipient
+    ])
+
+
+def queue_emails(emails):
+    """Queue many (subject, message, recipient) emails with a single insert"""
+    EmailNotification.objects.bulk_create([
+        EmailNotification(subject=subject, body_text=message, recipient=recipient)
+        for subject, message, recipient in emails if recipient
+    ])
+
+
+def queue_pending_request_notice(certificate):
+    """Queue a new-request notice for the university admin; notices to one admin are sent as a digest"""
+    if not certificate.university.email:
+        return
+    EmailNotification.objects.create(
+        kind=EmailNotification.PENDING_REQUEST,
+        recipient=certificate.university.email,
+        context={
+            'student_name': certificate.student.get_full_name(),
+            'student_id': certificate.student_identifier,
+            'course_name': certificate.course_name,
+            'request_id': certificate.certificate_hash,
+            'request_date': str(certificate.request_timestamp)
+        }
+    )
+
+
+def _pending_request_email(recipient, notifications):
+    if len(notifications) == 1:
+        context = notifications[0].context
+        subject = 'New Certificate Request Pending Approval'
+        template = 'emails/new_certificate_request'
+    else:
+        context = {'requests': [notification.context for notification in notifications]}
+        subject = f'{len(notifications)} New Certificate Requests Pending Approval'
+        template = 'emails/certificate_request_digest'
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=render_to_string(f'{template}.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient]
+    )
+    email.attach_alternative(render_to_string(f'{template}.html', context), 'text/html')
+    return email
+
+
+def _message_email(notification):
+    email = EmailMultiAlternatives(
+        subject=notification.subject,
+        body=notification.body_text,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.recipient]
+    )
+    if notification.body_html:
+        email.attach_alternative(notification.body_html, 'text/html')
+    return email
+
+
+def send_queued_notifications(batch_size=None, digest_window=None):
+    """
+    Send one batch of queued emails over a single SMTP connection.
+    Pending-request notices are held for digest_window seconds so several
+    notices to the same admin go out as one digest. Returns the number of
+    queued notifications handled.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    if digest_window is None:
+        digest_window = settings.NOTIFICATION_DIGEST_WINDOW
+    digest_cutoff = timezone.now() - timedelta(seconds=digest_window)
+
+    unsent = EmailNotification.objects.filter(sent_at__isnull=True, attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS)
+    digest_due = unsent.filter(
+        kind=EmailNotification.PENDING_REQUEST, recipient=OuterRef('recipient'), created_at__lte=digest_cutoff
+    )
+    with transaction.atomic():
+        # Notices still waiting for their digest would otherwise fill the batch and hold up everything behind them
+        queued = list(
+            unsent.select_for_update(skip_locked=True)
+            .exclude(Q(kind=EmailNotification.PENDING_REQUEST, created_at__gt=digest_cutoff) & ~Exists(digest_due))
+            .order_by('id')[:batch_size]
+        )
+
+        # Each outgoing email with the notifications it covers
+        outgoing = []
+        digests = defaultdict(list)
+        for notification in queued:
+            if notification.kind == EmailNotification.PENDING_REQUEST:
+                digests[notification.recipient].append(notification)
+            else:
+                outgoing.append((_message_email(notification), [notification]))
+        for recipient, notifications in digests.items():
+            if notifications[0].created_at > digest_cutoff:
+                continue  # wait for more notices to this admin
+            outgoing.append((_pending_request_email(recipient, notifications), notifications))
+
+        if not outgoing:
+            return 0
+
+        sent_ids = []
+        failed = {}
+        connection = get_connection()
+        try:
+            connection.open()
+            for email, notifications in outgoing:
+                try:
+                    connection.send_messages([email])
+                    sent_ids.extend(notification.id for notification in notifications)
+                except Exception as e:
+                    for notification in notifications:
+                        failed[notification.id] = str(e)
+        except Exception as e:
+            logger.warning('Error opening mail connection: %s', e)
+            for _, notifications in outgoing:
+                for notification in notifications:
+                    failed.setdefault(notification.id, str(e))
+        finally:
+            connection.close()
+
+        EmailNotification.objects.filter(id__in=sent_ids).update(sent_at=timezone.now())
+        for notification_id, error in failed.items():
+            EmailNotification.objects.filter(id=notification_id).update(
+                attempts=F('attempts') + 1, last_error=error
+            )
+    return len(sent_ids) + len(failed)
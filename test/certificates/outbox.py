@@ -0,0 +1,80 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from pymongo.errors import BulkWriteError
+
+from .models import Certificate, OutboxMessage
+from .mongodb import MongoDBClient, build_request_document
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def enqueue_certificates(certificates):
+    """Queue request documents for certificates changed without save(), e.g. via bulk_update()"""
+    OutboxMessage.objects.bulk_create([
+        OutboxMessage(request_id=certificate.certificate_hash, payload=build_request_document(certificate))
+        for certificate in certificates
+        if certificate.certificate_hash
+    ])
+
+
+def relay_outbox(batch_size=None):
+    """
+    Deliver one batch of outbox messages to MongoDB with idempotent upserts.
+    Each document carries its message id as a version, so a message relayed
+    late can't overwrite a newer one. Returns the number of messages relayed.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by('id')[:batch_size]
+        )
+        if not messages:
+            return 0
+
+        # Only the newest document per request matters; earlier ones are superseded
+        newest = {message.request_id: message for message in messages}
+        request_ids = list(newest)
+        try:
+            result = MongoDBClient().bulk_upsert_documents(
+                {**message.payload, 'version': message.id} for message in newest.values()
+            )
+            upserted_ids, errors = result.upserted_ids, {}
+        except BulkWriteError as e:
+            upserted_ids = {upsert['index']: upsert['_id'] for upsert in e.details.get('upserted', [])}
+            errors = {
+                request_ids[error['index']]: error.get('errmsg', str(error))
+                for error in e.details.get('writeErrors', [])
+                # A newer version is already stored, so the filter missed and the insert hit request_id_unique
+                if error.get('code') != DUPLICATE_KEY_ERROR
+            }
+        except Exception as e:
+            logger.warning('Error relaying outbox to MongoDB: %s', e)
+            OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(
+                attempts=F('attempts') + 1, last_error=str(e)
+            )
+            return 0
+
+        for request_id, error in errors.items():
+            logger.warning('Error relaying outbox message for %s to MongoDB: %s', request_id, error)
+            OutboxMessage.objects.filter(
+                id__in=[message.id for message in messages if message.request_id == request_id]
+            ).update(attempts=F('attempts') + 1, last_error=error)
+        OutboxMessage.objects.filter(
+            id__in=[message.id for message in messages if message.request_id not in errors]
+        ).delete()
+
+        mongodb_ids = {request_ids[index]: str(mongodb_id) for index, mongodb_id in upserted_ids.items()}
+        if mongodb_ids:
+            Certificate.objects.filter(certificate_hash__in=mongodb_ids).update(mongodb_id=Case(
+                *(When(certificate_hash=request_id, then=Value(mongodb_id))
+                  for request_id, mongodb_id in mongodb_ids.items()),
+                default=F('mongodb_id')
+            ))
+    return len(messages) - sum(message.request_id in errors for message in messages)
@@ -0,0 +1,59 @@
+"""
+Keyset (cursor) pagination over (issue_date, id), newest first.
+
+Unlike OFFSET pagination, every page costs the same index range scan no matter
+how deep it is, and rows inserted while someone pages don't shift the pages.
+"""
+import base64
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(issue_date, pk):
+    return base64.urlsafe_b64encode(f'{issue_date.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (issue_date, id) for a cursor; raises ValueError if it was tampered with"""
+    try:
+        issue_date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        issue_date = parse_datetime(issue_date)
+        if issue_date is None:
+            raise ValueError
+        return issue_date, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def paginate(queryset, cursor=None, page_size=None):
+    """Return the page of queryset that comes after cursor"""
+    page_size = page_size or settings.CERTIFICATES_PAGE_SIZE
+    queryset = queryset.order_by('-issue_date', '-id')
+    if cursor:
+        issue_date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(issue_date__lt=issue_date) | Q(issue_date=issue_date, id__lt=pk))
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return KeysetPage(items)
+    items = items[:page_size]
+    return KeysetPage(items, encode_cursor(items[-1].issue_date, items[-1].id))
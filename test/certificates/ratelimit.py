@@ -0,0 +1,361 @@
+"""
+Rate limiting for the public verification endpoints and admission control for
+calls to the chain.
+
+RateLimitMiddleware gives each client of the views in RATE_LIMITED_VIEWS a
+token bucket: RATE_LIMIT_RATE requests per second with bursts of up to
+RATE_LIMIT_BURST per IP, or the rate and burst listed for its key in
+RATE_LIMIT_API_KEYS when it sends one as X-API-Key. Buckets live in the
+RATE_LIMIT_CACHE_ALIAS cache so all workers share them, and in process memory
+while that cache is unreachable. A bucket is read and written back rather than
+updated atomically, so workers racing on one client can let the odd request
+past the limit.
+
+Every JSON-RPC request, sync or async, first takes one of RPC_MAX_IN_FLIGHT
+slots from chain_admission. Callers beyond that queue in arrival order, at
+most RPC_ADMISSION_QUEUE_SIZE of them for up to RPC_ADMISSION_TIMEOUT seconds,
+and otherwise get ChainBusy, which the views answer with 503 and Retry-After
+instead of tying up workers on a saturated node.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from web3.middleware import Web3Middleware
+
+from .instrumentation import Counter, Snapshot, record
+from .verification_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ratelimit:'
+
+RATE_LIMITED = Counter('certblock_rate_limited_total', 'Requests refused by the rate limiter', ['view', 'bucket'])
+
+
+# Token buckets
+
+# Refill is computed from each bucket's timestamp, so local entries only expire to make room
+_local_buckets = LRUCache(settings.RATE_LIMIT_LOCAL_SIZE, 86400)
+_local_lock = threading.Lock()
+
+
+def _shared_cache():
+    alias = settings.RATE_LIMIT_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _spend(state, now, rate, burst):
+    """Take a token from a (tokens, updated) bucket; returns (new state or None, seconds to wait)"""
+    tokens, updated = state or (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens < 1:
+        return None, (1 - tokens) / rate
+    return (tokens - 1, now), 0.0
+
+
+def _bucket_timeout(rate, burst):
+    # Once a bucket has had time to refill it's the same as a missing one
+    return math.ceil(burst / rate) + 1
+
+
+def _take_local(key, now, rate, burst):
+    with _local_lock:
+        state, retry_after = _spend(_local_buckets.get(key), now, rate, burst)
+        if state:
+            _local_buckets.set(key, state)
+    return retry_after
+
+
+def take(key, rate, burst):
+    """Take a token from key's bucket; returns 0, or the seconds until the next token"""
+    now = time.time()
+    cache = _shared_cache()
+    if cache is not None:
+        try:
+            state, retry_after = _spend(cache.get(KEY_PREFIX + key), now, rate, burst)
+            if state:
+                cache.set(KEY_PREFIX + key, state, _bucket_timeout(rate, burst))
+            return retry_after
+        except Exception as e:
+            logger.warning('Rate limit cache unavailable, limiting per process: %s', e)
+    return _take_local(key, now, rate, burst)
+
+
+async def atake(key, rate, burst):
+    now = time.time()
+    cache = _shared_cache()
+    if cache is not None:
+        try:
+            state, retry_after = _spend(await cache.aget(KEY_PREFIX + key), now, rate, burst)
+            if state:
+                await cache.aset(KEY_PREFIX + key, state, _bucket_timeout(rate, burst))
+            return retry_after
+        except Exception as e:
+            logger.warning('Rate limit cache unavailable, limiting per process: %s', e)
+    return _take_local(key, now, rate, burst)
+
+
+def client_ip(request):
+    """The caller's address, read from X-Forwarded-For as set by RATE_LIMIT_TRUSTED_PROXIES proxies"""
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded = request.headers.get('X-Forwarded-For')
+    if proxies and forwarded:
+        # Each proxy appends the address it got the request from; anything left of ours is client-supplied
+        addresses = [address.strip() for address in forwarded.split(',')]
+        return addresses[max(0, len(addresses) - proxies)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def retry_after_response(message, status, retry_after):
+    response = JsonResponse({'status': 'error', 'message': message}, status=status)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimitMiddleware:
+    """Answer clients that have spent their bucket on RATE_LIMITED_VIEWS with 429"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        limit = self._limit(request)
+        if limit:
+            view, bucket, key, rate, burst = limit
+            retry_after = take(key, rate, burst)
+            if retry_after:
+                return self._refuse(view, bucket, retry_after)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        limit = self._limit(request)
+        if limit:
+            view, bucket, key, rate, burst = limit
+            retry_after = await atake(key, rate, burst)
+            if retry_after:
+                return self._refuse(view, bucket, retry_after)
+        return await self.get_response(request)
+
+    def _limit(self, request):
+        """(view, bucket kind, bucket key, rate, burst) for a rate limited request, else None"""
+        try:
+            view = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if view not in settings.RATE_LIMITED_VIEWS:
+            return None
+        api_key = request.headers.get('X-API-Key')
+        limits = settings.RATE_LIMIT_API_KEYS.get(api_key) if api_key else None
+        if limits:
+            # Keys are credentials; keep them out of cache keys
+            return (view, 'api_key', 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:32], *limits)
+        return view, 'ip', 'ip:' + client_ip(request), settings.RATE_LIMIT_RATE, settings.RATE_LIMIT_BURST
+
+    def _refuse(self, view, bucket, retry_after):
+        RATE_LIMITED.inc(view, bucket)
+        return retry_after_response('Too many requests', 429, retry_after)
+
+
+# Chain admission
+
+class ChainBusy(Exception):
+    """No slot for a JSON-RPC request came free in time"""
+
+    def __init__(self, retry_after):
+        super().__init__('The blockchain node is busy, try again shortly')
+        self.retry_after = retry_after
+
+
+def chain_busy_response(error):
+    return retry_after_response(str(error), 503, error.retry_after)
+
+
+class _Waiter:
+    __slots__ = ('granted', 'wake')
+
+    def __init__(self, wake):
+        self.granted = False
+        self.wake = wake
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Admission:
+    """
+    A semaphore shared by threads and event loops: limit holders at a time,
+    with up to queue_size callers waiting in FIFO order for at most timeout
+    seconds each. A released slot passes straight to the longest waiter.
+    Slots taken with slot()/aslot() are re-entrant within a thread or task.
+    """
+
+    def __init__(self, limit, queue_size, timeout, retry_after):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._holding = ContextVar(f'admission_{id(self)}', default=False)
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _enter(self, wake):
+        """Take a slot and return None, or queue a waiter and return it"""
+        with self._lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return None
+            if len(self._waiters) >= self.queue_size:
+                self.rejected += 1
+                raise ChainBusy(self.retry_after)
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _leave(self, waiter):
+        """Stop waiting; returns whether the waiter was handed a slot meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.rejected += 1
+            return False
+
+    def acquire(self):
+        event = threading.Event()
+        waiter = self._enter(event.set)
+        if waiter is None:
+            return
+        start = time.perf_counter()
+        event.wait(self.timeout)
+        granted = self._leave(waiter)
+        record('rpc.admission_wait', time.perf_counter() - start, None if granted else 'ChainBusy')
+        if not granted:
+            raise ChainBusy(self.retry_after)
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(lambda: loop.call_soon_threadsafe(_wake, future))
+        if waiter is None:
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled: give back a slot that was handed over meanwhile
+            if self._leave(waiter):
+                self.release()
+            raise
+        granted = self._leave(waiter)
+        record('rpc.admission_wait', time.perf_counter() - start, None if granted else 'ChainBusy')
+        if not granted:
+            raise ChainBusy(self.retry_after)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                try:
+                    waiter.wake()
+                    return
+                except RuntimeError:
+                    # Its event loop has closed; the slot goes to the next in line
+                    continue
+            self.in_flight -= 1
+
+    @contextmanager
+    def slot(self):
+        # web3's own middleware sends nested requests (eth_chainId and the like) from inside
+        # ours; waiting for a second slot there deadlocks once every slot is held that way
+        if self._holding.get():
+            yield
+            return
+        self.acquire()
+        token = self._holding.set(True)
+        try:
+            yield
+        finally:
+            self._holding.reset(token)
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        if self._holding.get():
+            yield
+            return
+        await self.aacquire()
+        token = self._holding.set(True)
+        try:
+            yield
+        finally:
+            self._holding.reset(token)
+            self.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'in_flight': self.in_flight, 'waiting': self.waiting, 'rejected': self.rejected}
+
+
+chain_admission = Admission(
+    settings.RPC_MAX_IN_FLIGHT, settings.RPC_ADMISSION_QUEUE_SIZE,
+    settings.RPC_ADMISSION_TIMEOUT, settings.RPC_BUSY_RETRY_AFTER
+)
+
+Snapshot('certblock_rpc_admission', 'JSON-RPC admission slots and queue', chain_admission.stats,
+         counters=('rejected',))
+
+
+class RPCAdmissionMiddleware(Web3Middleware):
+    """Hold a chain_admission slot for each JSON-RPC request; a batch is one request"""
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            with chain_admission.slot():
+                return make_request(method, params)
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            async with chain_admission.aslot():
+                return await make_request(method, params)
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            with chain_admission.slot():
+                return make_batch_request(requests_info)
+        return middleware
+
+    async def async_wrap_make_batch_request(self, make_batch_request):
+        async def middleware(requests_info):
+            async with chain_admission.aslot():
+                return await make_batch_request(requests_info)
+        return middleware
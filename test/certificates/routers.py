@@ -0,0 +1,67 @@
+"""
+Send the queries of read-only views to a replica database.
+
+Views opt in with the @read_replica decorator; everything else, including
+every write and every read outside those views, stays on 'default'. Reading
+outside the decorated views from the primary keeps read-your-own-writes
+behaviour for flows such as approve-then-redirect, while verification and
+listing traffic, which tolerates a little replication lag, moves off the
+primary. Without a 'replica' alias in DATABASES this is a no-op.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+
+REPLICA = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.databases
+
+
+@contextmanager
+def using_replica():
+    """Route ORM reads in this block (and this thread or task only) to the replica"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_replica(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(*args, **kwargs):
+            # sync_to_async copies the context, so async ORM calls see the flag too
+            with using_replica():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            with using_replica():
+                return view(*args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != REPLICA
@@ -0,0 +1,171 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from django.conf import settings
+from .ipfs_service import IPFSError, get_ipfs_client
+
+CID_PATTERN = re.compile(r'^[A-Za-z0-9]{10,128}$')
+CHUNK_SIZE = 64 * 1024
+
+
+def is_valid_cid(cid):
+    """CIDs are base58/base32 strings; anything else must never reach the filesystem"""
+    return bool(CID_PATTERN.match(cid))
+
+
+def sniff_content_type(head):
+    """Guess a content type from the first bytes of a blob"""
+    if head.startswith(b'%PDF'):
+        return 'application/pdf'
+    if head.lstrip()[:1] in (b'{', b'['):
+        return 'application/json'
+    return 'application/octet-stream'
+
+
+def read_range(blob, start, length):
+    """Yield length bytes of an open file starting at start, then close it"""
+    try:
+        blob.seek(start)
+        while length > 0:
+            chunk = blob.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        blob.close()
+
+
+class BlobCache:
+    """Size-bounded on-disk cache of IPFS content keyed by CID, evicting least recently used blobs"""
+
+    def __init__(self, directory, max_bytes, scan_interval=60):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.scan_interval = scan_interval
+        self._evict_lock = threading.Lock()
+        # Bytes on disk at the last scan plus what this process has cached since; None until scanned
+        self._size = None
+        self._scanned_at = 0.0
+        self._size_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, cid):
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.directory, cid[-2:], cid)
+
+    def open(self, cid):
+        """Return an open binary file for a cached CID, or None on a miss"""
+        path = self.path(cid)
+        try:
+            blob = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used for eviction
+        except OSError:
+            pass
+        return blob
+
+    def stream_from_ipfs(self, cid):
+        """
+        Return an iterator over the content of a CID from the IPFS daemon that
+        also writes it into the cache. The blob only becomes visible once it has
+        been fully read. Raises FileNotFoundError if the daemon cannot provide it.
+        """
+        try:
+            response = get_ipfs_client().cat_stream(cid)
+        except IPFSError as e:
+            raise FileNotFoundError(cid) from e
+        return self._tee(cid, response)
+
+    def _tee(self, cid, response):
+        path = self.path(cid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+        completed = False
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as partial:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    partial.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+            completed = True
+        finally:
+            response.close()
+            if not completed:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        self._added(written)
+
+    def _added(self, size):
+        """Count a newly cached blob; only walk the directory once over budget or when the last scan is stale"""
+        with self._size_lock:
+            if self._size is not None:
+                self._size += size
+            due = (
+                self._size is None or self._size > self.max_bytes
+                or time.monotonic() - self._scanned_at >= self.scan_interval
+            )
+        if due:
+            self.evict()
+
+    def fetch(self, cid):
+        """Fill the cache for a CID without serving it; returns an open file"""
+        for _ in self.stream_from_ipfs(cid):
+            pass
+        return self.open(cid)
+
+    def evict(self):
+        """Delete least recently used blobs until the cache fits in max_bytes"""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # another thread is already evicting
+        try:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.startswith('.partial-'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            with self._size_lock:
+                self._size = total
+                self._scanned_at = time.monotonic()
+        finally:
+            self._evict_lock.release()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_blob_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = BlobCache(
+                    settings.IPFS_CACHE_DIR, settings.IPFS_CACHE_MAX_BYTES, settings.IPFS_CACHE_SCAN_INTERVAL
+                )
+    return _cache
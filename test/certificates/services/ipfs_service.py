@@ -1,30 +1,281 @@
-import requests
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
-def upload_to_ipfs(file_content):
-    try:
-        response = requests.post(
-            f"http://{settings.IPFS_HOST}:{settings.IPFS_PORT}/api/v0/add",
-            files={"file": file_content}
+from ..instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; kubo answers 500 for bad input and missing content, so that one is final
+RETRY_STATUSES = {502, 503, 504}
+
+
+class IPFSError(Exception):
+    """Raised when the IPFS API fails after all retries"""
+
+
+def api_url(endpoint):
+    return f"{settings.IPFS_API_URL.rstrip('/')}/api/v0/{endpoint}"
+
+
+def backoff_delay(attempt):
+    return settings.IPFS_RETRY_BACKOFF * (2 ** attempt)
+
+
+def _multipart_body(chunks, filename, boundary, hasher):
+    """Yield a single-file multipart/form-data body, hashing the file bytes as they pass"""
+    filename = os.path.basename(filename).replace('"', '')
+    yield (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode()
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _as_bytes(data):
+    return data.encode() if isinstance(data, str) else data
+
+
+class IPFSClient:
+    """Thread-safe IPFS API client over one pooled keep-alive session"""
+
+    def __init__(self, pool_size=None, concurrency=None, timeout=None, retries=None):
+        self.concurrency = concurrency or settings.IPFS_UPLOAD_CONCURRENCY
+        self.timeout = timeout or settings.IPFS_TIMEOUT
+        self.retries = retries if retries is not None else settings.IPFS_MAX_RETRIES
+        self.session = requests.Session()
+        self.session.auth = settings.IPFS_AUTH
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or settings.IPFS_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, endpoint, retry=True, **kwargs):
+        """POST to an API endpoint, retrying connection errors and gateway failures with backoff"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = self.retries + 1 if retry else 1
+        with span(f'ipfs.{endpoint}'):
+            for attempt in range(attempts):
+                try:
+                    response = self.session.post(api_url(endpoint), **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == attempts - 1:
+                        raise IPFSError(f"IPFS {endpoint} failed: {e}") from e
+                else:
+                    if response.status_code == 200:
+                        return response
+                    if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                        message = response.text[:200]
+                        response.close()
+                        raise IPFSError(f"IPFS {endpoint} returned {response.status_code}: {message}")
+                    response.close()
+                time.sleep(backoff_delay(attempt))
+
+    def add(self, data, filename='file'):
+        """Upload bytes or text and return the CID"""
+        response = self.request('add', files={'file': (filename, _as_bytes(data))})
+        return response.json()['Hash']
+
+    def add_stream(self, chunks, filename='file'):
+        """
+        Stream an iterable of byte chunks (e.g. UploadedFile.chunks()) to IPFS.
+        Only one chunk is held in memory at a time. Returns (cid, sha256_hex).
+        The body can only be read once, so stream uploads are not retried.
+        """
+        boundary = uuid.uuid4().hex
+        hasher = hashlib.sha256()
+        response = self.request(
+            'add',
+            retry=False,
+            data=_multipart_body(chunks, filename, boundary, hasher),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'}
         )
-        
-        if response.status_code == 200:
-            return response.json()["Hash"]
+        return response.json()['Hash'], hasher.hexdigest()
+
+    def cat(self, cid):
+        """Return the content of a CID as bytes"""
+        return self.request('cat', params={'arg': cid}).content
+
+    def cat_stream(self, cid):
+        """Return a streaming response for a CID; the caller must close it"""
+        return self.request('cat', params={'arg': cid}, stream=True)
+
+    def add_many(self, blobs):
+        """Upload blobs concurrently; returns CIDs in input order, None for any that failed"""
+        def add_one(data):
+            try:
+                return self.add(data)
+            except IPFSError as e:
+                logger.warning('Error uploading to IPFS: %s', e)
+                return None
+
+        blobs = list(blobs)
+        if not blobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(blobs))) as executor:
+            return list(executor.map(add_one, blobs))
+
+    def cat_many(self, cids):
+        """Fetch CIDs concurrently; returns {cid: bytes}, None for any that failed"""
+        def cat_one(cid):
+            try:
+                return self.cat(cid)
+            except IPFSError as e:
+                logger.warning('Error getting from IPFS: %s', e)
+                return None
+
+        cids = list(dict.fromkeys(cids))
+        if not cids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(cids))) as executor:
+            return dict(zip(cids, executor.map(cat_one, cids)))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncIPFSClient:
+    """
+    asyncio IPFS API client. One aiohttp session (and connection pool) per
+    instance, so create it inside the event loop that uses it:
+
+        async with AsyncIPFSClient() as ipfs:
+            cids = await ipfs.add_many(documents)
+    """
+
+    def __init__(self, pool_size=None, concurrency=None, timeout=None, retries=None):
+        self.pool_size = pool_size or settings.IPFS_POOL_SIZE
+        self.timeout = timeout or settings.IPFS_TIMEOUT
+        self.retries = retries if retries is not None else settings.IPFS_MAX_RETRIES
+        self._semaphore = asyncio.Semaphore(concurrency or settings.IPFS_UPLOAD_CONCURRENCY)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            auth = aiohttp.BasicAuth(*settings.IPFS_AUTH) if settings.IPFS_AUTH else None
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                auth=auth
+            )
+        return self._session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, endpoint, make_data=None, params=None):
+        """POST to an API endpoint and return the body; make_data builds a fresh body per attempt"""
+        async with self._semaphore:
+            with span(f'ipfs.{endpoint}'):
+                for attempt in range(self.retries + 1):
+                    last_attempt = attempt == self.retries
+                    try:
+                        async with self.session.post(
+                            api_url(endpoint), data=make_data() if make_data else None, params=params
+                        ) as response:
+                            if response.status == 200:
+                                return await response.read()
+                            if response.status not in RETRY_STATUSES or last_attempt:
+                                message = (await response.text())[:200]
+                                raise IPFSError(f"IPFS {endpoint} returned {response.status}: {message}")
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        if last_attempt:
+                            raise IPFSError(f"IPFS {endpoint} failed: {e}") from e
+                    await asyncio.sleep(backoff_delay(attempt))
+
+    async def add(self, data, filename='file'):
+        def make_data():
+            form = aiohttp.FormData()
+            form.add_field('file', _as_bytes(data), filename=filename, content_type='application/octet-stream')
+            return form
+
+        body = await self.request('add', make_data)
+        return json.loads(body)['Hash']
+
+    async def cat(self, cid):
+        return await self.request('cat', params={'arg': cid})
+
+    async def add_many(self, blobs):
+        """Upload blobs concurrently; returns CIDs in input order, None for any that failed"""
+        results = await asyncio.gather(*(self.add(data) for data in blobs), return_exceptions=True)
+        return [self._result_or_none(result, 'uploading to') for result in results]
+
+    async def cat_many(self, cids):
+        """Fetch CIDs concurrently; returns {cid: bytes}, None for any that failed"""
+        cids = list(dict.fromkeys(cids))
+        results = await asyncio.gather(*(self.cat(cid) for cid in cids), return_exceptions=True)
+        return {cid: self._result_or_none(result, 'getting from') for cid, result in zip(cids, results)}
+
+    @staticmethod
+    def _result_or_none(result, action):
+        if isinstance(result, IPFSError):
+            logger.warning('Error %s IPFS: %s', action, result)
+            return None
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ipfs_client():
+    """Return the process-wide IPFSClient"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = IPFSClient()
+    return _client
+
+
+def get_session():
+    """Return the shared keep-alive session used for every IPFS API call"""
+    return get_ipfs_client().session
+
+
+def upload_stream_to_ipfs(chunks, filename='file'):
+    """Stream chunks to IPFS; returns (cid, sha256_hex), or None if the upload failed"""
+    try:
+        return get_ipfs_client().add_stream(chunks, filename)
+    except Exception as e:
+        logger.warning('Error uploading to IPFS: %s', e)
         return None
+
+
+def upload_to_ipfs(file_content):
+    try:
+        return get_ipfs_client().add(file_content)
     except Exception as e:
-        print(f"Error uploading to IPFS: {str(e)}")
+        logger.warning('Error uploading to IPFS: %s', e)
         return None
 
 def get_from_ipfs(ipfs_hash):
     try:
-        response = requests.get(
-            f"http://{settings.IPFS_HOST}:{settings.IPFS_PORT}/api/v0/cat?arg={ipfs_hash}"
-        )
-        
-        if response.status_code == 200:
-            return response.content
-        return None
+        return get_ipfs_client().cat(ipfs_hash)
     except Exception as e:
-        print(f"Error getting from IPFS: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.warning('Error getting from IPFS: %s', e)
+        return None
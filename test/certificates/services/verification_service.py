@@ -0,0 +1,171 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from eth_abi import decode
+from web3 import Web3
+from django.conf import settings
+from .. import verification_cache
+from ..blockchain import get_async_client, get_client, on_client_loop, to_bytes32
+from ..models import Certificate
+from ..ratelimit import chain_admission
+
+# Return types of CertificateContract.verifyCertificate
+VERIFY_RESULT_TYPES = ['bool', 'address', 'address', 'uint256']
+NOT_VERIFIED = (False, None, None)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def verify_certificates(certificate_hashes, batch_size=None):
+    """
+    Verify many certificates on chain with batched JSON-RPC eth_call requests.
+    Hashes already in the verification cache are answered without a call.
+    Returns {certificate_hash: (is_valid, issuer, timestamp)}; hashes that are
+    malformed or unknown to the contract map to (False, None, None), and those
+    whose call failed for any other reason to None, which is not cached.
+    """
+    batch_size = batch_size or settings.WEB3_BATCH_SIZE
+    certificate_hashes = list(dict.fromkeys(certificate_hashes))
+    client = get_client()
+    results, fetched, calls = _plan_calls(certificate_hashes, client.contract)
+
+    # The provider is called directly, past the middleware that would take an admission slot
+    provider = client.web3.provider
+    for chunk in _chunks(calls, batch_size):
+        with chain_admission.slot():
+            responses = provider.make_batch_request([rpc_call for _, rpc_call, _ in chunk])
+        _collect(chunk, responses, fetched)
+
+    return _finish(certificate_hashes, results, fetched)
+
+
+async def averify_certificates(certificate_hashes, batch_size=None):
+    """Async verify_certificates; the batches are sent concurrently rather than one after another"""
+    batch_size = batch_size or settings.WEB3_BATCH_SIZE
+    certificate_hashes = list(dict.fromkeys(certificate_hashes))
+    client = await get_async_client()
+    results, fetched, calls = await sync_to_async(_plan_calls)(certificate_hashes, client.contract)
+
+    chunks = list(_chunks(calls, batch_size))
+    provider = client.w3.provider
+
+    async def send(chunk):
+        async with chain_admission.aslot():
+            return await provider.make_batch_request([rpc_call for _, rpc_call, _ in chunk])
+
+    responses = await asyncio.gather(*(on_client_loop(send(chunk)) for chunk in chunks))
+    for chunk, chunk_responses in zip(chunks, responses):
+        _collect(chunk, chunk_responses, fetched)
+
+    return await sync_to_async(_finish)(certificate_hashes, results, fetched)
+
+
+def _plan_calls(certificate_hashes, contract):
+    """
+    Answer what the cache and stored Merkle proofs can; return (results, fetched, calls)
+    where calls are the eth_call requests still needed, as (certificate_hash, rpc_call,
+    anchored), anchored being a batched certificate's result pending its revocation check
+    """
+    cached = verification_cache.get_many(certificate_hashes)
+    batched = _batched_certificates([h for h in certificate_hashes if h not in cached])
+
+    results = {}
+    calls = []
+    fetched = {}
+    for certificate_hash in certificate_hashes:
+        if certificate_hash in cached:
+            results[certificate_hash] = _summarize(cached[certificate_hash])
+            continue
+        anchored = None
+        if certificate_hash in batched:
+            # Merkle-batched certificates are checked locally against their cached root;
+            # only whether they were revoked takes a call
+            anchored = batched[certificate_hash]._verify_merkle_proof(revoked=False)
+            if not anchored:
+                fetched[certificate_hash] = False
+                continue
+            function = 'revokedBatchedCertificates'
+        else:
+            function = 'verifyCertificate'
+        try:
+            data = contract.encode_abi(function, [to_bytes32(certificate_hash)])
+        except Exception:
+            results[certificate_hash] = NOT_VERIFIED
+            continue
+        calls.append((certificate_hash, ('eth_call', [{'to': contract.address, 'data': data}, 'latest']), anchored))
+    return results, fetched, calls
+
+
+def _collect(chunk, responses, fetched):
+    if not isinstance(responses, list):
+        raise ConnectionError(f"Batch verification failed: {responses.get('error')}")
+
+    for (certificate_hash, _, anchored), response in zip(chunk, responses):
+        result = response.get('result')
+        if 'error' in response and not _is_revert(response['error']):
+            # A timeout or rate limit on the node says nothing about the certificate
+            fetched[certificate_hash] = None
+            continue
+        if anchored:
+            if 'error' in response or not result or result == '0x':
+                # The revokedBatchedCertificates getter doesn't revert; a contract without it can't tell
+                fetched[certificate_hash] = None
+                continue
+            (revoked,) = decode(['bool'], bytes.fromhex(result[2:]))
+            fetched[certificate_hash] = (not revoked, *anchored[1:])
+            continue
+        if 'error' in response or not result or result == '0x':
+            # verifyCertificate reverts for hashes that were never issued
+            fetched[certificate_hash] = False
+            continue
+        is_valid, issuer, student, timestamp = decode(VERIFY_RESULT_TYPES, bytes.fromhex(result[2:]))
+        fetched[certificate_hash] = (
+            is_valid, Web3.to_checksum_address(issuer), Web3.to_checksum_address(student), timestamp
+        )
+
+
+def _is_revert(error):
+    # Geth and anvil answer a revert with code 3, Ganache only says so in the message
+    return isinstance(error, dict) and (error.get('code') == 3 or 'revert' in str(error.get('message', '')).lower())
+
+
+def _finish(certificate_hashes, results, fetched):
+    verification_cache.set_many({
+        certificate_hash: verification for certificate_hash, verification in fetched.items() if verification is not None
+    })
+    for certificate_hash, verification in fetched.items():
+        results[certificate_hash] = None if verification is None else _summarize(verification)
+    return {certificate_hash: results[certificate_hash] for certificate_hash in certificate_hashes}
+
+
+def _batched_certificates(certificate_hashes):
+    """Return {certificate_hash: Certificate} for hashes that were issued in a Merkle batch"""
+    if not certificate_hashes:
+        return {}
+    by_key = {}
+    lookups = set()
+    for certificate_hash in certificate_hashes:
+        by_key.setdefault(verification_cache.cache_key(certificate_hash), []).append(certificate_hash)
+        # Rows may store the hash with or without the 0x prefix
+        bare = certificate_hash[2:] if certificate_hash.lower().startswith('0x') else certificate_hash
+        lookups.update((bare, '0x' + bare))
+    certificates = Certificate.objects.filter(
+        certificate_hash__in=lookups, merkle_root__isnull=False
+    ).only('certificate_hash', 'merkle_root', 'merkle_proof', 'is_revoked', 'wallet_address')
+
+    batched = {}
+    for certificate in certificates:
+        for certificate_hash in by_key.get(verification_cache.cache_key(certificate.certificate_hash), []):
+            batched[certificate_hash] = certificate
+    return batched
+
+
+def _summarize(verification):
+    """Reduce a cached verifyCertificate result to (is_valid, issuer, timestamp)"""
+    if not verification:
+        return NOT_VERIFIED
+    is_valid, issuer, _, timestamp = verification
+    return (is_valid, issuer, timestamp)
@@ -1,3 +1,1144 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import http_date
+from eth_abi.packed import encode_packed
+from eth_account import Account
+from eth_utils import keccak
+from pymongo.errors import BulkWriteError, OperationFailure, ServerSelectionTimeoutError
+from web3 import Web3
+
+from benchmarks.fake_chain import FakeChain, RPCError
+from benchmarks.fake_ipfs import FakeIPFS
+
+from . import blockchain, encoding, instrumentation, mongodb, outbox, ratelimit, routers, verification_cache
+from .batch_issuance import anchor_batch
+from .blockchain import BlockchainClient, get_async_client, get_client, on_client_loop, to_bytes32
+from .bulk_import import RosterImport
+from .indexer import CertificateEventIndexer
+from .management.commands.watch_certificate_events import CHECKPOINT_KEY
+from .merkle import MerkleTree, batch_cache_key, leaf_hash, verify_proof
+from .models import Certificate, CertificateEvent, EmailNotification, OutboxMessage, User
+from .notifications import queue_email, send_queued_notifications
+from .ratelimit import Admission, ChainBusy
+from .routers import ReplicaRouter, using_replica
+from .services.ipfs_cache import BlobCache
+from .services.ipfs_service import IPFSClient
+from .services.verification_service import NOT_VERIFIED, verify_certificates
+from .tx_submitter import TX_CANCELLED, TransactionSubmitter
+from .utils import certificate_ipfs_data
+
+
+# No replica routing: a TestCase transaction is invisible to the replica alias's separate connection
+@override_settings(CERTIFICATES_PAGE_SIZE=10, DATABASE_ROUTERS=[])
+class CertificateListQueryTests(TestCase):
+    """List views must cost the same number of queries however many certificates exist"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.university = User.objects.create_user('university', password='pw', role=User.UNIVERSITY)
+        cls.student = User.objects.create_user('student', password='pw', role=User.STUDENT)
+
+    def setUp(self):
+        self.client.force_login(self.university)
+
+    def create_certificates(self, count, status='ISSUED'):
+        start = Certificate.objects.count()
+        students = User.objects.bulk_create([
+            User(username=f'student-{start + i}', role=User.STUDENT) for i in range(count)
+        ])
+        Certificate.objects.bulk_create([
+            Certificate(
+                student=student, university=self.university, course_name='Course',
+                completion_date='2025-01-01', certificate_hash=f'0x{start + i:064x}', status=status
+            ) for i, student in enumerate(students)
+        ])
+
+    def count_queries(self, request, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = request(*args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return len(context)
+
+    def assert_constant_queries(self, request, *args, status='ISSUED', **kwargs):
+        self.create_certificates(3, status)
+        request(*args, **kwargs)  # warm up session and content type lookups
+        few = self.count_queries(request, *args, **kwargs)
+        self.create_certificates(40, status)
+        self.assertEqual(self.count_queries(request, *args, **kwargs), few)
+
+    def test_dashboard_queries_do_not_grow(self):
+        self.assert_constant_queries(self.client.get, reverse('certificates:dashboard'))
+
+    def test_pending_requests_queries_do_not_grow(self):
+        self.assert_constant_queries(self.client.get, reverse('certificates:dashboard'), status='PENDING')
+
+    def test_dashboard_links_keep_the_other_lists_cursor(self):
+        self.create_certificates(15)
+        self.create_certificates(15, status='PENDING')
+        url = reverse('certificates:dashboard')
+        requests_cursor = self.client.get(url).context['pending_requests'].next_cursor
+        response = self.client.get(url, {'requests_cursor': requests_cursor})
+        certificates_cursor = response.context['certificates'].next_cursor
+        self.assertContains(
+            response, escape('?' + urlencode({'requests_cursor': requests_cursor, 'cursor': certificates_cursor}))
+        )
+
+    def test_student_dashboard_queries_do_not_grow(self):
+        self.client.force_login(self.student)
+        self.create_certificates(3)
+        Certificate.objects.update(student=self.student)
+        few = self.count_queries(self.client.get, reverse('certificates:dashboard'))
+        self.create_certificates(40)
+        Certificate.objects.update(student=self.student)
+        self.assertEqual(self.count_queries(self.client.get, reverse('certificates:dashboard')), few)
+
+    def test_certificate_list_queries_do_not_grow(self):
+        self.assert_constant_queries(self.client.get, reverse('certificates:list'))
+
+    def test_issue_queries_do_not_grow(self):
+        # Hashes are derived from content, so every request issues a different course
+        courses = itertools.count()
+        self.assert_constant_queries(lambda: self.client.post(reverse('certificates:issue'), {
+            'student_name': 'student', 'course_name': f'Course {next(courses)}', 'issue_date': '2025-01-01'
+        }))
+
+    def test_issuing_the_same_certificate_twice_fails(self):
+        data = {'student_name': 'student', 'course_name': 'Course', 'issue_date': '2025-01-01'}
+        certificate_hash = self.client.post(reverse('certificates:issue'), data).json()['certificate']['certificate_hash']
+        self.assertEqual(certificate_hash, encoding.certificate_hash({
+            'university': 'university', 'student': 'student', 'student_identifier': '',
+            'course_name': 'Course', 'completion_date': '2025-01-01'
+        }))
+        self.assertEqual(self.client.post(reverse('certificates:issue'), data).status_code, 400)
+
+    def test_issue_returns_only_the_new_certificate(self):
+        self.create_certificates(3)
+        response = self.client.post(reverse('certificates:issue'), {
+            'student_name': 'student', 'course_name': 'Course', 'issue_date': '2025-01-01'
+        })
+        self.assertEqual(response.json()['certificate']['student_name'], 'student')
+        self.assertNotIn('certificates', response.json())
+
+    def test_certificate_list_pages_do_not_overlap(self):
+        self.create_certificates(25)
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(reverse('certificates:list'), {'cursor': cursor} if cursor else {},
+                                       HTTP_ACCEPT='application/json')
+            page = response.json()
+            self.assertLessEqual(len(page['certificates']), 10)
+            seen += [certificate['certificate_hash'] for certificate in page['certificates']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.create_certificates(5)
+        response = self.client.get(reverse('certificates:list'), {'cursor': 'not-a-cursor'},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.json()['certificates']), 5)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_stay_on_primary_without_replica(self):
+        with using_replica():
+            self.assertEqual(self.router.db_for_read(Certificate), 'default')
+
+    @mock.patch('certificates.routers.replica_configured', return_value=True)
+    def test_only_marked_reads_use_replica(self, replica_configured):
+        self.assertEqual(self.router.db_for_read(Certificate), 'default')
+        with using_replica():
+            self.assertEqual(self.router.db_for_read(Certificate), 'replica')
+            self.assertEqual(self.router.db_for_write(Certificate), 'default')
+        self.assertEqual(self.router.db_for_read(Certificate), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'certificates'))
+
+
+class CertificateEncodingTests(SimpleTestCase):
+    fields = {
+        'university': 'university', 'student': 'student', 'student_identifier': 'S1',
+        'course_name': 'Databases', 'completion_date': '2025-06-01'
+    }
+
+    def test_hash_is_stable(self):
+        # Anchored hashes must never change; a new layout needs a new SCHEMA_VERSION
+        self.assertEqual(
+            encoding.encode_certificate(self.fields),
+            b'CBC\x01\x00\x00\x00\n\x00\x00\x00\x07\x00\x00\x00\x02\x00\x00\x00\t\x00\x00\x00\n'
+            b'universitystudentS1Databases2025-06-01'
+        )
+        self.assertEqual(
+            encoding.certificate_hash(self.fields),
+            '0x2122d8380d8bc332e0335cddfecf140a79be7c2a7c56fe0f177cef23ba176190'
+        )
+
+    def test_equivalent_fields_hash_alike(self):
+        same = dict(self.fields, course_name=' Databases ', completion_date=date(2025, 6, 1))
+        self.assertEqual(encoding.hash_certificate(same), encoding.hash_certificate(self.fields))
+        self.assertEqual(
+            encoding.hash_certificate(dict(self.fields, course_name='Caf\u00e9')),
+            encoding.hash_certificate(dict(self.fields, course_name='Cafe\u0301'))
+        )
+        # Length prefixes keep field boundaries apart
+        self.assertNotEqual(
+            encoding.hash_certificate(dict(self.fields, student='stud', student_identifier='entS1')),
+            encoding.hash_certificate(self.fields)
+        )
+
+    @override_settings(ENCODING_PROCESSES=2)
+    def test_hash_many_matches_hash_certificate(self):
+        records = [dict(self.fields, student_identifier=f'S{i}') for i in range(100)]
+        expected = [encoding.hash_certificate(fields) for fields in records]
+        self.assertEqual(encoding.hash_many(records, parallel=False), expected)
+        try:
+            self.assertEqual(encoding.hash_many(records, parallel=True), expected)
+        finally:
+            encoding.shutdown_pool()
+        self.assertEqual(encoding.hash_many([]), [])
+
+
+def contract_verify_proof(certificate_hash, merkle_root, proof):
+    """CertificateContract._verifyProof, statement by statement"""
+    node = keccak(encode_packed(['bytes32'], [certificate_hash]))
+    for sibling in proof:
+        node = (
+            keccak(encode_packed(['bytes32', 'bytes32'], [node, sibling])) if node < sibling
+            else keccak(encode_packed(['bytes32', 'bytes32'], [sibling, node]))
+        )
+    return node == merkle_root
+
+
+class MerkleTreeTests(SimpleTestCase):
+    # Roots over leaves 1..n as bytes32, as the contract computes them
+    roots = {
+        1: '0xb10e2d527612073b26eecdfd717e6a320cf44b4afac2b0732d9fcbe2b7fa0cf6',
+        2: '0x2a171b5bcd1449348c3e09a5424946b5e6d6f5471221941d585131d673952ee4',
+        3: '0x4cdbcd942bd29b80bbd5eb9929ec8d0ea9c97d2690f9d2f8318390505ec1a769',
+        5: '0x9be4d908ee1467e12177bdda3d2712a12e7a2445350dccd4be9c218066530b19',
+    }
+
+    def hashes(self, count):
+        return ['0x%064x' % number for number in range(1, count + 1)]
+
+    def test_known_roots(self):
+        for count, root in self.roots.items():
+            self.assertEqual(Web3.to_hex(MerkleTree(self.hashes(count)).root), root)
+
+    def test_single_leaf(self):
+        tree = MerkleTree(self.hashes(1))
+        self.assertEqual(tree.root, leaf_hash(self.hashes(1)[0]))
+        self.assertEqual(tree.proof(0), [])
+        self.assertTrue(verify_proof(self.hashes(1)[0], [], tree.root))
+
+    def test_every_proof_matches_the_contract(self):
+        for count in range(1, 10):
+            hashes = self.hashes(count)
+            tree = MerkleTree(hashes)
+            for index, certificate_hash in enumerate(hashes):
+                proof = tree.proof(index)
+                self.assertTrue(verify_proof(certificate_hash, proof, tree.root), (count, index))
+                self.assertTrue(contract_verify_proof(to_bytes32(certificate_hash), tree.root, proof), (count, index))
+
+    def test_tampered_proofs_fail(self):
+        hashes = self.hashes(5)
+        tree = MerkleTree(hashes)
+        proof = tree.proof(1)
+        tampered = [bytes([proof[0][0] ^ 1]) + proof[0][1:]] + proof[1:]
+        for certificate_hash, candidate, root in [
+            (hashes[1], tampered, tree.root),
+            (hashes[1], proof[:-1], tree.root),
+            (hashes[1], proof + [proof[0]], tree.root),
+            (hashes[2], proof, tree.root),
+            (hashes[1], proof, MerkleTree(hashes[:4]).root),
+        ]:
+            self.assertFalse(verify_proof(certificate_hash, candidate, root))
+            self.assertFalse(contract_verify_proof(to_bytes32(certificate_hash), root, candidate))
+
+    def test_empty_batch(self):
+        with self.assertRaises(ValueError):
+            MerkleTree([])
+
+
+class CertificateVerificationAPITests(TestCase):
+    certificate_hash = '0x' + 'ab' * 32
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.certificate = Certificate.objects.create(
+            student=User.objects.create_user('student', role=User.STUDENT),
+            university=User.objects.create_user('university', role=User.UNIVERSITY),
+            course_name='Course', completion_date='2025-01-01',
+            certificate_hash=cls.certificate_hash, status='ISSUED', blockchain_tx='0x' + '01' * 32
+        )
+        cls.event = CertificateEvent.objects.create(
+            certificate_hash=cls.certificate_hash, event=CertificateEvent.ISSUED, block_number=10,
+            block_hash='0x' + '02' * 32, transaction_hash='0x' + '01' * 32, log_index=0,
+            issuer='0x' + '11' * 20, contract_address='0x' + '33' * 20, gas_used=50000, timestamp=1700000000
+        )
+
+    def setUp(self):
+        verification_cache.set(self.certificate_hash, (True, '0x' + '11' * 20, '0x' + '22' * 20, 1700000000))
+        self.url = reverse('certificates:certificate_verification', args=[self.certificate_hash])
+
+    def tearDown(self):
+        verification_cache.invalidate(self.certificate_hash)
+
+    def test_issued_certificate_is_cacheable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_valid'])
+        self.assertEqual(response['Last-Modified'], http_date(1700000000))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_conditional_request_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(1700000000))
+        self.assertEqual(response.status_code, 304)
+
+    def test_revocation_changes_validators_and_policy(self):
+        etag = self.client.get(self.url)['ETag']
+        CertificateEvent.objects.create(
+            certificate_hash=self.certificate_hash, event=CertificateEvent.REVOKED, block_number=20,
+            block_hash='0x' + '03' * 32, transaction_hash='0x' + '04' * 32, log_index=0,
+            contract_address='0x' + '33' * 20, gas_used=30000, timestamp=1700001000
+        )
+        Certificate.objects.filter(pk=self.certificate.pk).update(is_revoked=True, status='REVOKED')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['Last-Modified'], http_date(1700001000))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+
+    def test_unreachable_chain_is_not_cached(self):
+        verification_cache.invalidate(self.certificate_hash)
+        with mock.patch('certificates.models.get_contract', side_effect=ConnectionError('node is down')):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertNotIn('ETag', response)
+        self.assertIs(verification_cache.get(self.certificate_hash), verification_cache.MISSING)
+
+    def test_reads_go_to_the_replica(self):
+        marked = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            marked.append(routers._use_replica.get())
+            return db_for_read(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertTrue(marked)
+        self.assertTrue(all(marked))
+
+    def test_unknown_certificate(self):
+        response = self.client.get(reverse('certificates:certificate_verification', args=['0x' + 'cd' * 32]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_indexed_revocation_invalidates_both_tiers(self):
+        client = mock.Mock()
+        client.web3.eth.get_block.return_value = {'hash': b'\x03' * 32, 'timestamp': 1700001000}
+        client.web3.eth.get_transaction_receipt.return_value = {'from': '0x' + '11' * 20, 'gasUsed': 30000}
+        CertificateEventIndexer(client=client).store_events([{
+            'event': 'CertificateRevoked', 'args': {'certificateHash': bytes.fromhex('ab' * 32)},
+            'blockNumber': 20, 'blockHash': b'\x03' * 32, 'transactionHash': b'\x04' * 32,
+            'logIndex': 0, 'address': '0x' + '33' * 20,
+        }])
+
+        key = verification_cache.cache_key(self.certificate_hash)
+        self.assertIsNone(verification_cache.local_cache.get(key))
+        self.assertIs(verification_cache.get(self.certificate_hash), verification_cache.MISSING)
+        self.assertTrue(Certificate.objects.get(pk=self.certificate.pk).is_revoked)
+
+    def test_local_memory_backend_keeps_entries_briefly(self):
+        # Other workers' copies can't be invalidated, so they must expire about as soon as the LRU's
+        with mock.patch.object(verification_cache._shared_cache(), 'set') as shared_set:
+            verification_cache.set(self.certificate_hash, (True, None, None, 0))
+        self.assertEqual(shared_set.call_args.args[2], settings.VERIFICATION_CACHE_LOCAL_TTL)
+
+
+class BlobCacheTests(SimpleTestCase):
+    cid = 'Qm' + 'a' * 44
+    content = b'%PDF-1.7 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.blob_cache = BlobCache(directory.name, max_bytes=4096, scan_interval=3600)
+        patcher = mock.patch('certificates.views.get_blob_cache', return_value=self.blob_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_blob(self.cid, self.content)
+        self.url = reverse('certificates:get_file', args=[self.cid])
+
+    def cache_blob(self, cid, content):
+        response = mock.Mock()
+        response.iter_content.return_value = [content]
+        for _ in self.blob_cache._tee(cid, response):
+            pass
+
+    def test_full_and_conditional_responses(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", W/{response["ETag"]}')
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[4:10])
+        self.assertEqual(response['Content-Range'], f'bytes 4-9/{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-16')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-16:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+        # Multiple ranges, and ranges guarded by a stale If-Range, get the whole blob
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,4-5'}, {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"old"'}):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_eviction_runs_only_over_budget(self):
+        with mock.patch.object(self.blob_cache, 'evict', wraps=self.blob_cache.evict) as evict:
+            self.cache_blob('Qm' + 'b' * 44, b'x' * 1024)
+            evict.assert_not_called()
+            self.cache_blob('Qm' + 'c' * 44, b'x' * 2048)
+            evict.assert_called_once()
+        self.assertLessEqual(self.blob_cache._size, 4096)
+        self.assertIsNone(self.blob_cache.open(self.cid))
+
+
+class CertificateIndexerTests(TestCase):
+    certificate_hash = '0x' + 'ab' * 32
+
+    def setUp(self):
+        self.certificate = Certificate.objects.create(
+            student=User.objects.create_user('student', role=User.STUDENT),
+            university=User.objects.create_user('university', role=User.UNIVERSITY),
+            course_name='Course', completion_date='2025-01-01',
+            certificate_hash=self.certificate_hash, status='ISSUED', blockchain_tx='0x' + '01' * 32
+        )
+        self.block_hashes = {}
+        client = mock.Mock()
+        client.web3.eth.get_block.side_effect = lambda number: {
+            'hash': self.block_hashes.get(number, number.to_bytes(32, 'big')), 'timestamp': 1700000000 + number
+        }
+        client.web3.eth.get_transaction_receipt.return_value = {'from': '0x' + '11' * 20, 'gasUsed': 30000}
+        self.indexer = CertificateEventIndexer(client=client, reorg_depth=5)
+
+    def log(self, name, block_number, **args):
+        return {
+            'event': name, 'args': args, 'blockNumber': block_number,
+            'blockHash': block_number.to_bytes(32, 'big'), 'transactionHash': bytes([block_number]) * 32,
+            'logIndex': 0, 'address': '0x' + '33' * 20,
+        }
+
+    def revoke(self, block_number):
+        self.indexer.store_events([
+            self.log('CertificateRevoked', block_number, certificateHash=bytes.fromhex('ab' * 32))
+        ])
+
+    def test_revocation_is_queued_for_mongodb(self):
+        self.revoke(20)
+        self.certificate.refresh_from_db()
+        self.assertEqual((self.certificate.is_revoked, self.certificate.status), (True, 'REVOKED'))
+        self.assertEqual(
+            OutboxMessage.objects.filter(request_id=self.certificate_hash).latest('id').payload['status'], 'REVOKED'
+        )
+
+    def test_reorg_rolls_back_orphaned_revocation(self):
+        self.revoke(20)
+        checkpoint = self.indexer.get_checkpoint(21)
+        self.assertFalse(self.indexer.handle_reorg(checkpoint))
+
+        self.block_hashes[20] = b'\xff' * 32
+        self.assertTrue(self.indexer.handle_reorg(checkpoint))
+        self.assertEqual(checkpoint.block_number, 15)
+        self.assertFalse(CertificateEvent.objects.exists())
+        self.certificate.refresh_from_db()
+        self.assertEqual((self.certificate.is_revoked, self.certificate.status), (False, 'ISSUED'))
+        self.assertEqual(
+            OutboxMessage.objects.filter(request_id=self.certificate_hash).latest('id').payload['status'], 'ISSUED'
+        )
+
+    def test_reorg_keeps_revocation_before_the_fork(self):
+        self.revoke(10)
+        self.revoke(20)
+        checkpoint = self.indexer.get_checkpoint(21)
+        self.block_hashes[20] = b'\xff' * 32
+        self.assertTrue(self.indexer.handle_reorg(checkpoint))
+        self.certificate.refresh_from_db()
+        self.assertTrue(self.certificate.is_revoked)
+
+    def test_batch_anchor_is_indexed(self):
+        merkle_root = '0x' + 'cd' * 32
+        verification_cache.set(batch_cache_key(merkle_root), False)
+        self.indexer.store_events([
+            self.log('CertificateBatchIssued', 30, merkleRoot=bytes.fromhex('cd' * 32), issuer='0x' + '11' * 20, size=2)
+        ])
+        event = CertificateEvent.objects.get()
+        self.assertEqual((event.certificate_hash, event.event), (merkle_root, CertificateEvent.BATCH_ISSUED))
+        self.assertIs(verification_cache.get(batch_cache_key(merkle_root)), verification_cache.MISSING)
+
+
+class EventWatcherTests(SimpleTestCase):
+    certificate_hash = '0x' + 'ab' * 32
+    merkle_root = '0x' + 'cd' * 32
+
+    def setUp(self):
+        self.chain = FakeChain().start()
+        self.addCleanup(self.chain.stop)
+        overrides = override_settings(WEB3_PROVIDER=self.chain.url, CONTRACT_ADDRESS=self.chain.address)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        blockchain.reset_client()
+        self.addCleanup(blockchain.reset_client)
+        self.addCleanup(caches[settings.VERIFICATION_CACHE_ALIAS].delete, CHECKPOINT_KEY)
+        for key in (self.certificate_hash, batch_cache_key(self.merkle_root)):
+            self.addCleanup(verification_cache.invalidate, key)
+
+    def test_batch_anchor_does_not_stall_the_watcher(self):
+        self.chain.issue(to_bytes32(self.certificate_hash), self.chain.sender, '0x' + '22' * 20)
+        get_client().contract.functions.issueCertificateBatch(to_bytes32(self.merkle_root), 2).transact(
+            {'from': self.chain.sender}
+        )
+        self.chain.revoke(to_bytes32(self.certificate_hash))
+        verification_cache.set(self.certificate_hash, (True, self.chain.sender, '0x' + '22' * 20, 1700000000))
+        verification_cache.set(batch_cache_key(self.merkle_root), False)
+
+        stderr = io.StringIO()
+        call_command('watch_certificate_events', '--once', '--from-block', '1', stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(stderr.getvalue(), '')
+        self.assertIs(verification_cache.get(self.certificate_hash), verification_cache.MISSING)
+        self.assertIs(verification_cache.get(batch_cache_key(self.merkle_root)), verification_cache.MISSING)
+        self.assertEqual(caches[settings.VERIFICATION_CACHE_ALIAS].get(CHECKPOINT_KEY), self.chain.block_number)
+
+
+class OutboxRelayTests(TestCase):
+    def setUp(self):
+        student = User.objects.create_user('student', role=User.STUDENT)
+        university = User.objects.create_user('university', role=User.UNIVERSITY)
+        self.certificates = [
+            Certificate.objects.create(
+                student=student, university=university, course_name=f'Course {index}',
+                completion_date='2025-01-01', certificate_hash=f'{index:064x}'
+            ) for index in range(3)
+        ]
+
+    @mock.patch('certificates.outbox.MongoDBClient')
+    def test_only_failed_writes_are_retried(self, client):
+        client.return_value.bulk_upsert_documents.side_effect = BulkWriteError({
+            'writeErrors': [
+                {'index': 1, 'code': 11000, 'errmsg': 'E11000 duplicate key'},
+                {'index': 2, 'code': 121, 'errmsg': 'Document failed validation'},
+            ],
+            'upserted': [{'index': 0, '_id': 'mongo-0'}],
+        })
+        message_ids = list(OutboxMessage.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(outbox.relay_outbox(), 2)
+
+        documents = list(client.return_value.bulk_upsert_documents.call_args.args[0])
+        self.assertEqual([document['version'] for document in documents], message_ids)
+        failed = OutboxMessage.objects.get()
+        self.assertEqual((failed.request_id, failed.attempts), (self.certificates[2].certificate_hash, 1))
+        self.assertEqual(failed.last_error, 'Document failed validation')
+        self.assertEqual(
+            list(Certificate.objects.order_by('id').values_list('mongodb_id', flat=True)), ['mongo-0', None, None]
+        )
+
+
+class ChainVerificationTests(TestCase):
+    """Single, bulk and async verification against FakeChain through the shared clients"""
+    unknown_hash = '0x' + 'ff' * 32
+
+    def setUp(self):
+        self.chain = FakeChain().start()
+        self.addCleanup(self.chain.stop)
+        # No replica routing for the async views, as in CertificateListQueryTests
+        overrides = override_settings(
+            WEB3_PROVIDER=self.chain.url, CONTRACT_ADDRESS=self.chain.address, WEB3_BATCH_SIZE=2,
+            DATABASE_ROUTERS=[]
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        blockchain.reset_client()
+        self.addCleanup(blockchain.reset_client)
+
+        student = User.objects.create_user('student', role=User.STUDENT)
+        university = User.objects.create_user('university', role=User.UNIVERSITY)
+        self.issuer = Web3.to_checksum_address(self.chain.sender)
+        self.hashes = [f'0x{index + 1:064x}' for index in range(5)]
+        self.certificates = [
+            Certificate.objects.create(
+                student=student, university=university, course_name=f'Course {index}', status='APPROVED',
+                completion_date='2025-01-01', certificate_hash=certificate_hash
+            ) for index, certificate_hash in enumerate(self.hashes)
+        ]
+        # Three issued one by one, the last of them revoked, and two anchored in a Merkle batch
+        for certificate_hash in self.hashes[:3]:
+            self.chain.issue(to_bytes32(certificate_hash), self.issuer, '0x' + '22' * 20, timestamp=1700000000)
+        self.chain.revoke(to_bytes32(self.hashes[2]))
+        anchor_batch(self.certificates[3:], self.issuer)
+        self.certificates[3].refresh_from_db()
+
+        for key in self.hashes + [self.unknown_hash, batch_cache_key(self.certificates[3].merkle_root.lower())]:
+            self.addCleanup(verification_cache.invalidate, key)
+        self.expected = {
+            self.hashes[0]: (True, self.issuer, 1700000000),
+            self.hashes[1]: (True, self.issuer, 1700000000),
+            self.hashes[2]: (False, self.issuer, 1700000000),
+            self.hashes[3]: (True, self.issuer, mock.ANY),
+            self.hashes[4]: (True, self.issuer, mock.ANY),
+            self.unknown_hash: NOT_VERIFIED,
+            'not-a-hash': NOT_VERIFIED,
+        }
+
+    def test_bulk_verification_is_batched(self):
+        requests = self.chain.http_requests
+        self.assertEqual(verify_certificates(list(self.expected)), self.expected)
+        # Six eth_calls, two of them revocation checks of batched certificates, in batches of two,
+        # and one look-up of the Merkle root
+        self.assertEqual(self.chain.http_requests - requests, 4)
+
+        requests = self.chain.http_requests
+        self.assertEqual(verify_certificates(list(self.expected)), self.expected)
+        self.assertEqual(self.chain.http_requests, requests)
+
+    def test_batched_revocation_is_read_from_the_chain(self):
+        self.chain.revoke_batched(to_bytes32(self.hashes[3]))
+        self.assertEqual(verify_certificates(self.hashes[3:]), {
+            self.hashes[3]: (False, self.issuer, mock.ANY),
+            self.hashes[4]: (True, self.issuer, mock.ANY),
+        })
+        verification_cache.invalidate(self.hashes[3])
+        self.assertFalse(Certificate.objects.get(pk=self.certificates[3].pk).is_revoked)
+        self.assertFalse(self.certificates[3].verify_on_blockchain()[0])
+
+    def test_failed_calls_are_not_cached(self):
+        eth_call = self.chain.rpc_eth_call
+
+        def rate_limited(transaction, block='latest'):
+            if transaction['data'].endswith(self.hashes[1][2:]):
+                raise RPCError('rate limit exceeded')
+            return eth_call(transaction, block)
+
+        with mock.patch.object(self.chain, 'rpc_eth_call', rate_limited):
+            results = verify_certificates(self.hashes[:3])
+        self.assertEqual(results, {
+            self.hashes[0]: self.expected[self.hashes[0]],
+            self.hashes[1]: None,
+            self.hashes[2]: self.expected[self.hashes[2]],
+        })
+        self.assertIs(verification_cache.get(self.hashes[1]), verification_cache.MISSING)
+        self.assertEqual(verify_certificates(self.hashes[1:2]), {self.hashes[1]: self.expected[self.hashes[1]]})
+
+    def test_single_verifications_share_one_client(self):
+        client = get_client()
+        requests = self.chain.http_requests
+        results = [certificate.verify_on_blockchain() for certificate in self.certificates[:3]]
+        self.assertEqual([result[0] for result in results], [True, True, False])
+        # eth_chainId is answered from the provider's cache rather than asked before every call
+        self.assertEqual(self.chain.http_requests - requests, 3)
+        self.assertIs(get_client(), client)
+
+    def test_async_views(self):
+        verdicts = [
+            self.client.post(reverse('certificates:verify_certificate', args=[certificate_hash])).json()['is_valid']
+            for certificate_hash in self.hashes
+        ]
+        self.assertEqual(verdicts, [True, True, False, True, True])
+
+        response = self.client.post(
+            reverse('certificates:verify_bulk'), {'certificate_hashes': list(self.expected)},
+            content_type='application/json'
+        )
+        self.assertEqual({
+            result['certificate_hash']: (result['is_valid'], result['issuer'], result['timestamp'])
+            for result in response.json()['results']
+        }, self.expected)
+
+
+class TransactionSubmitterTests(TestCase):
+    # Fees are 2 * base fee + priority fee = 3 gwei, raised 15% per rebroadcast
+    initial_fee = 3 * 10 ** 9
+
+    def setUp(self):
+        self.chain = FakeChain().start()
+        self.addCleanup(self.chain.stop)
+        overrides = override_settings(
+            WEB3_PROVIDER=self.chain.url, CONTRACT_ADDRESS=self.chain.address,
+            TX_RESUBMIT_AFTER=0, TX_GAS_BUMP_PERCENT=15, TX_MAX_REBROADCASTS=5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.submitter = TransactionSubmitter(private_key=Account.create().key, client=BlockchainClient())
+        self.addCleanup(self.submitter.client.close)
+
+        student = User.objects.create_user('student', role=User.STUDENT)
+        university = User.objects.create_user('university', role=User.UNIVERSITY)
+        self.certificates = [
+            Certificate.objects.create(
+                student=student, university=university, course_name=f'Course {index}', status='APPROVED',
+                completion_date='2025-01-01', certificate_hash=f'0x{index + 1:064x}'
+            ) for index in range(3)
+        ]
+
+    def run_submitter(self, certificates, steps=20):
+        self.submitter.submit(certificates)
+        for _ in range(steps):
+            self.submitter.step()
+            if not self.submitter.pending():
+                break
+
+    def test_nonces_continue_from_the_node(self):
+        self.chain.nonces[self.submitter.account.address] = 7
+        self.run_submitter(self.certificates)
+        self.assertEqual(self.submitter.issued, 3)
+        self.assertEqual(self.chain.nonces[self.submitter.account.address], 10)
+        self.assertEqual(set(Certificate.objects.values_list('status', flat=True)), {'ISSUED'})
+        self.assertEqual(len(set(Certificate.objects.values_list('blockchain_tx', flat=True))), 3)
+
+    def test_underpriced_transaction_is_rebroadcast_with_a_higher_fee(self):
+        self.chain.min_fee = self.initial_fee * 11 // 10
+        self.run_submitter(self.certificates[:1])
+        self.assertEqual(self.submitter.issued, 1)
+        certificate = Certificate.objects.get(pk=self.certificates[0].pk)
+        receipt, _ = self.chain.receipts[certificate.blockchain_tx]
+        self.assertEqual(receipt['status'], '0x1')
+        self.assertEqual(len(self.chain.logs), 1)
+
+    def test_stuck_nonce_is_cancelled(self):
+        # Above what five 15% bumps reach, below the sixth
+        self.chain.min_fee = self.initial_fee * 22 // 10
+        cancelled = TX_CANCELLED.value()
+        self.run_submitter(self.certificates[:1])
+        self.assertEqual(self.submitter.failed, self.certificates[:1])
+        self.assertEqual(TX_CANCELLED.value(), cancelled + 1)
+        self.assertEqual(self.chain.logs, [])
+        self.assertEqual(Certificate.objects.get(pk=self.certificates[0].pk).status, 'APPROVED')
+
+        # The nonce was used up by the cancellation, so later issuances go through
+        self.chain.min_fee = 0
+        self.run_submitter(self.certificates[1:])
+        self.assertEqual(self.submitter.issued, 2)
+        self.assertEqual(self.chain.nonces[self.submitter.account.address], 3)
+
+
+class AsyncBlockchainClientTests(SimpleTestCase):
+    def setUp(self):
+        self.chain = FakeChain().start()
+        self.addCleanup(self.chain.stop)
+        overrides = override_settings(WEB3_PROVIDER=self.chain.url, CONTRACT_ADDRESS=self.chain.address)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        blockchain.reset_client()
+        self.addCleanup(blockchain.reset_client)
+
+    def test_one_client_across_event_loops(self):
+        async def chain_id():
+            client = await get_async_client()
+            return client, await on_client_loop(client.w3.eth.chain_id)
+
+        # Under WSGI every async view runs on a loop of its own, as here
+        first, first_chain_id = async_to_sync(chain_id)()
+        requests = self.chain.http_requests
+        second, second_chain_id = asyncio.run(chain_id())
+        self.assertIs(first, second)
+        self.assertFalse(first.session.closed)
+        self.assertEqual((first_chain_id, second_chain_id), (1337, 1337))
+        # The next request's loop finds the provider cache filled, and sends no warm-up of its own
+        self.assertEqual(self.chain.http_requests, requests)
+
+        blockchain.reset_client()
+        self.assertTrue(first.session.closed)
+
+
+class MongoDBIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mock.Mock(full_name='certblock.test_requests')
+        self.collection.create_index.side_effect = [OperationFailure('E11000 duplicate key'), None, None]
+        self.collection.index_information.return_value = {}
+        self.addCleanup(mongodb._index_failures.clear)
+        self.addCleanup(mongodb._indexed_collections.clear)
+
+    def test_failed_index_does_not_skip_the_rest(self):
+        self.assertEqual(list(mongodb.ensure_indexes(self.collection)), ['request_id_unique'])
+        self.assertEqual(self.collection.create_index.call_count, 3)
+        # Not marked as ensured: a forced run tries again
+        self.collection.create_index.side_effect = None
+        self.assertEqual(mongodb.ensure_indexes(self.collection, force=True), {})
+        self.assertEqual(self.collection.create_index.call_count, 6)
+
+    def test_command_fails_loudly(self):
+        with mock.patch('certificates.management.commands.ensure_mongodb_indexes.MongoDBClient') as client:
+            client.return_value.certificate_requests = self.collection
+            with self.assertRaisesMessage(CommandError, 'request_id_unique'):
+                call_command('ensure_mongodb_indexes', stdout=io.StringIO())
+
+
+class DocumentFingerprintTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = override_settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.certificate = Certificate.objects.create(
+            student=User.objects.create_user('student', role=User.STUDENT),
+            university=User.objects.create_user('university', role=User.UNIVERSITY),
+            course_name='Course', completion_date='2025-01-01',
+            certificate_file=ContentFile(b'first', name='first.pdf')
+        )
+
+    def test_fingerprint_follows_the_file(self):
+        self.assertEqual(self.certificate.document_sha256, hashlib.sha256(b'first').hexdigest())
+
+        certificate = Certificate.objects.get(pk=self.certificate.pk)
+        certificate.course_name = 'Renamed'
+        with mock.patch('certificates.models.document_fingerprint') as fingerprint:
+            certificate.save()
+        fingerprint.assert_not_called()
+
+        certificate.certificate_file = ContentFile(b'second', name='second.pdf')
+        certificate.save()
+        certificate = Certificate.objects.get(pk=self.certificate.pk)
+        self.assertEqual(certificate.document_sha256, hashlib.sha256(b'second').hexdigest())
+
+        certificate.certificate_file = None
+        certificate.save()
+        self.assertIsNone(Certificate.objects.get(pk=self.certificate.pk).document_sha256)
+
+
+class BulkReviewTests(TestCase):
+    def setUp(self):
+        self.university = User.objects.create_user('university', role=User.UNIVERSITY)
+        student = User.objects.create_user('student', email='student@example.com', role=User.STUDENT)
+        self.certificates = [
+            Certificate.objects.create(
+                student=student, university=self.university, course_name=f'Course {index}',
+                completion_date='2025-01-01', certificate_hash=f'{index:064x}'
+            ) for index in range(3)
+        ]
+
+    def review(self, action, ids):
+        self.client.force_login(self.university)
+        return self.client.post(
+            reverse('certificates:approve_requests_bulk'), {'action': action, 'ids': ids},
+            content_type='application/json'
+        )
+
+    @mock.patch('certificates.views.get_ipfs_client')
+    def test_failed_pin_stays_pending(self, get_ipfs_client):
+        get_ipfs_client.return_value.add_many.side_effect = lambda documents: ['cid-0', None, 'cid-2']
+        queued = OutboxMessage.objects.count()
+        response = self.review('approve', [certificate.id for certificate in self.certificates]).json()
+
+        self.assertEqual((response['processed'], response['failed']), (2, 1))
+        self.assertEqual([result['status'] for result in response['results']], ['success', 'error', 'success'])
+        self.assertEqual(
+            list(Certificate.objects.order_by('id').values_list('status', 'ipfs_hash')),
+            [('APPROVED', 'cid-0'), ('PENDING', None), ('APPROVED', 'cid-2')]
+        )
+        self.assertEqual(OutboxMessage.objects.count(), queued + 2)
+        self.assertEqual(EmailNotification.objects.filter(subject='Certificate Request Approved').count(), 2)
+
+    def test_approved_documents_are_pinned(self):
+        ipfs = FakeIPFS().start()
+        self.addCleanup(ipfs.stop)
+        client = IPFSClient(retries=0)
+        self.addCleanup(client.close)
+        with override_settings(IPFS_API_URL=ipfs.url), \
+                mock.patch('certificates.views.get_ipfs_client', return_value=client):
+            response = self.review('approve', [certificate.id for certificate in self.certificates]).json()
+
+        self.assertEqual((response['processed'], response['failed']), (3, 0))
+        self.assertEqual(ipfs.http_requests, 3)
+        for certificate in Certificate.objects.select_related('student', 'university'):
+            self.assertEqual(certificate.status, 'APPROVED')
+            self.assertEqual(json.loads(ipfs.blobs[certificate.ipfs_hash]), certificate_ipfs_data(certificate))
+
+    def test_decided_requests_are_skipped(self):
+        Certificate.objects.filter(pk=self.certificates[0].pk).update(status='REJECTED')
+        response = self.review('reject', [self.certificates[0].id, self.certificates[1].id, 0]).json()
+        self.assertEqual([result['status'] for result in response['results']], ['error', 'success', 'error'])
+        self.assertEqual(Certificate.objects.filter(status='REJECTED').count(), 2)
+
+
+class NotificationQueueTests(TestCase):
+    def notice(self, recipient, age=0):
+        notification = EmailNotification.objects.create(
+            kind=EmailNotification.PENDING_REQUEST, recipient=recipient, context={'course_name': 'Course'}
+        )
+        EmailNotification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+
+    def test_held_digests_do_not_block_messages(self):
+        for _ in range(3):
+            self.notice('admin@example.com')
+        queue_email('Certificate Issued', 'Issued', ['student@example.com'])
+        self.assertEqual(send_queued_notifications(batch_size=2, digest_window=300), 1)
+        self.assertEqual([email.to for email in mail.outbox], [['student@example.com']])
+
+    def test_due_digest_takes_later_notices_along(self):
+        self.notice('admin@example.com', age=600)
+        self.notice('admin@example.com')
+        self.assertEqual(send_queued_notifications(digest_window=300), 2)
+        self.assertEqual(mail.outbox[0].subject, '2 New Certificate Requests Pending Approval')
+
+
+class WorkerLoopTests(SimpleTestCase):
+    """Long-running commands log and back off on errors rather than exit"""
+
+    def run_worker(self, command, task, side_effect):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        module = f'certificates.management.commands.{command}'
+        with mock.patch(f'{module}.{task}', side_effect=side_effect), \
+                mock.patch(f'{module}.time.sleep', side_effect=[None, KeyboardInterrupt]) as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command(command, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue(), sleep
+
+    def test_send_notifications_survives_errors(self):
+        stdout, stderr, sleep = self.run_worker(
+            'send_notifications', 'send_queued_notifications', [ConnectionRefusedError('SMTP is down'), 3]
+        )
+        self.assertIn('SMTP is down', stderr)
+        self.assertIn('Handled 3 notifications', stdout)
+        self.assertEqual(sleep.call_args_list[0], mock.call(settings.NOTIFICATION_POLL_INTERVAL * 2))
+
+    def test_relay_outbox_survives_errors(self):
+        stdout, stderr, sleep = self.run_worker(
+            'relay_outbox', 'relay_outbox', [ServerSelectionTimeoutError('MongoDB is down'), 0]
+        )
+        self.assertIn('MongoDB is down', stderr)
+        self.assertEqual(sleep.call_args_list, [
+            mock.call(settings.OUTBOX_POLL_INTERVAL * 2), mock.call(settings.OUTBOX_POLL_INTERVAL)
+        ])
+
+
+# Pinning runs on its own thread and connection, which cannot see into a TestCase transaction
+@mock.patch('certificates.bulk_import.get_ipfs_client')
+class RosterImportTests(TransactionTestCase):
+    roster = (
+        'student,course_name,completion_date,student_identifier\n'
+        'alice,Databases,2025-06-01,S1\n'
+        'bob,Databases,2025-06-01,S2\n'
+        'alice,Databases,2025-06-01,S1\n'
+        'nobody,Databases,2025-06-01,S3\n'
+        'bob,Compilers,June 2025,S2\n'
+    )
+
+    def setUp(self):
+        self.university = User.objects.create_user('university', role=User.UNIVERSITY)
+        User.objects.create_user('alice', role=User.STUDENT)
+        User.objects.create_user('bob', role=User.STUDENT)
+
+    def upload(self, content, name='roster.csv'):
+        self.client.force_login(self.university)
+        return self.client.post(reverse('certificates:import_certificates'), {
+            'roster': SimpleUploadedFile(name, content.encode())
+        })
+
+    def test_import_reports_each_row(self, get_ipfs_client):
+        get_ipfs_client.return_value.add_many.side_effect = lambda documents: [f'cid-{i}' for i, _ in enumerate(documents)]
+        summary = self.upload(self.roster).json()
+        self.assertEqual((summary['rows'], summary['imported'], summary['duplicates'], summary['failed']), (5, 2, 1, 2))
+        self.assertEqual(sorted(error['line'] for error in summary['errors']), [5, 6])
+        self.assertEqual(set(Certificate.objects.values_list('status', flat=True)), {'APPROVED'})
+        self.assertEqual(set(Certificate.objects.values_list('ipfs_hash', flat=True)), {'cid-0', 'cid-1'})
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        # Certificate hashes come from the row contents, so importing again adds nothing
+        summary = self.upload(self.roster).json()
+        self.assertEqual((summary['imported'], summary['duplicates']), (0, 3))
+        self.assertEqual(Certificate.objects.count(), 2)
+
+    def test_jsonl_roster(self, get_ipfs_client):
+        get_ipfs_client.return_value.add_many.side_effect = lambda documents: [None for _ in documents]
+        summary = self.upload(
+            '{"student": "alice", "course_name": "Databases", "completion_date": "2025-06-01"}\nnot json\n',
+            name='roster.jsonl'
+        ).json()
+        self.assertEqual((summary['imported'], summary['failed']), (1, 1))
+        self.assertEqual((summary['pinned'], summary['pin_failed']), (0, 1))
+        self.assertIsNone(Certificate.objects.get().ipfs_hash)
+
+    def test_concurrent_import_of_the_same_rows(self, get_ipfs_client):
+        get_ipfs_client.return_value.add_many.side_effect = lambda documents: [f'cid-{i}' for i, _ in enumerate(documents)]
+        insert = RosterImport._insert
+
+        def racing_insert(importer, certificates):
+            if certificates and not Certificate.objects.exists():
+                # Another upload gets the first row in between the duplicate check and the insert
+                first = certificates[0]
+                Certificate.objects.create(
+                    student=first.student, university=first.university, course_name=first.course_name,
+                    completion_date=first.completion_date, certificate_hash=first.certificate_hash
+                )
+            insert(importer, certificates)
+
+        with mock.patch.object(RosterImport, '_insert', racing_insert):
+            response = self.upload(self.roster)
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary['imported'], summary['duplicates']), (1, 2))
+        self.assertEqual(Certificate.objects.count(), 2)
+
+    def test_missing_columns(self, get_ipfs_client):
+        response = self.upload('student,course\nalice,Databases\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('completion_date', response.json()['message'])
+
+
+@override_settings(INTERNAL_IPS=['127.0.0.1'])
+class InstrumentationTests(SimpleTestCase):
+    def test_span_counts_calls_and_errors(self):
+        calls = instrumentation.SPAN_SECONDS.count('test.call')
+        with instrumentation.span('test.call'):
+            pass
+        with self.assertRaises(KeyError), instrumentation.span('test.call'):
+            raise KeyError
+        self.assertEqual(instrumentation.SPAN_SECONDS.count('test.call'), calls + 2)
+        self.assertEqual(instrumentation.SPAN_ERRORS.value('test.call', 'KeyError'), 1)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get(reverse('certificates:metrics'), HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        body = self.client.get(reverse('certificates:metrics')).content.decode()
+        self.assertIn('# TYPE certblock_http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'certblock_http_request_duration_seconds_bucket{view="certificates:metrics",method="GET",status="200",le="+Inf"}',
+            body
+        )
+
+    def test_untrusted_request_ids_are_replaced(self):
+        response = self.client.get(reverse('certificates:metrics'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        url = reverse('certificates:metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='192.0.2.1').status_code, 401)
+        response = self.client.get(url, REMOTE_ADDR='192.0.2.1', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics_are_closed_by_default(self):
+        self.assertEqual(self.client.get(reverse('certificates:metrics'), REMOTE_ADDR='192.0.2.1').status_code, 403)
+
+
+# INTERNAL_IPS lets the limited client reach /metrics, which serves as an unlimited view
+@override_settings(
+    RATE_LIMIT_RATE=0.5, RATE_LIMIT_BURST=2, RATE_LIMIT_API_KEYS={'partner-key': (0.5, 4)}, INTERNAL_IPS=['192.0.2.1']
+)
+class RateLimitTests(TestCase):
+    url = reverse('certificates:certificate_verification', args=['0x' + 'ef' * 32])
+
+    def get(self, address, **headers):
+        return self.client.get(self.url, REMOTE_ADDR=address, **headers)
+
+    def test_token_bucket_per_client(self):
+        self.assertEqual([self.get('192.0.2.1').status_code for _ in range(2)], [404, 404])
+        response = self.get('192.0.2.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        # Other clients and unlimited views are unaffected
+        self.assertEqual(self.get('192.0.2.2').status_code, 404)
+        self.assertEqual(self.client.get(reverse('certificates:metrics'), REMOTE_ADDR='192.0.2.1').status_code, 200)
+
+        statuses = [self.get('192.0.2.1', HTTP_X_API_KEY='partner-key').status_code for _ in range(5)]
+        self.assertEqual(statuses, [404] * 4 + [429])
+        # Unknown keys share their IP's bucket
+        self.assertEqual(self.get('192.0.2.1', HTTP_X_API_KEY='guess').status_code, 429)
+
+    def test_local_buckets_when_cache_is_down(self):
+        cache = mock.Mock(**{'get.side_effect': ConnectionError('cache down')})
+        with mock.patch.object(ratelimit, '_shared_cache', return_value=cache), \
+                self.assertLogs('certificates.ratelimit', 'WARNING'):
+            statuses = [self.get('192.0.2.3').status_code for _ in range(3)]
+        self.assertEqual(statuses, [404, 404, 429])
+
+    def test_chain_busy_is_503(self):
+        Certificate.objects.create(
+            student=User.objects.create_user('student', role=User.STUDENT),
+            university=User.objects.create_user('university', role=User.UNIVERSITY),
+            course_name='Course', completion_date='2025-01-01', certificate_hash='0x' + 'ef' * 32, status='ISSUED'
+        )
+        with mock.patch.object(Certificate, 'verify_on_blockchain', side_effect=ChainBusy(3)):
+            response = self.get('192.0.2.4')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_admission_queue(self):
+        admission = Admission(limit=1, queue_size=0, timeout=5, retry_after=1)
+        # Requests web3 nests inside one of ours reuse its slot
+        with admission.slot(), admission.slot():
+            self.assertEqual(admission.in_flight, 1)
+
+        admission = Admission(limit=1, queue_size=1, timeout=5, retry_after=1)
+        admission.acquire()
+        waiter = threading.Thread(target=admission.acquire)
+        waiter.start()
+        while not admission.waiting:
+            pass
+        # The queue is full
+        with self.assertRaises(ChainBusy):
+            admission.acquire()
+        # A released slot goes to the waiter
+        admission.release()
+        waiter.join()
+        self.assertEqual(admission.stats(), {'limit': 1, 'in_flight': 1, 'waiting': 0, 'rejected': 1})
+
+        async def wait_briefly():
+            admission.timeout = 0.01
+            await admission.aacquire()
+
+        with self.assertRaises(ChainBusy):
+            asyncio.run(wait_briefly())
+        admission.release()
+        self.assertEqual(admission.stats(), {'limit': 1, 'in_flight': 0, 'waiting': 0, 'rejected': 2})
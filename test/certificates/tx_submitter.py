@@ -0,0 +1,325 @@
+"""
+Server-side signer that issues certificates on chain without a wallet round trip.
+
+Certificates are queued in process. A single worker thread signs
+issueCertificate transactions locally, handing out nonces itself instead of
+asking the node for every transaction, and keeps up to TX_MAX_IN_FLIGHT of them
+unconfirmed at once. Sends and receipt polls go out as JSON-RPC batches.
+Transactions that are not mined within TX_RESUBMIT_AFTER seconds (dropped from
+the mempool, or priced too low) are re-signed with the same nonce and a higher
+fee. After TX_MAX_REBROADCASTS the nonce is handed to a 0-value transfer to
+ourselves instead, rebroadcast until mined, so that it can't hold up every
+later nonce; its certificate fails unless the original issuance lands first.
+Mined certificates are written back to the database in bulk.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from eth_account import Account
+from web3 import Web3
+
+from . import verification_cache
+from .blockchain import get_client, to_bytes32
+from .instrumentation import Counter
+from .models import Certificate
+from .outbox import enqueue_certificates
+from .ratelimit import chain_admission
+
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = '0x' + '00' * 20
+TRANSFER_GAS = 21000
+
+TX_CANCELLED = Counter(
+    'certblock_tx_cancelled_total', 'Issuance transactions replaced by a self-transfer after TX_MAX_REBROADCASTS'
+)
+
+
+@dataclass
+class PendingTransaction:
+    certificate: Certificate
+    data: str
+    nonce: int
+    max_fee: int = 0
+    priority_fee: int = 0
+    # Every hash broadcast for this nonce; any of them may be the one that gets mined
+    tx_hashes: list = field(default_factory=list)
+    # The subset of tx_hashes that are cancellations
+    cancel_hashes: list = field(default_factory=list)
+    sent_at: float = 0.0
+    rebroadcasts: int = 0
+    cancelled: bool = False
+
+
+class NonceManager:
+    """Hands out consecutive nonces for one account, asking the node only when (re)synchronizing"""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next = None
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+
+
+class TransactionSubmitter:
+    def __init__(self, private_key=None, client=None, max_in_flight=None):
+        private_key = private_key or settings.ISSUER_PRIVATE_KEY
+        if not private_key:
+            raise ValueError('ISSUER_PRIVATE_KEY is not configured')
+        self.account = Account.from_key(private_key)
+        self.client = client or get_client()
+        self.max_in_flight = max_in_flight or settings.TX_MAX_IN_FLIGHT
+        self.nonces = NonceManager(self.client.web3, self.account.address)
+        self.issued = 0
+        self.failed = []
+
+        self._queue = queue.Queue()
+        self._outstanding = 0
+        self._outstanding_lock = threading.Lock()
+        self._in_flight = {}
+        self._mined = []
+        self._chain_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, certificates):
+        """Queue certificates for issuance; safe to call from any thread"""
+        for certificate in certificates:
+            with self._outstanding_lock:
+                self._outstanding += 1
+            self._queue.put(certificate)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='tx-submitter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def pending(self):
+        return self._outstanding > 0
+
+    def _done(self, count):
+        with self._outstanding_lock:
+            self._outstanding -= count
+
+    def _fail(self, certificate):
+        self.failed.append(certificate)
+        self._done(1)
+
+    def drain(self, timeout=None):
+        """Block until every queued certificate is mined or has failed; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.exception('Transaction submitter error: %s', e)
+            if self._queue.empty() or len(self._in_flight) >= self.max_in_flight:
+                self._stop.wait(settings.TX_POLL_INTERVAL)
+
+    def step(self):
+        """One pass of the pipeline: send, track receipts, rebroadcast stragglers, write back"""
+        self._send_queued()
+        self._track_receipts()
+        self._rebroadcast_stale()
+        self._flush()
+
+    @property
+    def w3(self):
+        return self.client.web3
+
+    def _current_fees(self):
+        base_fee = self.w3.eth.get_block('latest').get('baseFeePerGas', 0)
+        priority_fee = self.w3.eth.max_priority_fee
+        return 2 * base_fee + priority_fee, priority_fee
+
+    def _encode(self, certificate):
+        return self.client.contract.encode_abi('issueCertificate', [
+            to_bytes32(certificate.certificate_hash),
+            Web3.to_checksum_address(certificate.wallet_address or ZERO_ADDRESS)
+        ])
+
+    def _sign(self, pending):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        tx = {
+            'type': 2,
+            'chainId': self._chain_id,
+            'to': self.client.contract.address,
+            'data': pending.data,
+            'nonce': pending.nonce,
+            'gas': settings.TX_GAS_LIMIT,
+            'maxFeePerGas': pending.max_fee,
+            'maxPriorityFeePerGas': pending.priority_fee,
+        }
+        if pending.cancelled:
+            tx.update({'to': self.account.address, 'data': '0x', 'value': 0, 'gas': TRANSFER_GAS})
+        return self.account.sign_transaction(tx)
+
+    def _batch_request(self, requests):
+        # The provider is called directly, past the middleware that would take an admission slot
+        with chain_admission.slot():
+            return self.w3.provider.make_batch_request(requests)
+
+    def _broadcast(self, transactions):
+        """Sign and send transactions in one batch request"""
+        signed = [self._sign(pending) for pending in transactions]
+        responses = self._batch_request([
+            ('eth_sendRawTransaction', [Web3.to_hex(tx.raw_transaction)]) for tx in signed
+        ])
+        if not isinstance(responses, list):
+            raise ConnectionError(f"Batch send failed: {responses.get('error')}")
+
+        now = time.monotonic()
+        for pending, tx, response in zip(transactions, signed, responses):
+            tx_hash = Web3.to_hex(tx.hash)
+            error = (response.get('error') or {}).get('message', '')
+            if not error or 'already known' in error:
+                if tx_hash not in pending.tx_hashes:
+                    pending.tx_hashes.append(tx_hash)
+                    if pending.cancelled:
+                        pending.cancel_hashes.append(tx_hash)
+                pending.sent_at = now
+            elif 'nonce too low' in error:
+                if pending.tx_hashes:
+                    continue  # an earlier broadcast was mined; its receipt will turn up
+                if pending.cancelled:
+                    # Nothing of ours holds the nonce any more, so there is nothing left to cancel
+                    del self._in_flight[pending.nonce]
+                    self.nonces.reset()
+                    self._fail(pending.certificate)
+                    continue
+                # Something else used this nonce; resynchronize and queue the certificate again
+                del self._in_flight[pending.nonce]
+                self.nonces.reset()
+                self._queue.put(pending.certificate)
+            else:
+                # Leave it in flight with an old sent_at so it is retried with a bump
+                logger.warning('Error sending transaction for %s: %s', pending.certificate.certificate_hash, error)
+
+    def _send_queued(self):
+        room = self.max_in_flight - len(self._in_flight)
+        if room <= 0 or self._queue.empty():
+            return
+        max_fee, priority_fee = self._current_fees()
+        batch = []
+        while len(batch) < room:
+            try:
+                certificate = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                data = self._encode(certificate)
+            except (ValueError, TypeError) as e:
+                # Malformed hash or wallet address: fail it before it takes a nonce
+                logger.warning('Cannot issue %s: %s', certificate.certificate_hash, e)
+                self._fail(certificate)
+                continue
+            pending = PendingTransaction(certificate, data, self.nonces.next(), max_fee, priority_fee)
+            self._in_flight[pending.nonce] = pending
+            batch.append(pending)
+        if batch:
+            self._broadcast(batch)
+
+    def _track_receipts(self):
+        polls = [(pending, tx_hash) for pending in self._in_flight.values() for tx_hash in pending.tx_hashes]
+        for start in range(0, len(polls), settings.WEB3_BATCH_SIZE):
+            chunk = polls[start:start + settings.WEB3_BATCH_SIZE]
+            responses = self._batch_request([
+                ('eth_getTransactionReceipt', [tx_hash]) for _, tx_hash in chunk
+            ])
+            if not isinstance(responses, list):
+                raise ConnectionError(f"Batch receipt poll failed: {responses.get('error')}")
+            for (pending, tx_hash), response in zip(chunk, responses):
+                receipt = response.get('result')
+                if not receipt or pending.nonce not in self._in_flight:
+                    continue
+                del self._in_flight[pending.nonce]
+                if tx_hash in pending.cancel_hashes:
+                    logger.error(
+                        'Issuance of %s was cancelled at nonce %s by %s',
+                        pending.certificate.certificate_hash, pending.nonce, tx_hash
+                    )
+                    self._fail(pending.certificate)
+                elif int(receipt['status'], 16) == 1:
+                    pending.certificate.blockchain_tx = tx_hash
+                    pending.certificate.status = 'ISSUED'
+                    self._mined.append(pending.certificate)
+                else:
+                    logger.warning('Issuance of %s reverted in %s', pending.certificate.certificate_hash, tx_hash)
+                    self._fail(pending.certificate)
+
+    def _rebroadcast_stale(self):
+        now = time.monotonic()
+        stale = [
+            pending for pending in self._in_flight.values()
+            if now - pending.sent_at >= settings.TX_RESUBMIT_AFTER
+        ]
+        if not stale:
+            return
+        max_fee, priority_fee = self._current_fees()
+        bump = 100 + settings.TX_GAS_BUMP_PERCENT
+        retry = []
+        for pending in stale:
+            if pending.rebroadcasts >= settings.TX_MAX_REBROADCASTS and not pending.cancelled:
+                # Every later nonce waits on this one; free it with a transfer that is cheap to get mined
+                logger.error(
+                    'Issuance of %s not mined after %s rebroadcasts; cancelling nonce %s',
+                    pending.certificate.certificate_hash, pending.rebroadcasts, pending.nonce
+                )
+                TX_CANCELLED.inc()
+                pending.cancelled = True
+            elif pending.cancelled:
+                logger.error('Cancellation of nonce %s still not mined; rebroadcasting', pending.nonce)
+            pending.rebroadcasts += 1
+            pending.max_fee = max(pending.max_fee * bump // 100, max_fee)
+            pending.priority_fee = max(pending.priority_fee * bump // 100, priority_fee)
+            retry.append(pending)
+        if retry:
+            self._broadcast(retry)
+
+    def _flush(self):
+        if not self._mined:
+            return
+        mined, self._mined = self._mined, []
+        try:
+            with transaction.atomic():
+                Certificate.objects.bulk_update(mined, ['blockchain_tx', 'status'], batch_size=500)
+                enqueue_certificates(mined)
+        except Exception:
+            self._mined = mined + self._mined  # keep them for the next pass
+            raise
+        for certificate in mined:
+            verification_cache.invalidate(certificate.certificate_hash)
+        self.issued += len(mined)
+        self._done(len(mined))
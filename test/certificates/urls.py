@@ -1,8 +1,6 @@
 from django.urls import path
 from . import views
 from .views import upload_file, get_file
-from web3 import Web3
-from django.http import JsonResponse
 
 app_name = 'certificates'
 
@@ -18,54 +16,14 @@ urlpatterns = [
     path("upload/", upload_file, name="upload"),
     path("file/<str:cid>/", get_file, name="get_file"),
     path('list/', views.certificate_list, name='list'),
+    path('requests/<int:certificate_id>/review/', views.approve_request, name='approve_request'),
+    path('requests/bulk-review/', views.approve_requests_bulk, name='approve_requests_bulk'),
+    path('import/', views.import_certificates, name='import_certificates'),
+    path('status/mongodb/', views.mongodb_pool_stats, name='mongodb_pool_stats'),
+    path('metrics', views.metrics, name='metrics'),
+    path('verify/bulk/', views.verify_certificates_bulk, name='verify_bulk'),
+    path('verify/document/', views.verify_by_document, name='verify_by_document'),
     path('verify/<str:certificate_hash>/', views.verify_certificate, name='verify_certificate'),
-] 
-
-def verify_certificate(request, certificate_hash=None):
-    if request.method == 'GET':
-        return render(request, 'verify_certificate.html')
-        
-    if request.method == 'POST':
-        try:
-            # Get certificate from database
-            certificate = Certificate.objects.get(certificate_hash=certificate_hash)
-            
-            # Verify document hash if file uploaded
-            is_valid_hash = True
-            if 'document' in request.FILES:
-                is_valid_hash = certificate.verify_document_hash(request.FILES['document'])
-            
-            # Verify on blockchain
-            w3 = Web3(Web3.HTTPProvider('http://127.0.0.1:7545'))
-            contract = w3.eth.contract(
-                address=settings.CONTRACT_ADDRESS,
-                abi=settings.CONTRACT_ABI
-            )
-            blockchain_result = contract.functions.verifyCertificate(
-                Web3.toBytes(hexstr=certificate_hash)
-            ).call()
-            
-            return JsonResponse({
-                'status': 'success',
-                'is_valid': is_valid_hash and blockchain_result[0],
-                'hash_valid': is_valid_hash,
-                'blockchain_valid': blockchain_result[0],
-                'certificate_data': {
-                    'student_name': certificate.student.username,
-                    'course_name': certificate.course_name,
-                    'issue_date': certificate.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
-                    'issuer': certificate.university.username,
-                    'blockchain_tx': certificate.blockchain_tx
-                }
-            })
-            
-        except Certificate.DoesNotExist:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Certificate not found'
-            }, status=404)
-        except Exception as e:
-            return JsonResponse({
-                'status': 'error',
-                'message': str(e)
-            }, status=400)
\ No newline at end of file
+    path('api/v1/certificates/<str:certificate_hash>/verification', views.certificate_verification,
+         name='certificate_verification'),
+]
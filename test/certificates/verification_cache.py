@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = 'verification:'
+MISSING = object()
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU with a per-entry TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(settings.VERIFICATION_CACHE_LOCAL_SIZE, settings.VERIFICATION_CACHE_LOCAL_TTL)
+
+
+def _shared_cache():
+    return caches[settings.VERIFICATION_CACHE_ALIAS]
+
+
+def _shared_ttl(cache):
+    # A local memory backend is per process like the LRU, so invalidate() only reaches this
+    # worker's copy; keep it no longer than the local tier so other workers catch up on revokes
+    if isinstance(cache, LocMemCache):
+        return min(settings.VERIFICATION_CACHE_TTL, settings.VERIFICATION_CACHE_LOCAL_TTL)
+    return settings.VERIFICATION_CACHE_TTL
+
+
+def cache_key(certificate_hash):
+    """Normalize 0x-prefixed, bare and mixed-case hex hashes to one key"""
+    if isinstance(certificate_hash, bytes):
+        certificate_hash = certificate_hash.hex()
+    certificate_hash = certificate_hash.lower()
+    if certificate_hash.startswith('0x'):
+        certificate_hash = certificate_hash[2:]
+    return KEY_PREFIX + certificate_hash
+
+
+def get(certificate_hash):
+    """Return the cached chain result for a hash, or MISSING"""
+    key = cache_key(certificate_hash)
+    value = local_cache.get(key, MISSING)
+    if value is MISSING:
+        value = _shared_cache().get(key, MISSING)
+        if value is not MISSING:
+            local_cache.set(key, value)
+    return value
+
+
+def get_many(certificate_hashes):
+    """Return {certificate_hash: result} for every hash found in either tier"""
+    found = {}
+    misses = {}
+    for certificate_hash in certificate_hashes:
+        key = cache_key(certificate_hash)
+        value = local_cache.get(key, MISSING)
+        if value is MISSING:
+            misses[key] = certificate_hash
+        else:
+            found[certificate_hash] = value
+
+    if misses:
+        for key, value in _shared_cache().get_many(list(misses)).items():
+            local_cache.set(key, value)
+            found[misses[key]] = value
+    return found
+
+
+def set(certificate_hash, result):
+    key = cache_key(certificate_hash)
+    local_cache.set(key, result)
+    cache = _shared_cache()
+    cache.set(key, result, _shared_ttl(cache))
+
+
+def set_many(results):
+    values = {cache_key(certificate_hash): result for certificate_hash, result in results.items()}
+    for key, result in values.items():
+        local_cache.set(key, result)
+    cache = _shared_cache()
+    cache.set_many(values, _shared_ttl(cache))
+
+
+def invalidate(certificate_hash):
+    key = cache_key(certificate_hash)
+    local_cache.delete(key)
+    _shared_cache().delete(key)
+
+
+def get_or_fetch(certificate_hash, fetch):
+    """Read-through lookup: serve from cache, otherwise call fetch() and cache its result"""
+    result = get(certificate_hash)
+    if result is MISSING:
+        result = fetch()
+        set(certificate_hash, result)
+    return result
+
+
+async def aget(certificate_hash):
+    key = cache_key(certificate_hash)
+    value = local_cache.get(key, MISSING)
+    if value is MISSING:
+        value = await _shared_cache().aget(key, MISSING)
+        if value is not MISSING:
+            local_cache.set(key, value)
+    return value
+
+
+async def aset(certificate_hash, result):
+    key = cache_key(certificate_hash)
+    local_cache.set(key, result)
+    cache = _shared_cache()
+    await cache.aset(key, result, _shared_ttl(cache))
+
+
+async def aget_or_fetch(certificate_hash, fetch):
+    """get_or_fetch for async callers; fetch is a coroutine function"""
+    result = await aget(certificate_hash)
+    if result is MISSING:
+        result = await fetch()
+        await aset(certificate_hash, result)
+    return result
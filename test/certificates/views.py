@@ -2,22 +2,50 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import User, Certificate
+from .models import User, Certificate, CertificateEvent, document_fingerprint
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.utils.crypto import get_random_string
-from .utils import generate_certificate_hash, upload_to_ipfs, verify_student_details, notify_university_admin
+from .utils import certificate_ipfs_data, verify_student_details, notify_university_admin
 import json
 from django.http import JsonResponse
 from django.utils import timezone
-from django.core.mail import send_mail
+from .notifications import queue_email, queue_emails
+from .outbox import enqueue_certificates
+from django.db import IntegrityError, transaction
+import time
 from django.conf import settings
 import uuid
-from .mongodb import MongoDBClient
+from .mongodb import get_pool_stats
+from django.contrib.admin.views.decorators import staff_member_required
 
 # 
 from django.http import JsonResponse
-from rest_framework.decorators import api_view
-from .services.ipfs_service import upload_to_ipfs, get_from_ipfs
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+import hashlib
+from .services.ipfs_service import get_ipfs_client, upload_to_ipfs, upload_stream_to_ipfs
+from .services.ipfs_cache import get_blob_cache, is_valid_cid, read_range, sniff_content_type
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+import asyncio
+import itertools
+import os
+import re
+from django.urls import reverse
+from .services.verification_service import averify_certificates
+from .pagination import paginate
+from . import encoding, instrumentation
+from .instrumentation import span
+import hmac
+import logging
+from .bulk_import import RosterError, RosterImport, detect_format, open_upload, read_records
+from .routers import read_replica
+from .ratelimit import ChainBusy, chain_busy_response, client_ip, retry_after_response
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 def upload_file(request):
@@ -25,20 +53,102 @@ def upload_file(request):
     if not file:
         return JsonResponse({"error": "No file provided"}, status=400)
 
-    file_path = f"temp/{file.name}"
-    with open(file_path, "wb+") as destination:
-        for chunk in file.chunks():
-            destination.write(chunk)
-
-    ipfs_hash = upload_to_ipfs(file_path)
-    if ipfs_hash:
-        return JsonResponse({"ipfs_hash": ipfs_hash, "url": get_from_ipfs(ipfs_hash)})
+    # Stream straight from the upload into IPFS, hashing in the same pass
+    result = upload_stream_to_ipfs(file.chunks(), file.name)
+    if result:
+        ipfs_hash, sha256 = result
+        return JsonResponse({
+            "ipfs_hash": ipfs_hash,
+            "sha256": sha256,
+            "url": reverse('certificates:get_file', args=[ipfs_hash])
+        })
     else:
         return JsonResponse({"error": "Failed to upload"}, status=500)
 
-@api_view(['GET'])
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _single_range(range_header):
+    """The (start, end) strings of a single byte range; multiple or malformed ranges give None"""
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    return match.groups()
+
+def _parse_range(range_header, size):
+    """Return (start, end) for a single satisfiable byte range, or None"""
+    groups = _single_range(range_header)
+    if groups is None:
+        return None
+    start, end = groups
+    if start == '':
+        # Suffix range: the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def _immutable_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.IPFS_CACHE_MAX_AGE}, immutable'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+@require_http_methods(['GET', 'HEAD'])
 def get_file(request, cid):
-    return JsonResponse({"url": get_from_ipfs(cid)})
+    if not is_valid_cid(cid):
+        return JsonResponse({"error": "Invalid CID"}, status=400)
+
+    # CIDs are content hashes, so the CID itself is a strong validator
+    etag = f'"{cid}"'
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return _immutable_headers(HttpResponseNotModified(), etag)
+
+    range_header = request.headers.get('Range')
+    # RFC 9110 lets a server ignore a Range it won't serve, e.g. multiple ranges, and send the whole blob
+    if range_header and (request.headers.get('If-Range', etag) != etag or _single_range(range_header) is None):
+        range_header = None
+
+    blob_cache = get_blob_cache()
+    blob = blob_cache.open(cid)
+    try:
+        if blob is None and range_header:
+            blob = blob_cache.fetch(cid)
+        elif blob is None:
+            # Miss: stream from the daemon while filling the cache
+            stream = iter(blob_cache.stream_from_ipfs(cid))
+            head = next(stream, b'')
+            response = StreamingHttpResponse(
+                itertools.chain([head], stream), content_type=sniff_content_type(head)
+            )
+            return _immutable_headers(response, etag)
+    except FileNotFoundError:
+        return JsonResponse({"error": "File not found on IPFS"}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": f"Error getting from IPFS: {e}"}, status=502)
+
+    size = os.fstat(blob.fileno()).st_size
+    content_type = sniff_content_type(blob.read(8))
+    blob.seek(0)
+
+    if range_header:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            blob.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return _immutable_headers(response, etag)
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(blob, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return _immutable_headers(response, etag)
+
+    return _immutable_headers(FileResponse(blob, content_type=content_type), etag)
 # 
 
 def home(request):
@@ -95,9 +205,257 @@ def logout_view(request):
     logout(request)
     return redirect('certificates:home')
 
-def verify_certificate(request):
+async def verification_response(certificate, document=None):
+    """
+    JSON verification result for a certificate. The document hash, the chain
+    check and the transaction lookup don't depend on each other, so they run
+    concurrently.
+    """
+    is_valid_hash, blockchain_result, blockchain_data = await asyncio.gather(
+        # Hashing reads the whole upload; keep it off the event loop
+        sync_to_async(certificate.verify_document_hash, thread_sensitive=False)(document) if document else _true(),
+        certificate.averify_on_blockchain(),
+        certificate.aget_transaction_details()
+    )
+    blockchain_valid = bool(blockchain_result and blockchain_result[0])
+
+    return JsonResponse({
+        'status': 'success',
+        'is_valid': is_valid_hash and blockchain_valid,
+        'hash_valid': is_valid_hash,
+        'blockchain_valid': blockchain_valid,
+        'certificate_hash': certificate.certificate_hash,
+        'certificate_data': {
+            'student_name': certificate.student.username,
+            'course_name': certificate.course_name,
+            'issue_date': certificate.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
+            'issuer': certificate.university.username,
+            'blockchain_tx': certificate.blockchain_tx
+        },
+        'blockchain_data': blockchain_data
+    })
+
+async def _true():
+    return True
+
+@read_replica
+async def verify_certificate(request, certificate_hash=None):
     # Allow access to everyone, even unauthenticated users
-    return render(request, 'verify_certificate.html')
+    if request.method != 'POST' or certificate_hash is None:
+        return await sync_to_async(render)(request, 'verify_certificate.html')
+
+    try:
+        certificate = await Certificate.objects.select_related('student', 'university').aget(
+            certificate_hash=certificate_hash
+        )
+
+        # The document hash is checked only if a file was uploaded
+        return await verification_response(certificate, request.FILES.get('document'))
+
+    except Certificate.DoesNotExist:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Certificate not found'
+        }, status=404)
+    except ChainBusy as e:
+        return chain_busy_response(e)
+    except Exception as e:
+        logger.exception('Verification of %s failed', certificate_hash)
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=400)
+
+@csrf_exempt
+@require_POST
+@read_replica
+async def verify_by_document(request):
+    # Resolve an uploaded document to its certificate through the fingerprint index
+    document = request.FILES.get('document')
+    if not document:
+        return JsonResponse({'status': 'error', 'message': 'No document provided'}, status=400)
+
+    with span('document.fingerprint'):
+        fingerprint = await sync_to_async(document_fingerprint, thread_sensitive=False)(document)
+    certificate = await Certificate.objects.select_related('student', 'university').filter(
+        document_sha256=fingerprint
+    ).order_by('-issue_date').afirst()
+    if certificate is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'No certificate matches this document'
+        }, status=404)
+
+    try:
+        return await verification_response(certificate)
+    except ChainBusy as e:
+        return chain_busy_response(e)
+    except Exception as e:
+        logger.exception('Verification of %s failed', certificate.certificate_hash)
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+@csrf_exempt
+@require_POST
+@read_replica
+async def verify_certificates_bulk(request):
+    try:
+        certificate_hashes = json.loads(request.body).get('certificate_hashes')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Request body must be a JSON object'}, status=400)
+    if not isinstance(certificate_hashes, list) or not certificate_hashes:
+        return JsonResponse({'status': 'error', 'message': 'certificate_hashes must be a non-empty list'}, status=400)
+    if len(certificate_hashes) > settings.BULK_VERIFY_MAX_HASHES:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {settings.BULK_VERIFY_MAX_HASHES} certificates can be verified per request'
+        }, status=400)
+
+    try:
+        results = await averify_certificates([str(certificate_hash) for certificate_hash in certificate_hashes])
+    except ChainBusy as e:
+        return chain_busy_response(e)
+    except Exception as e:
+        logger.exception('Bulk verification of %d certificates failed', len(certificate_hashes))
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=502)
+
+    return JsonResponse({
+        'status': 'success',
+        'results': [
+            _bulk_verification_result(certificate_hash, result) for certificate_hash, result in results.items()
+        ]
+    })
+
+def _bulk_verification_result(certificate_hash, result):
+    if result is None:
+        # The node failed this call; unknown rather than invalid, so the client can retry it
+        return {
+            'certificate_hash': certificate_hash,
+            'is_valid': None,
+            'issuer': None,
+            'timestamp': None,
+            'error': 'Could not reach the blockchain, try again shortly'
+        }
+    is_valid, issuer, timestamp = result
+    return {
+        'certificate_hash': certificate_hash,
+        'is_valid': is_valid,
+        'issuer': issuer,
+        'timestamp': timestamp
+    }
+
+def _hash_variants(certificate_hash):
+    """The spellings a certificate hash may be stored under: with or without 0x, as given or lowercase"""
+    bare = certificate_hash[2:] if certificate_hash.lower().startswith('0x') else certificate_hash
+    return {bare, '0x' + bare, bare.lower(), '0x' + bare.lower()}
+
+def _verification_cache_control(certificate, event):
+    if certificate.is_revoked or certificate.status == 'REVOKED':
+        # Revocation is final
+        return f'public, max-age={settings.VERIFICATION_API_REVOKED_MAX_AGE}'
+    if event is None and not certificate.merkle_root:
+        # Not issued on chain yet, or not indexed yet; batched certificates have no per-certificate event
+        return f'public, max-age={settings.VERIFICATION_API_PENDING_MAX_AGE}'
+    return f'public, max-age={settings.VERIFICATION_API_ISSUED_MAX_AGE}'
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@read_replica
+def certificate_verification(request, certificate_hash):
+    """
+    Public, cacheable verification status. ETag and Last-Modified come from the
+    certificate row and its latest indexed chain event, so a conditional request
+    is answered with 304 from two indexed queries without touching the chain.
+    """
+    variants = _hash_variants(certificate_hash)
+    certificate = Certificate.objects.select_related('student', 'university').filter(
+        certificate_hash__in=variants
+    ).first()
+    if certificate is None:
+        response = JsonResponse({'status': 'error', 'message': 'Certificate not found'}, status=404)
+        response['Cache-Control'] = f'public, max-age={settings.VERIFICATION_API_PENDING_MAX_AGE}'
+        return response
+
+    # A batched certificate's issuance is its root's CertificateBatchIssued event
+    event = CertificateEvent.objects.filter(certificate_hash__in=[
+        '0x' + certificate.certificate_hash.lower().removeprefix('0x'),
+        certificate.merkle_root and certificate.merkle_root.lower(),
+    ]).order_by('-block_number', '-log_index').first()
+
+    etag = '"%s"' % hashlib.sha256('|'.join(str(part) for part in (
+        certificate.certificate_hash, certificate.status, certificate.is_revoked, certificate.merkle_root,
+        event and event.block_hash, event and event.log_index, event and event.event
+    )).encode()).hexdigest()[:32]
+    last_modified = event.timestamp if event else None
+    cache_control = _verification_cache_control(certificate, event)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            blockchain_result = certificate.verify_on_blockchain()
+        except ChainBusy as e:
+            response = chain_busy_response(e)
+            response['Cache-Control'] = 'no-store'
+            return response
+        if blockchain_result is None:
+            # The chain couldn't be asked; an is_valid: false here must not be cached under this ETag
+            response = retry_after_response(
+                'Could not reach the blockchain, try again shortly', 503, settings.RPC_BUSY_RETRY_AFTER
+            )
+            response['Cache-Control'] = 'no-store'
+            return response
+        is_valid, issuer, _, timestamp = blockchain_result or (False, None, None, None)
+        response = JsonResponse({
+            'certificate_hash': certificate.certificate_hash,
+            'status': certificate.status,
+            'is_valid': bool(is_valid),
+            'is_revoked': certificate.is_revoked,
+            'certificate_data': {
+                'student_name': certificate.student.username,
+                'course_name': certificate.course_name,
+                'issue_date': certificate.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
+                'issuer': certificate.university.username,
+                'blockchain_tx': certificate.blockchain_tx
+            },
+            'blockchain_data': {
+                'issuer': issuer,
+                'timestamp': timestamp,
+                'merkle_root': certificate.merkle_root,
+                'indexed_event': event.as_transaction_details() if event else None
+            }
+        })
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+# Columns the certificate lists render; keeps list queries off the file/QR/Mongo columns
+CERTIFICATE_LIST_FIELDS = (
+    'id', 'certificate_hash', 'course_name', 'issue_date', 'status', 'is_revoked',
+    'student__username', 'university__username',
+)
+PENDING_REQUEST_FIELDS = (
+    'id', 'course_name', 'issue_date', 'student_identifier', 'completion_date',
+    'student__first_name', 'student__last_name', 'student__username',
+)
+
+def certificate_list_item(certificate):
+    return {
+        'student_name': certificate.student.username,
+        'course_name': certificate.course_name,
+        'issue_date': certificate.issue_date.strftime("%Y-%m-%d %H:%M:%S"),
+        'status': certificate.get_status_display(),
+        'certificate_hash': certificate.certificate_hash
+    }
+
+def page_from_request(request, queryset, param='cursor'):
+    """Keyset page of queryset for the cursor in the query string; a bad cursor means the first page"""
+    cursor = request.GET.get(param)
+    try:
+        return paginate(queryset, cursor)
+    except ValueError:
+        return paginate(queryset)
 
 @login_required
 def issue_certificate(request):
@@ -110,56 +468,79 @@ def issue_certificate(request):
         course_name = request.POST.get('course_name')
         issue_date = request.POST.get('issue_date')
         certificate_file = request.FILES.get('certificate_file')
-
-        certificate_hash = get_random_string(64)
+        transaction_hash = request.POST.get('transaction_hash')
+        completion_date = issue_date or timezone.now().date()
 
         try:
             student = User.objects.get(username=student_name)
+            # A hash already anchored from the browser wins; otherwise the canonical content hash
+            certificate_hash = request.POST.get('certificate_hash') or encoding.certificate_hash({
+                'university': request.user.username,
+                'student': student.username,
+                'student_identifier': '',
+                'course_name': course_name,
+                'completion_date': completion_date,
+            })
             certificate = Certificate.objects.create(
                 student=student,
                 university=request.user,
                 course_name=course_name,
-                issue_date=issue_date,
+                completion_date=completion_date,
                 certificate_file=certificate_file,
-                certificate_hash=certificate_hash
+                certificate_hash=certificate_hash,
+                blockchain_tx=transaction_hash,
+                status='ISSUED' if transaction_hash else 'APPROVED'
             )
             messages.success(request, 'Certificate issued successfully!')
-            return redirect('certificates:dashboard')
+            # Only the new certificate; the dashboard pages through the rest
+            return JsonResponse({
+                'status': 'success',
+                'id': certificate.id,
+                'redirect_url': reverse('certificates:dashboard'),
+                'certificate': certificate_list_item(certificate)
+            })
         except User.DoesNotExist:
-            messages.error(request, 'Student not found.')
-            return redirect('certificates:issue')
+            return JsonResponse({'status': 'error', 'message': 'Student not found'}, status=400)
+        except IntegrityError:
+            return JsonResponse({'status': 'error', 'message': 'This certificate has already been issued'}, status=400)
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     return render(request, 'issue_certificate.html')
 
 @login_required
+@read_replica
 def dashboard(request):
-    if request.user.role == 'university':
-        pending_requests = Certificate.objects.filter(
-            university=request.user,
-            status='PENDING'
-        ).select_related('student').order_by('-request_timestamp')
-        
-        return render(request, 'dashboard/university.html', {
-            'pending_requests': pending_requests
-        })
-    
     template_map = {
         'student': 'dashboard/student.html',
         'university': 'dashboard/university.html',
         'employer': 'dashboard/employer.html'
     }
     template_name = template_map.get(request.user.role, 'dashboard/student.html')
-    
+
+    if request.user.role in ['university', 'employer']:
+        certificates = Certificate.objects.filter(university=request.user).exclude(status='PENDING')
+    else:
+        certificates = Certificate.objects.filter(student=request.user)
+    certificates = certificates.select_related('student', 'university').only(*CERTIFICATE_LIST_FIELDS)
+
     context = {
         'user': request.user,
-        'certificates': [],  # Add your certificates queryset here
+        'certificates': page_from_request(request, certificates),
         'can_issue': request.user.role in ['university', 'employer'],
         'role_display': request.user.get_role_display()
     }
-    
+    if request.user.role == 'university':
+        pending_requests = Certificate.objects.filter(
+            university=request.user,
+            status='PENDING'
+        ).select_related('student').only(*PENDING_REQUEST_FIELDS)
+        context['pending_requests'] = page_from_request(request, pending_requests, 'requests_cursor')
+
     return render(request, template_name, context)
 
 @login_required
+@read_replica
 def view_certificate(request, hash):
     try:
         certificate = Certificate.objects.get(certificate_hash=hash)
@@ -231,20 +612,14 @@ def request_certificate(request):
                 verification_status='PENDING'
             )
             
-            # Store in MongoDB
-            mongo_client = MongoDBClient()
-            mongo_client.store_certificate_request(certificate)
-            
             # Notify university admin
             notify_university_admin(certificate)
             
             # Send confirmation email to student
-            send_mail(
+            queue_email(
                 'Certificate Request Submitted',
                 f'Your certificate request (ID: {request_id}) has been submitted and is pending approval.',
-                settings.DEFAULT_FROM_EMAIL,
                 [request.user.email],
-                fail_silently=False,
             )
             
             messages.success(request, f'Certificate request submitted successfully! Request ID: {request_id}')
@@ -265,17 +640,8 @@ def approve_certificate(request, certificate_id):
     try:
         certificate = Certificate.objects.get(id=certificate_id)
         
-        # Generate certificate file and hash
-        certificate_data = {
-            'student_name': certificate.student.username,
-            'student_id': certificate.student_id,
-            'course_name': certificate.course_name,
-            'completion_date': str(certificate.completion_date),
-            'university': certificate.university.username
-        }
-        
         # Upload to IPFS
-        ipfs_hash = upload_to_ipfs(json.dumps(certificate_data))
+        ipfs_hash = upload_to_ipfs(json.dumps(certificate_ipfs_data(certificate)))
         
         # Update certificate
         certificate.status = 'APPROVED'
@@ -324,12 +690,10 @@ def approve_request(request, certificate_id):
                 certificate.save()
                 
                 # Notify student
-                send_mail(
+                queue_email(
                     'Certificate Request Approved',
                     'Your certificate request has been approved and will be issued shortly.',
-                    settings.DEFAULT_FROM_EMAIL,
                     [certificate.student.email],
-                    fail_silently=False,
                 )
                 
                 messages.success(request, 'Certificate request approved successfully')
@@ -340,12 +704,10 @@ def approve_request(request, certificate_id):
                 certificate.save()
                 
                 # Notify student with rejection reason
-                send_mail(
+                queue_email(
                     'Certificate Request Rejected',
                     f'Your certificate request has been rejected.\nReason: {reason}',
-                    settings.DEFAULT_FROM_EMAIL,
                     [certificate.student.email],
-                    fail_silently=False,
                 )
                 
                 messages.success(request, 'Certificate request rejected')
@@ -356,8 +718,168 @@ def approve_request(request, certificate_id):
         messages.error(request, 'Certificate request not found')
         return redirect('certificates:dashboard')
 
+@login_required
+def approve_requests_bulk(request):
+    if request.user.role != 'university':
+        return JsonResponse({'status': 'error', 'message': 'Only universities can approve/reject certificates'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=400)
+
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body)
+        certificate_ids = [int(certificate_id) for certificate_id in data.get('ids', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'ids must be a list of certificate IDs'}, status=400)
+    action = data.get('action')
+    if action not in ('approve', 'reject') or not certificate_ids:
+        return JsonResponse({'status': 'error', 'message': 'action must be approve or reject and ids must not be empty'}, status=400)
+    if len(certificate_ids) > settings.BULK_APPROVE_MAX_IDS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {settings.BULK_APPROVE_MAX_IDS} requests can be processed at once'
+        }, status=400)
+
+    # Ownership check and fetch in one query
+    certificates = Certificate.objects.filter(
+        id__in=certificate_ids,
+        university=request.user
+    ).select_related('student', 'university')
+    found = {certificate.id: certificate for certificate in certificates}
+
+    results = {}
+    to_update = []
+    for certificate_id in dict.fromkeys(certificate_ids):
+        certificate = found.get(certificate_id)
+        if certificate is None:
+            results[certificate_id] = {'id': certificate_id, 'status': 'error', 'message': 'Certificate request not found'}
+        elif certificate.status != 'PENDING':
+            results[certificate_id] = {
+                'id': certificate_id, 'status': 'error',
+                'message': f'Request is {certificate.get_status_display()}, not pending'
+            }
+        else:
+            to_update.append(certificate)
+
+    if action == 'approve':
+        # Pin before taking any row locks; IPFS uploads can take seconds
+        ipfs_hashes = get_ipfs_client().add_many(
+            json.dumps(certificate_ipfs_data(certificate)) for certificate in to_update
+        )
+        pinned = []
+        for certificate, ipfs_hash in zip(to_update, ipfs_hashes):
+            if ipfs_hash is None:
+                results[certificate.id] = {
+                    'id': certificate.id, 'status': 'error', 'message': 'Could not store the certificate on IPFS'
+                }
+            else:
+                certificate.ipfs_hash = ipfs_hash
+                pinned.append(certificate)
+        to_update = pinned
+        new_status = 'APPROVED'
+        subject = 'Certificate Request Approved'
+        body = 'Your certificate request has been approved and will be issued shortly.'
+    else:
+        new_status = 'REJECTED'
+        subject = 'Certificate Request Rejected'
+        body = f"Your certificate request has been rejected.\nReason: {data.get('rejection_reason', '')}"
+
+    with transaction.atomic():
+        # Another request may have decided some of these while we were pinning
+        still_pending = set(Certificate.objects.select_for_update().filter(
+            id__in=[certificate.id for certificate in to_update], status='PENDING'
+        ).values_list('id', flat=True))
+        for certificate in to_update:
+            if certificate.id not in still_pending:
+                results[certificate.id] = {'id': certificate.id, 'status': 'error', 'message': 'Request is no longer pending'}
+        to_update = [certificate for certificate in to_update if certificate.id in still_pending]
+        for certificate in to_update:
+            certificate.status = new_status
+
+        Certificate.objects.bulk_update(to_update, ['status', 'ipfs_hash'], batch_size=500)
+        enqueue_certificates(to_update)
+        queue_emails([(subject, body, certificate.student.email) for certificate in to_update])
+
+    for certificate in to_update:
+        results[certificate.id] = {
+            'id': certificate.id,
+            'status': 'success',
+            'certificate_status': certificate.status,
+            'ipfs_hash': certificate.ipfs_hash
+        }
+
+    elapsed = time.perf_counter() - started
+    return JsonResponse({
+        'status': 'success',
+        'processed': len(to_update),
+        'failed': len(results) - len(to_update),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(results) / elapsed, 1) if elapsed else None,
+        'results': [results[certificate_id] for certificate_id in dict.fromkeys(certificate_ids)]
+    })
+
+@login_required
+def import_certificates(request):
+    if request.user.role != 'university':
+        return JsonResponse({'status': 'error', 'message': 'Only universities can import certificates'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=400)
+    roster = request.FILES.get('roster')
+    if roster is None:
+        return JsonResponse({'status': 'error', 'message': 'Upload the roster as the roster file field'}, status=400)
+
+    fmt = request.POST.get('format') or detect_format(roster.name)
+    if fmt not in ('csv', 'jsonl'):
+        return JsonResponse({'status': 'error', 'message': 'format must be csv or jsonl'}, status=400)
+    # Large uploads are already spooled to disk; records are decoded and imported a chunk at a time
+    importer = RosterImport(request.user)
+    try:
+        stats = importer.run(read_records(open_upload(roster), fmt))
+    except (RosterError, UnicodeDecodeError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e), **importer.stats.as_dict()}, status=400)
+    except IntegrityError:
+        # Rows already imported stay imported; re-uploading skips them as duplicates
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Another import of the same certificates is in progress; retry once it has finished',
+            **importer.stats.as_dict()
+        }, status=409)
+    return JsonResponse({'status': 'success', **stats.as_dict()})
+
+@login_required
+@read_replica
 def certificate_list(request):
-    certificates = Certificate.objects.filter(issuer=request.user)
+    if request.user.role in ['university', 'employer']:
+        certificates = Certificate.objects.filter(university=request.user)
+    elif request.user.role == 'student':
+        certificates = Certificate.objects.filter(student=request.user)
+    else:
+        certificates = Certificate.objects.none()
+    certificates = certificates.select_related('student', 'university').only(*CERTIFICATE_LIST_FIELDS)
+
+    page = page_from_request(request, certificates)
+    if request.headers.get('Accept', '').startswith('application/json'):
+        return JsonResponse({
+            'certificates': [certificate_list_item(certificate) for certificate in page],
+            'next_cursor': page.next_cursor
+        })
     return render(request, 'certificate_list.html', {
-        'certificates': certificates
+        'certificates': page
     })
+
+@staff_member_required
+def mongodb_pool_stats(request):
+    return JsonResponse(get_pool_stats())
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, for scrapers that send METRICS_TOKEN as a bearer
+    token or, without one, that connect from INTERNAL_IPS; closed to everyone else
+    """
+    if client_ip(request) not in settings.INTERNAL_IPS:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if not settings.METRICS_TOKEN:
+            return HttpResponse(status=403)
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(instrumentation.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
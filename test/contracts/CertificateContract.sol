@@ -10,7 +10,15 @@ contract CertificateContract {
         uint256 timestamp;
     }
     
+    struct Batch {
+        address issuer;
+        uint256 size;
+        uint256 timestamp;
+    }
+    
     mapping(bytes32 => Certificate) public certificates;
+    mapping(bytes32 => Batch) public batches;
+    mapping(bytes32 => bool) public revokedBatchedCertificates;
     
     event CertificateIssued(
         bytes32 indexed certificateHash,
@@ -20,6 +28,12 @@ contract CertificateContract {
     
     event CertificateRevoked(bytes32 indexed certificateHash);
     
+    event CertificateBatchIssued(
+        bytes32 indexed merkleRoot,
+        address indexed issuer,
+        uint256 size
+    );
+    
     function issueCertificate(bytes32 _certificateHash, address _student) public {
         require(certificates[_certificateHash].timestamp == 0, "Certificate already exists");
         
@@ -53,4 +67,60 @@ contract CertificateContract {
         certificates[_certificateHash].isRevoked = true;
         emit CertificateRevoked(_certificateHash);
     }
+    
+    // Anchor a Merkle root over a batch of certificate hashes in one storage write.
+    // Leaves are keccak256(certificateHash); pairs are hashed in sorted order.
+    function issueCertificateBatch(bytes32 _merkleRoot, uint256 _size) public {
+        require(batches[_merkleRoot].timestamp == 0, "Batch already exists");
+        
+        batches[_merkleRoot] = Batch({
+            issuer: msg.sender,
+            size: _size,
+            timestamp: block.timestamp
+        });
+        
+        emit CertificateBatchIssued(_merkleRoot, msg.sender, _size);
+    }
+    
+    function verifyBatchedCertificate(
+        bytes32 _certificateHash,
+        bytes32 _merkleRoot,
+        bytes32[] calldata _proof
+    ) public view returns (bool, address, uint256) {
+        Batch memory batch = batches[_merkleRoot];
+        require(batch.timestamp != 0, "Batch does not exist");
+        require(_verifyProof(_certificateHash, _merkleRoot, _proof), "Invalid proof");
+        
+        return (
+            !revokedBatchedCertificates[_certificateHash],
+            batch.issuer,
+            batch.timestamp
+        );
+    }
+    
+    function revokeBatchedCertificate(
+        bytes32 _certificateHash,
+        bytes32 _merkleRoot,
+        bytes32[] calldata _proof
+    ) public {
+        require(batches[_merkleRoot].issuer == msg.sender, "Only issuer can revoke");
+        require(_verifyProof(_certificateHash, _merkleRoot, _proof), "Invalid proof");
+        
+        revokedBatchedCertificates[_certificateHash] = true;
+        emit CertificateRevoked(_certificateHash);
+    }
+    
+    function _verifyProof(
+        bytes32 _certificateHash,
+        bytes32 _merkleRoot,
+        bytes32[] calldata _proof
+    ) internal pure returns (bool) {
+        bytes32 node = keccak256(abi.encodePacked(_certificateHash));
+        for (uint256 i = 0; i < _proof.length; i++) {
+            node = node < _proof[i]
+                ? keccak256(abi.encodePacked(node, _proof[i]))
+                : keccak256(abi.encodePacked(_proof[i], node));
+        }
+        return node == _merkleRoot;
+    }
 } 
\ No newline at end of file